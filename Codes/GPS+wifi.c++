@@ -14,6 +14,10 @@ TinyGPSPlus gps;
 // Web server
 ESP8266WebServer server(80);
 
+// Raw NMEA passthrough: the host decodes every sentence itself (nmea.py)
+WiFiServer nmeaServer(2947);
+WiFiClient nmeaClient;
+
 // Handle /gps endpoint
 void handleGPS() {
   String response = "{";
@@ -46,7 +50,10 @@ void setup() {
   // Set up web server
   server.on("/gps", handleGPS);
   server.begin();
+  nmeaServer.begin();
+  nmeaServer.setNoDelay(true);
   Serial.println("Server started. Access /gps to get GPS data.");
+  Serial.println("Raw NMEA on TCP port 2947.");
 
   // Fast cold start: keep reading GPS until first fix
   Serial.println("Waiting for first GPS fix...");
@@ -67,9 +74,22 @@ void setup() {
 }
 
 void loop() {
-  // Continuously read raw GPS bytes
-  while (gpsSerial.available()) {
-    gps.encode(gpsSerial.read());
+  // One NMEA client at a time; a new connection replaces the old one
+  if (nmeaServer.hasClient()) {
+    nmeaClient.stop();
+    nmeaClient = nmeaServer.available();
+  }
+
+  // Continuously read raw GPS bytes, forwarding them in one write per batch
+  uint8_t buf[128];
+  size_t n = 0;
+  while (gpsSerial.available() && n < sizeof(buf)) {
+    buf[n] = gpsSerial.read();
+    gps.encode(buf[n]);
+    n++;
+  }
+  if (n > 0 && nmeaClient.connected()) {
+    nmeaClient.write(buf, n);
   }
 
   // Debug: show satellites count every 2 seconds
@@ -1,44 +1,203 @@
+import queue
+import selectors
 import socket
-import folium
 import threading
 import time
 import webbrowser
-import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Live map of the ESP8266's GPS fixes. Senders connect to port 5050 and write
+# "lat,lon" records, one per line, over a connection they keep open; a
+# sender that writes a single record and closes (the old way) works too. All
+# connections are read by one selector thread, which puts the parsed fixes on
+# a queue for the map. The folium page is rendered once, on the first fix,
+# and served on http://localhost:8050/. The page then follows the robot over
+# Server-Sent Events from /stream, one "lat,lon" message per new fix, instead
+# of the page being regenerated and reopened.
+#
+#   python Codes/temp.py
+#   python benchmarks/bench_temp_ingest.py   # load generator
+
+INGEST_PORT = 5050
+MAP_PORT = 8050
+KEEPALIVE = 15      # s between comments on an idle stream
+FIX_QUEUE = 10000   # parsed fixes waiting for the consumer before the oldest are dropped
+MAX_LINE = 256      # bytes; a longer unterminated record is garbage
+RECV_BYTES = 65536
 
 coords = [0, 0]
+version = 0                       # bumped per new fix
+changed = threading.Condition()   # notified when coords change
+page = None                       # the rendered map, bytes
 
-def server():
-    global coords
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind(("0.0.0.0", 5050))
-    s.listen(1)
-    print("Waiting for GPS data from ESP8266...")
-    while True:
-        conn, addr = s.accept()
-        data = conn.recv(1024).decode().strip()
-        conn.close()
-        if data:
+class IngestServer:
+    """Reads "lat,lon\n" records from any number of connections on one thread.
+
+    Fixes go on self.fixes as (received, lat, lon); when the consumer falls
+    behind, the oldest are dropped so the queue always holds the newest.
+    """
+
+    def __init__(self, host="0.0.0.0", port=INGEST_PORT, fixes=None):
+        self.fixes = fixes if fixes is not None else queue.Queue(FIX_QUEUE)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # restart without waiting out TIME_WAIT
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, None)
+        self.connections = 0
+        self.received = 0  # fixes parsed
+        self.dropped = 0   # fixes pushed out of a full queue
+        self.bad = 0       # records that did not parse
+
+    def serve_forever(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    self._accept()
+                else:
+                    self._read(key.fileobj, key.data)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            self.selector.register(conn, selectors.EVENT_READ, [b''])  # bytes after the last newline
+            self.connections += 1
+
+    def _read(self, conn, pending):
+        try:
+            data = conn.recv(RECV_BYTES)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:  # closed: what is left is the last record, newline or not
+            self.selector.unregister(conn)
+            conn.close()
+            self.connections -= 1
+            self._parse([pending[0]])
+            return
+        *lines, pending[0] = (pending[0] + data).split(b'\n')
+        if len(pending[0]) > MAX_LINE:
+            pending[0] = b''
+            self.bad += 1
+        self._parse(lines)
+
+    def _parse(self, lines):
+        received = time.time()
+        for line in lines:
             try:
-                lat, lon = map(float, data.split(","))
+                lat, lon = map(float, line.split(b','))
+            except ValueError:
+                if line.strip():
+                    self.bad += 1
+                continue
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):  # also catches nan and inf
+                self.bad += 1
+                continue
+            self.received += 1
+            fix = (received, lat, lon)
+            try:
+                self.fixes.put_nowait(fix)
+            except queue.Full:
+                try:
+                    self.fixes.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self.fixes.put_nowait(fix)
+                except queue.Full:
+                    self.dropped += 1
+
+def apply_fixes(fixes):
+    """Consumer: moves the map to each fix, printing at most once a second."""
+    global coords, version
+    printed = 0.0
+    while True:
+        _, lat, lon = fixes.get()
+        with changed:
+            if [lat, lon] != coords:
                 coords = [lat, lon]
-                print(f"Received: {coords}")
-            except:
-                pass
+                version += 1
+                changed.notify_all()
+        if time.monotonic() - printed >= 1:
+            printed = time.monotonic()
+            print(f"Received: {coords}")
+
+def render_map(location):
+    """The map page, with a script that moves the marker on each /stream message."""
+    import folium  # only the map needs it, not the ingest
+    m = folium.Map(location=location, zoom_start=17)
+    marker = folium.Marker(location, popup=f"Lat: {location[0]}, Lon: {location[1]}").add_to(m)
+    # Runs on load, once folium's own script has created the map and marker
+    m.get_root().html.add_child(folium.Element(f"""<script>
+    window.addEventListener('load', function () {{
+        var follow = true;  // until the map is dragged
+        {m.get_name()}.on('dragstart', function () {{ follow = false; }});
+        new EventSource('/stream').onmessage = function (e) {{
+            var p = e.data.split(',').map(Number);
+            {marker.get_name()}.setLatLng(p).setPopupContent('Lat: ' + p[0] + ', Lon: ' + p[1]);
+            if (follow) {m.get_name()}.panTo(p);
+        }};
+    }});
+    </script>"""))
+    return m.get_root().render().encode()
+
+class MapHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+        elif self.path == '/stream':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            seen = 0
+            try:
+                while True:
+                    with changed:
+                        fresh = changed.wait_for(lambda: version != seen, timeout=KEEPALIVE)
+                        current, seen = coords, version  # only the newest fix, however many arrived
+                    if fresh:
+                        self.wfile.write(f"data: {current[0]},{current[1]}\n\n".encode())
+                    else:
+                        self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+            except OSError:
+                pass  # the tab was closed
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass  # one line per request would bury the fixes
 
 def map_updater():
-    global coords
-    last_coords = [0, 0]
-    file_path = os.path.abspath("live_map.html")
+    global page
     print("Map will open automatically once GPS data arrives.")
-    while True:
-        if coords != last_coords and coords != [0, 0]:
-            m = folium.Map(location=coords, zoom_start=17)
-            folium.Marker(coords, popup=f"Lat: {coords[0]}, Lon: {coords[1]}").add_to(m)
-            m.save(file_path)
-            webbrowser.open_new_tab(file_path)
-            last_coords = coords
-        time.sleep(3)
-
-# Run server & map in parallel
-threading.Thread(target=server, daemon=True).start()
-map_updater()
+    with changed:
+        changed.wait_for(lambda: coords != [0, 0])
+        first = coords
+    page = render_map(first)
+    httpd = ThreadingHTTPServer(("127.0.0.1", MAP_PORT), MapHandler)
+    httpd.daemon_threads = True
+    webbrowser.open_new_tab(f"http://localhost:{MAP_PORT}/")
+    print(f"Live map on http://localhost:{MAP_PORT}/")
+    httpd.serve_forever()
+
+if __name__ == '__main__':
+    ingest = IngestServer()
+    print(f"Waiting for GPS data on port {ingest.address[1]}...")
+    threading.Thread(target=ingest.serve_forever, daemon=True).start()
+    threading.Thread(target=apply_fixes, args=(ingest.fixes,), daemon=True).start()
+    map_updater()
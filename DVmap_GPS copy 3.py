@@ -1,32 +1,23 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 import threading
 import time
-import math
 import requests
+from geodesy import RunningStats
+from track_store import TrackStore
 
 app = Flask(__name__)
 
 ESP_IP = "192.168.137.27"  # Replace with your ESP IP
 ESP_ENDPOINT = f"http://{ESP_IP}/gps"
 
-gps_history = []
+track = TrackStore(capacity=500)  # keep last 500 points only
 latest_data = {'lat': None, 'lon': None, 'satellites': 0, 'speed': 0, 'distance': 0}
-last_time = None
+stats = RunningStats()  # distance & speed, updated per fix
 KML_FILE = "live_path.kml"
 
-# Haversine distance
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
 # Read GPS continuously
 def read_gps_continuously():
-    global latest_data, gps_history, last_time
+    global latest_data
     while True:
         try:
             resp = requests.get(ESP_ENDPOINT, timeout=2)
@@ -42,31 +33,17 @@ def read_gps_continuously():
 
                 # Distance & speed
                 now = time.time()
-                distance = 0
-                speed = 0
-                if gps_history:
-                    prev_lat, prev_lon = gps_history[-1]
-                    distance = haversine(prev_lat, prev_lon, lat, lon)
-                    dt = now - last_time if last_time else 1
-                    speed = (distance / dt) * 3.6  # km/h
-                    latest_data['distance'] += distance
-                else:
-                    latest_data['distance'] = 0
-
-                last_time = now
-
-                latest_data.update({
+                distance, speed = stats.update(now, lat, lon)
+
+                track.append(lat, lon, speed, satellites, now)
+                # A new dict per fix, never modified: readers need no lock
+                latest_data = {
                     'lat': lat,
                     'lon': lon,
                     'satellites': satellites,
-                    'speed': speed
-                })
-
-                gps_history.append([lat, lon])
-
-                # Keep last 500 points only
-                if len(gps_history) > 500:
-                    gps_history = gps_history[-500:]
+                    'speed': speed,  # km/h
+                    'distance': stats.distance
+                }
 
         except Exception as e:
             print("GPS fetch error:", e)
@@ -74,7 +51,8 @@ def read_gps_continuously():
 
 # Write KML file
 def write_kml():
-    if not gps_history:
+    path = track.points_since(0)[0]
+    if not path:
         return
 
     kml_header = '''<?xml version="1.0" encoding="UTF-8"?>
@@ -100,9 +78,10 @@ def write_kml():
 </Document>
 </kml>'''
 
-    lat = latest_data['lat'] if latest_data['lat'] else 0
-    lon = latest_data['lon'] if latest_data['lon'] else 0
-    coordinates = "\n".join(f"{lon_c},{lat_c},0" for lat_c, lon_c in gps_history)
+    data = latest_data
+    lat = data['lat'] if data['lat'] else 0
+    lon = data['lon'] if data['lon'] else 0
+    coordinates = "\n".join(f"{lon_c},{lat_c},0" for lat_c, lon_c in path)
     kml_content = kml_header + coordinates + kml_footer.format(lat=lat, lon=lon)
 
     try:
@@ -124,14 +103,11 @@ def index():
 
 @app.route('/location')
 def location():
-    return jsonify({
-        'lat': latest_data['lat'],
-        'lon': latest_data['lon'],
-        'satellites': latest_data['satellites'],
-        'speed': latest_data['speed'],
-        'distance': latest_data['distance'],
-        'path': gps_history
-    })
+    # Clients send back the 'seq' of their last response and only get newer points.
+    # 'reset' tells them the points no longer line up and the path must be replaced.
+    since = request.args.get('since', 0, type=int)
+    path, seq, reset = track.points_since(since)
+    return jsonify(latest_data | {'path': path, 'seq': seq, 'reset': reset})
 
 # Start threads
 threading.Thread(target=read_gps_continuously, daemon=True).start()
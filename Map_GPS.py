@@ -1,120 +1,44 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
+import os
 import threading
 import time
-import math
-import requests
+from esp_poller import EspPoller
+from fix_pipeline import FixPipeline
+from gps_stream import FixBroadcaster
+from kml_sink import KmlSink
+from metrics import Metrics
+from nmea import run_tcp
+from tile_cache import TileCache
 
 app = Flask(__name__)
 
-ESP_IP = "192.168.137.98"  # Replace with your ESP IP
+ESP_IP = os.environ.get("ESP_IP", "192.168.137.98")  # Replace with your ESP IP
 ESP_ENDPOINT = f"http://{ESP_IP}/gps"
+metrics = Metrics()  # served on /metrics
+poller = EspPoller(ESP_ENDPOINT, min_interval=0.25, max_interval=2.0, metrics=metrics)
+ESP_NMEA = os.environ.get("ESP_NMEA")  # e.g. 192.168.137.98:2947 to read raw NMEA instead of polling
 
-gps_history = []
-latest_data = {'lat': None, 'lon': None, 'satellites': 0, 'speed': 0, 'distance': 0}
-last_time = None
 KML_FILE = "live_path.kml"
-
-# Haversine distance
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+TRIP_LOG_FILE = "live_path.trip"  # every fix, kept across restarts
+GEOFENCE_FILE = "fences.json"
+tiles = TileCache(metrics=metrics)  # map tiles for /tiles, kept on disk for offline use
+# Filter, track, trip log, paths, index, fences and the newest fix (see fix_pipeline.py)
+pipeline = FixPipeline(TRIP_LOG_FILE, GEOFENCE_FILE, tiles, metrics, broadcaster=FixBroadcaster())
+track = pipeline.track
+kml = KmlSink(KML_FILE, max_points=500)
 
 # Read GPS continuously
 def read_gps_continuously():
-    global latest_data, gps_history, last_time
-    while True:
-        try:
-            resp = requests.get(ESP_ENDPOINT, timeout=2)
-            if resp.status_code == 200:
-                data = resp.json()
-                lat = data.get('lat')
-                lon = data.get('lon')
-                satellites = data.get('satellites', 0)
-
-                if lat is None or lon is None:
-                    time.sleep(1)
-                    continue
-
-                # Distance & speed
-                now = time.time()
-                distance = 0
-                speed = 0
-                if gps_history:
-                    prev_lat, prev_lon = gps_history[-1]
-                    distance = haversine(prev_lat, prev_lon, lat, lon)
-                    dt = now - last_time if last_time else 1
-                    speed = (distance / dt) * 3.6  # km/h
-                    latest_data['distance'] += distance
-                else:
-                    latest_data['distance'] = 0
-
-                last_time = now
-
-                latest_data.update({
-                    'lat': lat,
-                    'lon': lon,
-                    'satellites': satellites,
-                    'speed': speed
-                })
-
-                gps_history.append([lat, lon])
-
-                # Keep last 500 points only
-                if len(gps_history) > 500:
-                    gps_history = gps_history[-500:]
-
-        except Exception as e:
-            print("GPS fetch error:", e)
-        time.sleep(1)
-
-# Write KML file
-def write_kml():
-    if not gps_history:
-        return
-
-    kml_header = '''<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-<Document>
-    <name>Live GPS Path</name>
-    <Placemark>
-        <name>Path</name>
-        <LineString>
-            <tessellate>1</tessellate>
-            <coordinates>
-'''
-    kml_footer = '''
-            </coordinates>
-        </LineString>
-    </Placemark>
-    <Placemark>
-        <name>Current Location</name>
-        <Point>
-            <coordinates>{lon},{lat},0</coordinates>
-        </Point>
-    </Placemark>
-</Document>
-</kml>'''
-
-    lat = latest_data['lat'] if latest_data['lat'] else 0
-    lon = latest_data['lon'] if latest_data['lon'] else 0
-    coordinates = "\n".join(f"{lon_c},{lat_c},0" for lat_c, lon_c in gps_history)
-    kml_content = kml_header + coordinates + kml_footer.format(lat=lat, lon=lon)
+    if ESP_NMEA:
+        run_tcp(ESP_NMEA, pipeline.handle, metrics=metrics)  # every fix at the receiver's rate
+    else:
+        poller.run(pipeline.handle)
 
-    try:
-        with open(KML_FILE, "w") as f:
-            f.write(kml_content)
-    except Exception as e:
-        print("KML write error:", e)
-
-# Update KML periodically in a separate thread
+# Append new points to the KML file in a separate thread
 def update_kml_periodically():
     while True:
-        write_kml()
+        points, seq, reset = track.points_since(kml.seq)
+        kml.write(points, seq, reset)
         time.sleep(2)  # update every 2 seconds
 
 # Flask routes
@@ -124,18 +48,88 @@ def index():
 
 @app.route('/location')
 def location():
-    return jsonify({
-        'lat': latest_data['lat'],
-        'lon': latest_data['lon'],
-        'satellites': latest_data['satellites'],
-        'speed': latest_data['speed'],
-        'distance': latest_data['distance'],
-        'path': gps_history
-    })
+    # Clients send back the 'seq' of their last response and only get newer points.
+    # 'reset' tells them the points no longer line up and the path must be replaced.
+    # With zoom (map zoom level) or tolerance (meters) the path is simplified to match.
+    since = request.args.get('since', 0, type=int)
+    data = pipeline.latest
+    level = pipeline.lod.level_for(request.args.get('zoom', type=float),
+                                   request.args.get('tolerance', type=float), data['lat'])
+    with metrics.timer('serialize_ms'):
+        response = Response(pipeline.location_cache.body(data, since, level), mimetype='application/json')
+    age = metrics.since('fix')
+    if age is not None:
+        metrics.observe('served_age_ms', age * 1000)
+    return response
+
+@app.route('/history')
+def history():
+    # Stored track between two unix times, read from the trip log
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    max_points = request.args.get('max_points', 5000, type=int)
+    tolerance = request.args.get('tolerance', type=float)  # meters, Douglas-Peucker
+    return jsonify({'path': pipeline.trip_reader.path(start, end, max_points, tolerance)})
+
+@app.route('/near')
+def near():
+    # Fixes of the live track within r meters of a point, and the visits they make up
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    r = request.args.get('r', type=float)
+    if lat is None or lon is None or not r or r <= 0:
+        return Response("lat, lon and r (meters) are required", status=400)
+    return jsonify(pipeline.track_index.near(lat, lon, r, request.args.get('limit', 500, type=int)))
+
+@app.route('/fences')
+def fences():
+    # Every fence and whether the robot is in it, plus enter / exit events after id `since`
+    events, seq = pipeline.geofences.events_since(request.args.get('since', 0, type=int))
+    return jsonify({'fences': pipeline.geofences.describe(), 'events': events, 'seq': seq})
+
+@app.route('/fences/<name>', methods=['PUT', 'DELETE'])
+def fence(name):
+    # PUT {"polygon": [[lat, lon], ...]} adds or replaces a fence
+    if request.method == 'DELETE':
+        return ('', 204) if pipeline.geofences.remove(name) else Response("No such fence", status=404)
+    try:
+        pipeline.geofences.set(name, (request.get_json(silent=True) or {}).get('polygon'))
+    except (ValueError, TypeError) as e:
+        return Response(str(e), status=400)
+    return ('', 204)
+
+@app.route('/fences/<name>/visits')
+def fence_visits(name):
+    # When the robot was inside a fence, from the live track
+    visits = pipeline.geofences.visits(name, pipeline.track_index)
+    if visits is None:
+        return Response("No such fence", status=404)
+    return jsonify({'visits': visits})
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def tile(z, x, y):
+    # Map tiles from the local store (tile_cache.py), fetched once while online
+    data = tiles.get(z, x, y)
+    if data is None:
+        return Response("No such tile", status=404)
+    return Response(data, mimetype='image/png', headers={'Cache-Control': 'public, max-age=86400'})
+
+@app.route('/metrics')
+def metrics_json():
+    # Latency histograms and rates of the ingest pipeline, see metrics.py
+    return jsonify(metrics.snapshot())
+
+@app.route('/stream')
+def stream():
+    # One Server-Sent Event per new fix; the page falls back to polling /location
+    if not pipeline.broadcaster.accepting():
+        return Response("Too many streams, poll /location", status=503)
+    return Response(pipeline.broadcaster.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Start threads
 threading.Thread(target=read_gps_continuously, daemon=True).start()
 threading.Thread(target=update_kml_periodically, daemon=True).start()
 
 if __name__ == '__main__':
-    app.run(debug=False, host='0.0.0.0')
+    app.run(debug=False, host='0.0.0.0')  # development server; see serve.py
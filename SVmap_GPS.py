@@ -1,71 +1,54 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
+import os
 import serial
 import threading
 import time
-import math
+from fix_pipeline import FixPipeline
+from gps_parser import FixParser
+from metrics import COUNT_BUCKETS, Metrics
+from nmea import NmeaParser
+from tile_cache import TileCache
 
 app = Flask(__name__)
 
-# Update with your Arduino COM port
-ser = serial.Serial('COM2', 9600, timeout=1)
+# Update with your Arduino COM port, or a pyserial URL such as socket://192.168.137.98:2947
+GPS_PORT = os.environ.get("GPS_PORT", "COM2")
+GPS_BAUD = int(os.environ.get("GPS_BAUD", 9600))
+# "text" for the Arduino sketch output, "nmea" for the receiver's raw sentences
+GPS_FORMAT = os.environ.get("GPS_FORMAT", "text")
+READ_SIZE = 4096       # bytes per read, far more than arrives between reads at any GPS baud rate
+READ_TIMEOUT = 0.05    # s a read waits for READ_SIZE bytes before returning what it has
+ser = serial.serial_for_url(GPS_PORT, GPS_BAUD, timeout=READ_TIMEOUT)
 
-gps_history = []
-latest_data = {'lat': 0, 'lon': 0, 'speed': 0, 'distance': 0, 'satellites': 0}
-last_time = None
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+TRIP_LOG_FILE = "serial_path.trip"  # every fix, kept across restarts
+GEOFENCE_FILE = "fences.json"
+metrics = Metrics()  # served on /metrics
+tiles = TileCache(metrics=metrics)  # map tiles for /tiles, kept on disk for offline use
+# Filter, track, trip log, paths, index, fences and the newest fix (see fix_pipeline.py)
+pipeline = FixPipeline(TRIP_LOG_FILE, GEOFENCE_FILE, tiles, metrics)
+track = pipeline.track
 
 def read_gps():
-    global latest_data, gps_history, last_time
-    lat = lon = satellites = None
+    parser = NmeaParser() if GPS_FORMAT == "nmea" else FixParser()
 
     while True:
         try:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line.startswith("Latitude:"):
-                lat = float(line.split(":")[1].strip())
-            elif line.startswith("Longitude:"):
-                lon = float(line.split(":")[1].strip())
-            elif line.startswith("Satellites in use:"):
-                satellites = int(line.split(":")[1].strip())
-            elif line.startswith("---------------------------"):
-                # End of one GPS reading
-                if lat is not None and lon is not None:
-                    now = time.time()
-                    speed = 0
-                    distance = 0
-
-                    if gps_history:
-                        prev_lat, prev_lon = gps_history[-1]
-                        distance = haversine(prev_lat, prev_lon, lat, lon)
-                        dt = now - last_time if last_time else 1
-                        speed = (distance/dt) * 3.6
-                        latest_data['distance'] += distance
-                    else:
-                        latest_data['distance'] = 0
-
-                    gps_history.append([lat, lon])
-                    latest_data.update({
-                        'lat': lat,
-                        'lon': lon,
-                        'speed': speed,
-                        'satellites': satellites if satellites else 0
-                    })
-                    last_time = now
-
-                # Reset for next reading
-                lat = lon = satellites = None
+            # Whatever arrives within READ_TIMEOUT: about 20 reads a second while
+            # data flows, rather than a one-byte read per byte once drained
+            data = ser.read(READ_SIZE)
+            received = time.time()
+            start = time.perf_counter()
+            fixes = parser.feed(data)
+            if fixes:  # most reads only add part of a line
+                metrics.observe('parse_ms', (time.perf_counter() - start) * 1000)
+                metrics.observe('serial_backlog_bytes', ser.in_waiting, COUNT_BUCKETS)
+            for fix in fixes:
+                fix['received'] = received
+                pipeline.handle(fix)
 
         except Exception as e:
             print("GPS read error:", e)
-        time.sleep(0.05)
+            time.sleep(1)
 
 # Background thread
 threading.Thread(target=read_gps, daemon=True).start()
@@ -76,7 +59,75 @@ def index():
 
 @app.route('/location')
 def location():
-    return jsonify(latest_data | {'path': gps_history})
+    # Only points appended after the client's last 'seq' are sent back,
+    # simplified for the map's zoom (or a tolerance in meters) if given
+    since = request.args.get('since', 0, type=int)
+    data = pipeline.latest
+    level = pipeline.lod.level_for(request.args.get('zoom', type=float),
+                                   request.args.get('tolerance', type=float), data['lat'])
+    with metrics.timer('serialize_ms'):
+        response = Response(pipeline.location_cache.body(data, since, level), mimetype='application/json')
+    age = metrics.since('fix')
+    if age is not None:
+        metrics.observe('served_age_ms', age * 1000)
+    return response
+
+@app.route('/history')
+def history():
+    # Stored track between two unix times, read from the trip log
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    max_points = request.args.get('max_points', 5000, type=int)
+    tolerance = request.args.get('tolerance', type=float)  # meters, Douglas-Peucker
+    return jsonify({'path': pipeline.trip_reader.path(start, end, max_points, tolerance)})
+
+@app.route('/near')
+def near():
+    # Fixes of the live track within r meters of a point, and the visits they make up
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    r = request.args.get('r', type=float)
+    if lat is None or lon is None or not r or r <= 0:
+        return Response("lat, lon and r (meters) are required", status=400)
+    return jsonify(pipeline.track_index.near(lat, lon, r, request.args.get('limit', 500, type=int)))
+
+@app.route('/fences')
+def fences():
+    # Every fence and whether the robot is in it, plus enter / exit events after id `since`
+    events, seq = pipeline.geofences.events_since(request.args.get('since', 0, type=int))
+    return jsonify({'fences': pipeline.geofences.describe(), 'events': events, 'seq': seq})
+
+@app.route('/fences/<name>', methods=['PUT', 'DELETE'])
+def fence(name):
+    # PUT {"polygon": [[lat, lon], ...]} adds or replaces a fence
+    if request.method == 'DELETE':
+        return ('', 204) if pipeline.geofences.remove(name) else Response("No such fence", status=404)
+    try:
+        pipeline.geofences.set(name, (request.get_json(silent=True) or {}).get('polygon'))
+    except (ValueError, TypeError) as e:
+        return Response(str(e), status=400)
+    return ('', 204)
+
+@app.route('/fences/<name>/visits')
+def fence_visits(name):
+    # When the robot was inside a fence, from the live track
+    visits = pipeline.geofences.visits(name, pipeline.track_index)
+    if visits is None:
+        return Response("No such fence", status=404)
+    return jsonify({'visits': visits})
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def tile(z, x, y):
+    # Map tiles from the local store (tile_cache.py), fetched once while online
+    data = tiles.get(z, x, y)
+    if data is None:
+        return Response("No such tile", status=404)
+    return Response(data, mimetype='image/png', headers={'Cache-Control': 'public, max-age=86400'})
+
+@app.route('/metrics')
+def metrics_json():
+    # Latency histograms and rates of the ingest pipeline, see metrics.py
+    return jsonify(metrics.snapshot())
 
 if __name__ == "__main__":
-    app.run(debug=False, host='0.0.0.0')
+    app.run(debug=False, host='0.0.0.0')  # development server; see serve.py
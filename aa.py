@@ -1,27 +1,39 @@
-import socket
+import os
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from collections import deque
+from distance_daemon import connect
+from distance_filter import DistanceFilter, parse_reading
+from metrics import FrameMeter
 
 # ---------------- ESP8266 Settings ----------------
-ESP_IP = "192.168.137.199"  # Replace with your ESP IP
-PORT = 80
+ESP_IP = os.environ.get("ESP_IP", "192.168.137.199")  # Replace with your ESP IP
+PORT = int(os.environ.get("ESP_PORT", 80))
 
 # ---------------- Graph Settings ----------------
 MAX_POINTS = 50          # Number of points on graph
 SAFE_DISTANCE = 15       # cm, danger threshold
 
-# ---------------- Connect to ESP ----------------
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.connect((ESP_IP, PORT))
-print(f"Connected to ESP at {ESP_IP}:{PORT}")
+# ---------------- Filter Settings ----------------
+# Spikes, dropouts and jitter are filtered out before the threshold check, see
+# distance_filter.py. A short Hampel window and no limit on falling distances
+# keep an obstacle closing in visible within a reading.
+distance_filter = DistanceFilter(window=3, alpha=0.5)
+
+# ---------------- Connect ----------------
+# Through distance_daemon.py when it is running (it holds the ESP's only
+# connection and logs every reading), otherwise straight to the ESP
+s, source = connect((ESP_IP, PORT))
+print(f"Connected to {source}")
 
 # ---------------- Data Storage ----------------
-distance_data = deque([0]*MAX_POINTS, maxlen=MAX_POINTS)
+distance_data = deque([0]*MAX_POINTS, maxlen=MAX_POINTS)      # filtered
+raw_distance_data = deque([0]*MAX_POINTS, maxlen=MAX_POINTS)  # as received, NaN for "No echo"
 
 # ---------------- Plot Setup ----------------
 plt.style.use('ggplot')
 fig, ax = plt.subplots()
+raw_line, = ax.plot(raw_distance_data, color='lightgray', linewidth=1, label='Raw')
 line, = ax.plot(distance_data, color='blue', label='Distance (cm)')
 safe_line = ax.axhline(SAFE_DISTANCE, color='green', linestyle='--', label='Safe Distance')
 ax.set_ylim(0, 100)
@@ -29,31 +41,39 @@ ax.set_xlabel("Time (samples)")
 ax.set_ylabel("Distance (cm)")
 ax.set_title("Live Ultrasonic Sensor Distance")
 ax.legend()
+# Frame time and readings taken in per frame ('m' hides it)
+meter = FrameMeter()
+overlay = ax.text(0.99, 0.97, "", transform=ax.transAxes, va='top', ha='right',
+                  fontsize=8, color='dimgray')
+fig.canvas.mpl_connect('key_press_event', lambda event: event.key == 'm'
+                       and overlay.set_visible(not overlay.get_visible()))
 
 # ---------------- Update Function ----------------
 def update(frame):
+    values = []
     try:
         raw_data = s.recv(1024).decode().strip()
         if raw_data:
             for line_data in raw_data.splitlines():
-                try:
-                    d = float(line_data)
-                    if d == 0 or d > 200:  # filter invalid readings
-                        continue
-                    distance_data.append(d)
-                except:
-                    continue
+                values.append(parse_reading(line_data))
     except:
         pass
 
+    raw, filtered = distance_filter.process(values)
+    raw_distance_data.extend(raw)
+    distance_data.extend(filtered)
+
     # Change line color dynamically based on danger
     if distance_data[-1] < SAFE_DISTANCE:
         line.set_color('red')
     else:
         line.set_color('blue')
 
+    raw_line.set_ydata(raw_distance_data)
     line.set_ydata(distance_data)
-    return line,
+    meter.tick(len(values))
+    overlay.set_text(meter.text())
+    return raw_line, line, overlay
 
 # ---------------- Run Animation ----------------
 ani = FuncAnimation(fig, update, interval=100)
@@ -0,0 +1,83 @@
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from serve import load
+
+# Push ingest of "map_GPS +wifi.py" over real HTTP: fixes per second and
+# server CPU per fix, one fix per GET /update against POST /update/batch with
+# BATCH_SIZES fixes per request, as CSV and as packed records. Every batch is
+# synced to the trip log before its reply, as in production. Runs in a
+# temporary directory.
+#
+#   python benchmarks/bench_batch_ingest.py [fixes]
+
+FIXES = 2000
+BATCH_SIZES = (10, 100, 1000)
+LAT0, LON0 = 25.4691, 81.8199
+
+
+def csv_body(seqs):
+    return "".join(f"{s},{1760000000 + s},{LAT0 + s * 1e-6:.7f},{LON0:.7f}\n" for s in seqs).encode()
+
+
+def packed_body(module, seqs):
+    records = np.zeros(len(seqs), module.BATCH_DTYPE)
+    records['seq'] = seqs
+    records['time'] = 1760000000 + np.asarray(seqs, dtype=float)
+    records['lat'] = np.round((LAT0 + np.asarray(seqs) * 1e-6) * 1e7)
+    records['lon'] = round(LON0 * 1e7)
+    return records.tobytes()
+
+
+def timed(name, fixes, requests_made, fn):
+    cpu, start = time.process_time(), time.perf_counter()
+    fn()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    print(f"  {name:28s} {fixes / elapsed:9,.0f} fixes/s  {elapsed / fixes * 1e6:8.1f} us per fix"
+          f"  ({requests_made:,} requests, {cpu / fixes * 1e6:.1f} us CPU per fix)")
+    return elapsed / fixes
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FIXES
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        module = load(os.path.join(ROOT, "map_GPS +wifi.py"))
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no line per request
+        server = make_server("127.0.0.1", 0, module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+        session = requests.Session()
+        print(f"{count:,} fixes per run:")
+
+        def single():
+            for s in range(count):
+                session.get(f"{url}/update", params={'lat': LAT0 + s * 1e-6, 'lon': LON0})
+        base = timed("GET /update, one fix each", count, count, single)
+
+        for size in BATCH_SIZES:
+            for kind in ("csv", "packed"):
+                device = f"{kind}{size}"
+
+                def batches():
+                    for first in range(0, count, size):
+                        seqs = list(range(first, min(first + size, count)))
+                        if kind == "csv":
+                            body, content_type = csv_body(seqs), 'text/csv'
+                        else:
+                            body, content_type = packed_body(module, seqs), 'application/octet-stream'
+                        reply = session.post(f"{url}/update/batch", params={'device': device}, data=body,
+                                             headers={'Content-Type': content_type}).json()
+                        assert reply['stored'] == len(seqs), reply
+                per_fix = timed(f"POST batch of {size:4d}, {kind}", count, -(-count // size), batches)
+                print(f"  {'':28s} {base / per_fix:9.1f}x less per fix than one GET each")
+        server.shutdown()
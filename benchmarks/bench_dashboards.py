@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from esp_simulator import FakeGPS, start_http_server
+from trip_log import TripLog
+
+# Hundreds of dashboards against one GPS server. Map_GPS.py runs in a child
+# process, under serve.py or on Flask's development server (app.run), polling
+# a FakeGPS and starting with --points fixes already in its trip log. Each
+# client polls /location?since=<seq> once a second like indexSV.html does
+# without /stream, and loads the page (since=0, the whole path) at the
+# start and again every --reload polls. Reports the response times clients
+# saw for page loads and for polls, and from the server's /metrics how long
+# /location took to build and whether ingest kept its rate.
+#
+#   python benchmarks/bench_dashboards.py [--clients 300] [--duration 10] [serve dev]
+
+LAT0 = 25.4691
+SEQ = re.compile(rb'"seq":\s*(\d+)')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+def prefill(directory, count):
+    log = TripLog(os.path.join(directory, "live_path.trip"))
+    t = time.time() - count
+    for i in range(count):
+        log.append(t + i, LAT0 + i * 1e-6, 81.8 + i * 1e-6, 3.0, 8)
+    log.close()
+
+
+async def get(conn, host, port, target):
+    """One GET over a kept-alive connection; returns (body, conn)."""
+    if conn is None:
+        conn = await asyncio.open_connection(host, port)
+    reader, writer = conn
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError("closed")
+    length, close = 0, status.startswith(b"HTTP/1.0")
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        name = name.lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            close = value.strip().lower() == "close"
+    body = await reader.readexactly(length)
+    if b" 200 " not in status:
+        raise ConnectionError(status.decode().strip())
+    if close:
+        writer.close()
+        conn = None
+    return body, conn
+
+
+async def dashboard(host, port, stop, reload_every, results):
+    conn = None
+    seq = 0
+    polls = 0
+    await asyncio.sleep(random.random())  # pages opened at different times
+    next_poll = time.monotonic()
+    while time.monotonic() < stop:
+        since = 0 if polls % reload_every == 0 else seq
+        start = time.perf_counter()
+        try:
+            body, conn = await get(conn, host, port, f"/location?since={since}")
+            results['load' if since == 0 else 'poll'].append(time.perf_counter() - start)
+            seq = int(SEQ.search(body, body.rfind(b'"seq"')).group(1))  # no need to decode the path
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            results['errors'] += 1
+            conn = None
+        polls += 1
+        next_poll = max(next_poll + 1.0, time.monotonic())
+        await asyncio.sleep(next_poll - time.monotonic())
+    if conn:
+        conn[1].close()
+
+
+async def load(host, port, clients, duration, reload_every):
+    results = {'load': [], 'poll': [], 'errors': 0}
+    stop = time.monotonic() + duration
+    await asyncio.gather(*(dashboard(host, port, stop, reload_every, results) for _ in range(clients)))
+    return results
+
+
+def bench(mode, args, esp):
+    port = free_port()
+    env = dict(os.environ, ESP_IP=esp, PYTHONPATH=ROOT)
+    if mode == "serve":
+        command = [sys.executable, os.path.join(ROOT, "serve.py"), os.path.join(ROOT, "Map_GPS.py"),
+                   "--host", "127.0.0.1",
+                   "--port", str(port), "--threads", str(args.threads)]
+    else:
+        command = [sys.executable, "-c", f"import Map_GPS; Map_GPS.app.run(host='127.0.0.1', port={port})"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefill(tmp, args.points)
+        child = subprocess.Popen(command, cwd=tmp, env=env,  # trip log and KML land in tmp
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(100):  # wait for the server to come up
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            started = time.perf_counter()
+            results = asyncio.run(load("127.0.0.1", port, args.clients, args.duration, args.reload))
+            elapsed = time.perf_counter() - started
+            server = json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read())
+        finally:
+            child.terminate()
+            child.wait()
+
+    build = server['histograms'].get('serialize_ms', {})
+    points = server['rates'].get('points', {})
+    print(f"{mode:6s} {(len(results['load']) + len(results['poll'])) / elapsed:5.0f} req/s"
+          f"  errors {results['errors']}  ingest {points.get('per_s_last', 0)} fixes/s"
+          f"  /location built in p50 {build.get('p50', float('nan')):.3f} ms"
+          f" p99 {build.get('p99', float('nan')):.2f} ms")
+    for kind in ('load', 'poll'):
+        latency = [t * 1000 for t in results[kind]]
+        print(f"         {kind}s {len(latency):6d}  latency p50 {percentile(latency, .5):7.1f} ms"
+              f"  p95 {percentile(latency, .95):7.1f} ms  p99 {percentile(latency, .99):7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the GPS dashboard server")
+    parser.add_argument("modes", nargs="*", help="serve (serve.py) and/or dev (app.run); default both")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--points", type=int, default=20_000, help="fixes already in the track")
+    parser.add_argument("--reload", type=int, default=60, help="polls between page reloads")
+    parser.add_argument("--rate", type=float, default=4.0, help="fixes per second from the fake ESP")
+    parser.add_argument("--threads", type=int, default=32, help="serve.py request threads")
+    args = parser.parse_args()
+
+    path = [(LAT0 + i * 1e-5, 81.8) for i in range(10_000)]
+    gps_server = start_http_server(FakeGPS(path, rate=args.rate), port=0)
+    esp = f"127.0.0.1:{gps_server.server_address[1]}"
+
+    print(f"{args.clients} dashboards polling once a second, reloading every {args.reload} polls,"
+          f" {args.points:,} kept fixes, {args.rate:g} fixes/s")
+    for mode in args.modes or ("serve", "dev"):
+        bench(mode, args, esp)
@@ -0,0 +1,96 @@
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from esp_simulator import Replay, distance_encoder, start_stream_server
+
+# Fan-out of distance_daemon.py: the daemon runs in a child process between a
+# simulated ESP and N line-protocol clients, all read by one selector thread
+# here. The simulated readings are sequence numbers, so every line a client
+# gets is matched to the time the simulator sent it. Reports readings per
+# second delivered to each client, latency from the simulator to the client,
+# and the daemon's log size per reading.
+#
+#   python benchmarks/bench_distance_daemon.py [--rate 2000] [--duration 5] [clients ...]
+
+CLIENTS = (1, 10, 50)
+WARMUP = 1.0  # seconds before counting, while backlogs drain
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+def bench(clients, args):
+    samples = int(args.rate * (args.duration + 10))
+    replay = Replay([i / args.rate for i in range(samples)], distance_encoder(list(range(1, samples + 1))),
+                    loop=False, record=True)
+    sim = start_stream_server(lambda: replay, port=0)
+    port = 18190
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon = subprocess.Popen([sys.executable, os.path.join(ROOT, "distance_daemon.py"),
+                                   "--esp", f"127.0.0.1:{sim.server_address[1]}", "--port", str(port),
+                                   "--ws-port", "0", "--log", "bench.dlog"],
+                                  cwd=tmp, stdout=subprocess.DEVNULL)
+        try:
+            sel = selectors.DefaultSelector()
+            deadline = time.monotonic() + 5
+            while True:  # wait for the daemon to listen
+                try:
+                    socket.create_connection(("127.0.0.1", port)).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+            for _ in range(clients):
+                sock = socket.create_connection(("127.0.0.1", port))
+                sock.setblocking(False)
+                sel.register(sock, selectors.EVENT_READ, [b'', 0])
+            latency = []
+            sent = replay.sent
+            start = time.monotonic()
+            stop = start + args.duration
+            while time.monotonic() < stop:
+                for key, _ in sel.select(0.1):
+                    data = key.fileobj.recv(65536)
+                    received = time.monotonic()
+                    state = key.data
+                    *lines, state[0] = (state[0] + data).split(b'\n')
+                    if lines and received - start > WARMUP:  # past the backlog and start-up
+                        state[1] += len(lines)
+                        seq = int(lines[-1])
+                        i = bisect_left(sent, (0, seq), key=lambda s: (0, s[1]))
+                        if i < len(sent):
+                            latency.append(received - sent[i][0])
+            counts = [key.data[1] for key in sel.get_map().values()]
+            for key in list(sel.get_map().values()):
+                key.fileobj.close()
+            log_size = os.path.getsize(os.path.join(tmp, "bench.dlog"))
+        finally:
+            daemon.terminate()
+            daemon.wait()
+            sim.shutdown()
+    delivered = sum(counts) / clients / (args.duration - WARMUP)
+    print(f"{clients:4d} clients  {delivered:8.0f} readings/s each (offered {args.rate:g})"
+          f"  latency p50 {percentile(latency, .5) * 1000:6.1f} ms p95 {percentile(latency, .95) * 1000:6.1f} ms"
+          f"  log {log_size / max(replay.sent[-1][1], 1) if replay.sent else 0:.0f} B/reading")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=2000.0, help="readings per second from the ESP")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("clients", nargs="*", type=int, default=CLIENTS)
+    args = parser.parse_args()
+    for n in args.clients:
+        bench(n, args)
@@ -0,0 +1,63 @@
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from distance_filter import DistanceFilter
+
+# Cost of the distance filter per reading for the batch sizes a viewer sees
+# (a few readings per frame, more after a stall), and what it does to a
+# synthetic stream: a target swinging between 20 and 180 cm with sensor
+# noise, "No echo" dropouts and multipath spikes anywhere in range. False
+# alarms are readings below SAFE_DISTANCE (aa.py) while the target never
+# comes closer than 20 cm.
+#
+#   python benchmarks/bench_distance_filter.py [readings]
+
+READINGS = 200_000
+BATCHES = (1, 10, 100, 1000, 10_000)
+SAFE_DISTANCE = 15
+DROPOUTS = 0.02
+SPIKES = 0.02
+
+
+def stream(count, seed=1):
+    rng = random.Random(seed)
+    true = np.array([100 + 80 * math.sin(i / 40) for i in range(count)])
+    seen = []
+    for d in true.tolist():
+        r = rng.random()
+        if r < DROPOUTS:
+            seen.append(0.0)
+        elif r < DROPOUTS + SPIKES:
+            seen.append(float(rng.randint(2, 200)))
+        else:
+            seen.append(float(round(d + rng.gauss(0, 2))))
+    return true, seen
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else READINGS
+    true, seen = stream(count)
+
+    print(f"{count:,} readings, per-reading cost by batch size")
+    for size in BATCHES:
+        f = DistanceFilter()
+        start = time.perf_counter()
+        for i in range(0, count, size):
+            f.process(seen[i:i + size])
+        elapsed = time.perf_counter() - start
+        print(f"  batch {size:6,}  {elapsed / count * 1e6:7.3f} us per reading"
+              f"  {elapsed / math.ceil(count / size) * 1e6:9.1f} us per batch")
+
+    raw, filtered = DistanceFilter().process(seen)
+    valid = (raw >= 2) & (raw <= 200)
+    for name, values in (("raw", raw[valid]), ("filtered", filtered[valid])):
+        error = values - true[valid]
+        print(f"  {name:9s} rms error {math.sqrt(np.mean(error ** 2)):5.1f} cm"
+              f"  false alarms {int((values < SAFE_DISTANCE).sum()):5,}")
+    lag = np.argmax(np.correlate(filtered[200:1200] - 100, true[200:1200] - 100, 'full')) - 999
+    print(f"  filtered lags the target by {lag} readings")
@@ -0,0 +1,100 @@
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geodesy import haversine_np, segment_distances
+from gps_filter import M_PER_DEG, KalmanFilter, PassThrough, filter_track
+
+# What the ingest filter does to distance, speed and position error. The
+# track is a synthetic drive at 1 Hz, 2 m/s with turns, parked 10 minutes
+# of every 30, seen through GPS noise: a slowly wandering error (the larger
+# part for a real receiver) plus white jitter, and occasional jumps of tens
+# of meters. Compared are the fixes as received, the live filter one fix at
+# a time, and the batch filter with backward smoothing.
+#
+#   python benchmarks/bench_filter.py [hours]
+
+HOURS = 2
+WANDER = 2.0       # m, slowly varying error (60 s correlation)
+JITTER = 1.5       # m, independent per fix
+OUTLIERS = 0.005   # fraction of fixes that jump 30-100 m
+LAT0, LON0 = 25.4691, 81.8199
+
+
+def drive(count, seed=1):
+    rng = random.Random(seed)
+    x = y = heading = 0.0
+    ex = ey = 0.0
+    alpha = math.exp(-1 / 60)
+    true, seen, parked, jumps = [], [], [], []
+    for i in range(count):
+        moving = (i // 600) % 3 != 0
+        if moving:
+            heading += rng.gauss(0, 0.05)
+            x += 2.0 * math.cos(heading)
+            y += 2.0 * math.sin(heading)
+        ex = alpha * ex + math.sqrt(1 - alpha ** 2) * rng.gauss(0, WANDER)
+        ey = alpha * ey + math.sqrt(1 - alpha ** 2) * rng.gauss(0, WANDER)
+        nx, ny = x + ex + rng.gauss(0, JITTER), y + ey + rng.gauss(0, JITTER)
+        jump = rng.random() < OUTLIERS
+        if jump:
+            angle, dist = rng.uniform(0, 2 * math.pi), rng.uniform(30, 100)
+            nx, ny = nx + dist * math.cos(angle), ny + dist * math.sin(angle)
+        true.append((x, y))
+        seen.append((nx, ny))
+        parked.append(not moving)
+        jumps.append(jump)
+    cos0 = math.cos(math.radians(LAT0))
+    to_deg = lambda pts: (np.array([LAT0 + p[1] / M_PER_DEG for p in pts]),
+                          np.array([LON0 + p[0] / (M_PER_DEG * cos0) for p in pts]))
+    return to_deg(true), to_deg(seen), np.array(parked), np.array(jumps)
+
+
+def report(name, t, lat, lon, speed, kept, true_lat, true_lon, parked):
+    error = haversine_np(lat, lon, true_lat[kept], true_lon[kept])
+    steps = segment_distances(lat, lon)
+    still = parked[kept][1:] & parked[kept][:-1]
+    print(f"  {name:10s} distance {steps.sum() / 1000:7.2f} km  of it parked {steps[still].sum():7.1f} m"
+          f"  speed parked p95 {np.percentile(speed[parked[kept]], 95):5.1f} km/h"
+          f"  error rms {math.sqrt(np.mean(error ** 2)):5.2f} m  max {error.max():6.1f} m")
+
+
+def live(filt, t, lat, lon):
+    out = []
+    kept = np.zeros(len(t), dtype=bool)
+    start = time.perf_counter()
+    for i, (ti, la, lo) in enumerate(zip(t.tolist(), lat.tolist(), lon.tolist())):
+        fix = filt.update(ti, la, lo)
+        if fix is not None:
+            out.append(fix)
+            kept[i] = True
+    elapsed = time.perf_counter() - start
+    out = np.array(out)
+    return out[:, 0], out[:, 1], out[:, 2], kept, elapsed / len(t)
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else HOURS
+    count = int(hours * 3600)
+    (true_lat, true_lon), (lat, lon), parked, jumps = drive(count)
+    t = np.arange(count, dtype=float)
+    true_km = segment_distances(true_lat, true_lon).sum() / 1000
+    print(f"{hours:g} h at 1 Hz, {true_km:.2f} km driven, {int(jumps.sum())} jumps")
+
+    for name, filt in (("raw", PassThrough()), ("live", KalmanFilter())):
+        f_lat, f_lon, speed, kept, per_fix = live(filt, t, lat, lon)
+        report(name, t, f_lat, f_lon, speed, kept, true_lat, true_lon, parked)
+        if name == "live":
+            caught = int((jumps & ~kept).sum())
+            print(f"{'':13s}{per_fix * 1e6:.1f} us per fix, {caught} of {int(jumps.sum())} jumps dropped,"
+                  f" {int((~jumps & ~kept).sum())} good fixes dropped")
+
+    start = time.perf_counter()
+    f_lat, f_lon, speed, kept = filter_track(t, lat, lon)
+    elapsed = time.perf_counter() - start
+    report("smoothed", t, f_lat, f_lon, speed, kept, true_lat, true_lon, parked)
+    print(f"{'':13s}{elapsed / count * 1e6:.1f} us per fix in batch")
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fleet as fleet_module
+from fleet import Fleet
+
+# Simulated fleet: esp_simulator.py runs N fake units in a subprocess and one
+# Fleet in this process polls all of them at 1 Hz. Reports the achieved poll
+# rate and the CPU used by the fleet process.
+#
+#   python benchmarks/bench_fleet.py
+
+BASE_PORT = 18100
+SIZES = (10, 25, 50, 100)
+RUN_SECONDS = 5
+LATENCY = 0.03
+
+
+def run(count):
+    sim = subprocess.Popen([sys.executable, os.path.join(ROOT, "esp_simulator.py"),
+                            "--port", str(BASE_PORT), "--count", str(count),
+                            "--rate", "5", "--latency", str(LATENCY),
+                            "--kml", os.path.join(ROOT, "live_path.kml")],
+                           stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(1.5)
+        fleet_module.TRIP_LOG_DIR = tempfile.mkdtemp(prefix="bench_fleet_")
+        fleet = Fleet()
+        for i in range(count):
+            robot = fleet.add(f"robot{i}", f"127.0.0.1:{BASE_PORT + i}")
+            robot.poller.min_interval = robot.poller.max_interval = 1.0
+        fleet.start()
+        time.sleep(1)  # let connections open
+
+        polls, cpu, wall = fleet.polls, time.process_time(), time.monotonic()
+        time.sleep(RUN_SECONDS)
+        polls = fleet.polls - polls
+        cpu = time.process_time() - cpu
+        wall = time.monotonic() - wall
+        fixes = sum(robot.pipeline.track.seq for robot in fleet.robots.values())
+        print(f"{count:5d} robots  {polls / wall:8.1f} polls/s (target {count})"
+              f"  cpu {cpu / wall * 100:5.1f}%  {fixes} fixes stored")
+        fleet.stop()
+    finally:
+        sim.terminate()
+        sim.wait()
+
+
+if __name__ == "__main__":
+    for count in SIZES:
+        run(count)
+        BASE_PORT += max(SIZES)  # fresh ports, the old ones may linger in TIME_WAIT
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geodesy import cumulative_distance, haversine, segment_distances, segment_speeds
+
+# Scalar math.haversine in a Python loop (what the servers used to do per
+# pair) against the vectorized track functions, on a 1M point random walk.
+#
+#   python benchmarks/bench_geodesy.py
+
+POINTS = 1_000_000
+
+
+def random_walk(n, seed=1):
+    rng = np.random.default_rng(seed)
+    lat = 25.4691 + np.cumsum(rng.normal(0, 2e-6, n))
+    lon = 81.8199 + np.cumsum(rng.normal(0, 2e-6, n))
+    t = 1.7e9 + np.arange(n, dtype=float)
+    return t, lat, lon
+
+
+def timed(label, fn, repeat=3):
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"  {label:32s} {elapsed * 1000:9.1f} ms  {elapsed / POINTS * 1e9:7.1f} ns/point")
+    return result
+
+
+if __name__ == "__main__":
+    t, lat, lon = random_walk(POINTS)
+    lat_list, lon_list = lat.tolist(), lon.tolist()
+
+    print(f"{POINTS:,} points")
+    scalar = timed("scalar haversine loop", lambda: [
+        haversine(lat_list[i - 1], lon_list[i - 1], lat_list[i], lon_list[i])
+        for i in range(1, POINTS)], repeat=1)
+    vector = timed("segment_distances", lambda: segment_distances(lat, lon))
+    timed("cumulative_distance", lambda: cumulative_distance(lat, lon))
+    timed("segment_speeds", lambda: segment_speeds(t, lat, lon))
+
+    error = np.max(np.abs(np.array(scalar) - vector))
+    print(f"  max difference scalar vs vectorized: {error:.2e} m")
@@ -0,0 +1,103 @@
+import math
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geofence import GeofenceEngine
+from track_index import M_PER_DEG, TrackIndex
+from track_store import SCALE, TrackStore
+
+# Geofences and /near over a full-size live track (three days at 1 Hz, the
+# TrackStore default): cost of checking a fix against N fences, of keeping
+# the grid index up to date, and of /near and fence-visit queries through the
+# index against a scan of the whole track. Fences are 40-vertex circles
+# scattered over the area the synthetic drive covers.
+#
+#   python benchmarks/bench_geofence.py [hours]
+
+HOURS = 72
+FENCE_COUNTS = (10, 100, 1000)
+LAT0, LON0 = 25.4691, 81.8199
+
+
+def drive(count, seed=1):
+    rng = random.Random(seed)
+    x = y = heading = 0.0
+    for i in range(count):
+        heading += rng.gauss(0, 0.05)
+        if math.hypot(x, y) > 3000:  # stay within a few km
+            heading = math.atan2(-y, -x)
+        step = 2.0 if (i // 600) % 3 else 0.0
+        x += step * math.cos(heading)
+        y += step * math.sin(heading)
+        yield LAT0 + y / M_PER_DEG, LON0 + x / (M_PER_DEG * math.cos(math.radians(LAT0)))
+
+
+def circle(rng, vertices=40):
+    cx, cy, r = rng.uniform(-3000, 3000), rng.uniform(-3000, 3000), rng.uniform(20, 200)
+    cos0 = math.cos(math.radians(LAT0))
+    return [[LAT0 + (cy + r * math.sin(a)) / M_PER_DEG, LON0 + (cx + r * math.cos(a)) / (M_PER_DEG * cos0)]
+            for a in np.linspace(0, 2 * math.pi, vertices, endpoint=False).tolist()]
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else HOURS
+    count = int(hours * 3600)
+    track = TrackStore(capacity=count + 1)
+    for lat, lon in drive(count):
+        track.append(lat, lon, t=float(len(track)))
+    index = TrackIndex(track.capacity)
+    start = time.perf_counter()
+    index.update(track)
+    print(f"{hours:g} h at 1 Hz, {count:,} fixes; index built in {time.perf_counter() - start:.2f} s,"
+          f" {len(index.cells):,} cells")
+    cols = track.columns()
+    lat, lon = np.array(cols['lat']) / SCALE, np.array(cols['lon']) / SCALE
+
+    # Per-fix cost of the index and the fences, on the last hour of fixes
+    fixes = list(zip(lat[-3600:].tolist(), lon[-3600:].tolist()))
+    rng = random.Random(2)
+    for n in FENCE_COUNTS:
+        engine = GeofenceEngine()
+        for k in range(n):
+            engine.set(f"fence{k}", circle(rng))
+        start = time.perf_counter()
+        events = sum(len(engine.update(float(i), a, b)) for i, (a, b) in enumerate(fixes))
+        per_fix = (time.perf_counter() - start) / len(fixes) * 1e6
+        print(f"  {n:5,} fences  {per_fix:7.1f} us per fix  ({events} events in the last hour)")
+
+    small = TrackStore(capacity=count + 1)
+    small_index = TrackIndex(small.capacity)
+    elapsed = 0.0
+    for a, b in fixes:
+        small.append(a, b)
+        start = time.perf_counter()
+        small_index.update(small)
+        elapsed += time.perf_counter() - start
+    print(f"  index update {elapsed / len(fixes) * 1e6:.1f} us per fix")
+
+    cos0 = math.cos(math.radians(LAT0))
+    for r in (25, 250, 2500):
+        qlat, qlon = lat[count // 2], lon[count // 2]
+        ms, result = timed(lambda: index.near(qlat, qlon, r))
+        scan_ms, inside = timed(lambda: np.hypot((lat - qlat) * M_PER_DEG, (lon - qlon) * M_PER_DEG * cos0) <= r)
+        assert result['count'] == int(inside.sum())
+        print(f"  near r={r:5,} m  {ms:7.2f} ms through the index, {scan_ms:7.2f} ms scanning"
+              f"  ({result['count']:,} fixes, {len(result['visits'])} visits)")
+
+    name = max(engine.state[0], key=lambda k: len(index.within_box(*engine.state[0][k].box)[0]))
+    fence = engine.state[0][name]
+    ms, visits = timed(lambda: engine.visits(name, index), 5)
+    scan_ms, _ = timed(lambda: [fence.contains(lat[i:i + 4096], lon[i:i + 4096])
+                                for i in range(0, count, 4096)], 2)
+    print(f"  fence visits  {ms:7.2f} ms through the index, {scan_ms:7.2f} ms scanning ({len(visits)} visits)")
@@ -0,0 +1,60 @@
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from track_lod import M_PER_DEG, TrackLod, simplify
+from track_store import SCALE, TrackStore
+
+# What a dashboard gets for a long track: /location path size per map zoom,
+# raw and at its level of detail, and what keeping the levels up to date
+# costs per fix. The track is a synthetic drive at 1 Hz with stops, GPS
+# noise and repeated fixes; Douglas-Peucker on the whole track is the
+# reference for the vertex counts.
+#
+#   python benchmarks/bench_lod.py [hours]
+
+HOURS = 8
+ZOOMS = (19, 17, 15, 13, 11)
+
+
+def drive(count, seed=1):
+    rng = random.Random(seed)
+    lat, lon, heading = 25.4691, 81.8199, 0.0
+    for i in range(count):
+        if rng.random() < 0.98:  # otherwise stopped: the receiver repeats the fix
+            heading += rng.gauss(0, 0.05)
+            step = 2.0 if (i // 600) % 3 else 0.0  # moving 20 minutes, stopped 10
+            lat += (step * math.sin(heading) + rng.gauss(0, 0.4)) / M_PER_DEG
+            lon += (step * math.cos(heading) + rng.gauss(0, 0.4)) / M_PER_DEG / math.cos(math.radians(lat))
+        yield round(lat, 6), round(lon, 6)
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else HOURS
+    count = int(hours * 3600)
+    track = TrackStore(capacity=count)
+    lod = TrackLod(track.capacity)
+    elapsed = 0.0
+    for lat, lon in drive(count):
+        track.append(lat, lon)
+        start = time.perf_counter()
+        lod.update(track)
+        elapsed += time.perf_counter() - start
+    print(f"{hours:g} h at 1 Hz: {count:,} fixes, levels updated in {elapsed / count * 1e6:.1f} us per fix")
+
+    raw, _, _ = track.points_since(0)
+    print(f"  raw path        {len(raw):7,} points {len(json.dumps(raw)) / 1024:8.1f} KB")
+    cols = track.columns()
+    lat = [v / SCALE for v in cols['lat']]
+    lon = [v / SCALE for v in cols['lon']]
+    for zoom in ZOOMS:
+        level = lod.level_for(zoom=zoom, lat=raw[-1][0])
+        path, _, _ = lod.path_since(level, 0)
+        tolerance = lod.tolerances[level]
+        reference = len(simplify(lat, lon, tolerance))
+        print(f"  zoom {zoom:2d} ({tolerance:5g} m) {len(path):7,} points {len(json.dumps(path)) / 1024:8.1f} KB"
+              f"   Douglas-Peucker {reference:,}")
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import nmea
+from kml_sink import load_kml_path
+from nmea import NmeaParser, encode_fix
+
+# Host-side NMEA decoding throughput. A 10 Hz GGA+RMC+VTG stream is
+# synthesized from live_path.kml and fed to NmeaParser in serial-sized and
+# TCP-sized chunks, once checking every sentence in a Python loop and once
+# with the batched numpy checksum. The decoded fixes are checked against the
+# input: every epoch and its timestamp must come out, where polling /gps
+# once a second keeps one in ten.
+#
+#   python benchmarks/bench_nmea.py [capture.nmea ...]
+
+FIXES = 100_000
+RATE = 10      # receiver fixes per second
+T0 = 1.76e9
+CHUNKS = (256, 4096)  # bytes per serial read, per TCP recv
+
+
+def capture(points):
+    return b"".join(encode_fix(T0 + i / RATE, lat, lon, speed=4.0, alt=97.2)
+                    for i, (lat, lon) in enumerate(points))
+
+
+def decode(data, chunk):
+    parser = NmeaParser()
+    fixes = []
+    for i in range(0, len(data), chunk):
+        fixes += parser.feed(data[i:i + chunk])
+    return fixes
+
+
+def run(label, data):
+    sentences = data.count(b"\n")
+    print(f"{label}: {len(data) / 1e6:.1f} MB, {sentences:,} sentences")
+    batch_min = nmea.BATCH_MIN
+    for chunk in CHUNKS:
+        for name, nmea.BATCH_MIN in (("loop checksum", float('inf')), ("batched checksum", batch_min)):
+            start = time.perf_counter()
+            fixes = decode(data, chunk)
+            elapsed = time.perf_counter() - start
+            print(f"  {chunk:5d} B chunks, {name:17s} {sentences / elapsed:10,.0f} sentences/s"
+                  f" {len(fixes) / elapsed:9,.0f} fixes/s  {elapsed / max(len(fixes), 1) * 1e6:5.1f} us/fix")
+    nmea.BATCH_MIN = batch_min
+    return fixes
+
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        for file_path in sys.argv[1:]:
+            with open(file_path, 'rb') as f:
+                run(file_path, f.read())
+    else:
+        path = load_kml_path(os.path.join(ROOT, "live_path.kml"))
+        points = (path * (FIXES // len(path) + 1))[:FIXES]
+        fixes = run(f"{RATE} Hz stream", capture(points))
+        ok = len(fixes) == FIXES and all(
+            abs(fix['t'] - (T0 + i / RATE)) < 0.006 and abs(fix['lat'] - points[i][0]) < 1e-6
+            for i, fix in enumerate(fixes))
+        print(f"  decoded {len(fixes):,} of {FIXES:,} fixes with receiver timestamps:"
+              f" {'ok' if ok else 'MISMATCH'}; 1 Hz polling of /gps keeps {FIXES // RATE:,}")
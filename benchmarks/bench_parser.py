@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from gps_parser import FixParser
+from kml_sink import load_kml_path
+
+# Serial ingest throughput: the old readline + startswith loop from
+# SVmap_GPS.py against FixParser fed with raw chunks. Both build the same
+# fix dicts. The old loop is timed without its 50 ms sleep per line; with
+# it, the real ceiling was 20 lines/s, printed for reference. Captures are
+# synthesized from live_path.kml in both formats, or pass recorded capture
+# files to benchmark those instead.
+#
+#   python benchmarks/bench_parser.py [capture.txt ...]
+
+FIXES = 100_000
+CHUNK = 256  # bytes per ser.read(ser.in_waiting) at a few ms of 9600 baud
+
+
+def block_capture(points):
+    return "".join(f"Latitude: {lat:.6f}\nLongitude: {lon:.6f}\nSatellites in use: 7\n"
+                   "---------------------------\n" for lat, lon in points).encode()
+
+
+def csv_capture(points):
+    return "".join(f"{lat:.6f},{lon:.6f},0.50,97.20\n" for lat, lon in points).encode()
+
+
+def readline_loop(capture):
+    ser = io.BytesIO(capture)
+    fixes = 0
+    lat = lon = satellites = None
+    while True:
+        raw = ser.readline()
+        if not raw:
+            return fixes
+        line = raw.decode('utf-8', errors='ignore').strip()
+        if line.startswith("Latitude:"):
+            lat = float(line.split(":")[1].strip())
+        elif line.startswith("Longitude:"):
+            lon = float(line.split(":")[1].strip())
+        elif line.startswith("Satellites in use:"):
+            satellites = int(line.split(":")[1].strip())
+        elif line.startswith("---------------------------"):
+            if lat is not None and lon is not None:
+                fix = {'lat': lat, 'lon': lon, 'satellites': satellites}
+                fixes += 1
+            lat = lon = satellites = None
+        elif line.count(',') == 3:
+            lat, lon, speed, alt = map(float, line.split(','))
+            fix = {'lat': lat, 'lon': lon, 'speed': speed, 'alt': alt}
+            fixes += 1
+
+
+def chunked_parser(capture):
+    parser = FixParser()
+    fixes = 0
+    for i in range(0, len(capture), CHUNK):
+        fixes += len(parser.feed(capture[i:i + CHUNK]))
+    return fixes
+
+
+def run(label, capture):
+    lines = capture.count(b"\n")
+    fixes = chunked_parser(capture)
+    print(f"{label}: {len(capture) / 1e6:.1f} MB, old loop with 50 ms sleeps capped at"
+          f" {20 * fixes / lines:.0f} fixes/s")
+    for name, fn in (("readline loop", readline_loop), ("FixParser chunks", chunked_parser)):
+        start = time.perf_counter()
+        fixes = fn(capture)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:18s} {fixes / elapsed:12,.0f} fixes/s  {len(capture) / elapsed / 1e6:6.1f} MB/s"
+              f"  ({fixes} fixes)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        for file_path in sys.argv[1:]:
+            with open(file_path, 'rb') as f:
+                run(file_path, f.read())
+    else:
+        path = load_kml_path(os.path.join(ROOT, "live_path.kml"))
+        points = (path * (FIXES // len(path) + 1))[:FIXES]
+        run("block format", block_capture(points))
+        run("CSV format", csv_capture(points))
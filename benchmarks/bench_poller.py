@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esp_poller import EspPoller
+from esp_simulator import FakeGPS, load_kml_path, start_http_server
+
+# Compares the old Map_GPS.py polling loop (new connection per request, fixed
+# sleep after each one) with EspPoller (keep-alive session, deadline schedule)
+# against a local fake ESP.
+#
+#   python benchmarks/bench_poller.py
+
+KML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "live_path.kml")
+REQUESTS = 300
+INTERVAL = 0.2
+RUN_SECONDS = 5
+LATENCY = 0.03  # typical ESP8266 response time
+
+
+def request_latency(get, endpoint):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        get(endpoint, timeout=2).json()
+    return (time.perf_counter() - start) / REQUESTS * 1000
+
+
+def old_loop_rate(endpoint):
+    polls = 0
+    stop = time.monotonic() + RUN_SECONDS
+    while time.monotonic() < stop:
+        requests.get(endpoint, timeout=2).json()
+        polls += 1
+        time.sleep(INTERVAL)
+    return polls / RUN_SECONDS
+
+
+def poller_rate(endpoint):
+    poller = EspPoller(endpoint, min_interval=INTERVAL, max_interval=INTERVAL)
+    poller.interval = INTERVAL
+    polls = []
+    threading.Thread(target=poller.run, args=(polls.append,), daemon=True).start()
+    time.sleep(RUN_SECONDS)
+    return len(polls) / RUN_SECONDS
+
+
+if __name__ == "__main__":
+    gps = FakeGPS(load_kml_path(KML), rate=10)
+    server = start_http_server(gps, port=0)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/gps"
+
+    print(f"request latency, {REQUESTS} requests (no added ESP latency)")
+    print(f"  requests.get per poll   {request_latency(requests.get, endpoint):7.3f} ms")
+    print(f"  keep-alive Session      {request_latency(requests.Session().get, endpoint):7.3f} ms")
+
+    gps.latency = LATENCY
+    print(f"\npoll rate at {1 / INTERVAL:.0f} Hz target, {LATENCY * 1000:.0f} ms ESP latency")
+    print(f"  get + sleep loop        {old_loop_rate(endpoint):7.2f} Hz")
+    print(f"  EspPoller               {poller_rate(endpoint):7.2f} Hz")
@@ -0,0 +1,205 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from esp_simulator import (DISTANCE_RATE, FakeGPS, Replay, distance_encoder, gps_encoder,
+                           start_http_server, start_stream_server, synthetic_distances)
+
+# Runs each viewer and server against esp_simulator.py instead of hardware and
+# reports ingest throughput, end-to-end latency (sample sent by the simulator
+# to sample taken in by the script) and, for the viewers, frame time.
+#
+# The simulator runs here; each script runs unmodified in a child process
+# (matplotlib on Agg, Flask not started) with ESP_IP / ESP_PORT / GPS_PORT
+# pointing at it. Frames are driven at the script's own animation interval.
+#
+#   python benchmarks/bench_replay.py [--speedup 100] [--duration 5]
+#                                     [--jitter 0.01] [--burst-every 50] [target ...]
+
+# name: (script, kind, env, transport, native rate)
+TARGETS = {
+    'map_2D':         ("map_2D.py", "viewer", {}, "distance", DISTANCE_RATE),
+    'aa':             ("aa.py", "viewer", {}, "distance", DISTANCE_RATE),
+    'Map_GPS':        ("Map_GPS.py", "server", {}, "http", 1.0),
+    'Map_GPS-nmea':   ("Map_GPS.py", "server", {}, "nmea-tcp", 10.0),
+    'SVmap_GPS':      ("SVmap_GPS.py", "server", {}, "text", 1.0),
+    'SVmap_GPS-nmea': ("SVmap_GPS.py", "server", {'GPS_FORMAT': "nmea"}, "nmea", 10.0),
+}
+FRAME_INTERVAL = {'map_2D.py': 0.05, 'aa.py': 0.1}  # their FuncAnimation intervals
+BLIT = {'map_2D.py': True, 'aa.py': False}
+LAT0, STEP = 25.0, 2e-5  # synthetic path: every fix has its own latitude
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float('nan')
+
+
+# ---- Child: run one script and report what it took in ----
+
+def run_child(script, kind, duration):
+    path = os.path.join(ROOT, script)
+    g = {'__name__': 'replay_target', '__file__': path}
+    exec(compile(open(path).read(), path, 'exec'), g)
+
+    if kind == "server":
+        arrivals = []
+        append = g['track'].append
+
+        def timed_append(lat, *args, **kwargs):
+            arrivals.append((time.monotonic(), lat))
+            append(lat, *args, **kwargs)
+
+        g['track'].append = timed_append
+        time.sleep(duration)
+        return {'arrivals': arrivals}
+
+    consumed = None
+    if 'index' not in g:  # aa.py keeps only a deque: count what goes into it
+        class CountingDeque(deque):
+            count = 0
+
+            def append(self, value):
+                CountingDeque.count += 1
+                super().append(value)
+
+            def extend(self, values):
+                CountingDeque.count += len(values)
+                super().extend(values)
+
+        g['distance_data'] = CountingDeque(g['distance_data'], maxlen=g['distance_data'].maxlen)
+        consumed = lambda: CountingDeque.count
+    else:
+        consumed = lambda: g['index']
+
+    fig = g['fig']
+    fig.canvas.draw()
+    interval = FRAME_INTERVAL[script]
+    frames = []
+    stop = time.monotonic() + duration
+    frame = 0
+    while time.monotonic() < stop:
+        start = time.monotonic()
+        artists = g['update'](frame)
+        if BLIT[script]:
+            for artist in artists:
+                artist.axes.draw_artist(artist)
+        else:
+            fig.canvas.draw()
+        end = time.monotonic()
+        frames.append((end, consumed(), end - start))
+        frame += 1
+        time.sleep(max(0.0, interval - (end - start)))
+    return {'frames': frames}
+
+
+# ---- Parent: simulator, child process and the numbers ----
+
+def synthetic_path(count):
+    return [(LAT0 + i * STEP, 81.8 + 1e-4 * math.sin(i / 50)) for i in range(count)]
+
+
+def sent_time(replay, count):
+    """Monotonic time the simulator sent sample number `count` (1-based)."""
+    i = bisect_left(replay.sent, (0, count), key=lambda s: (0, s[1]))
+    return replay.sent[i][0] if i < len(replay.sent) else None
+
+
+def bench(name, args):
+    script, kind, extra_env, transport, native_rate = TARGETS[name]
+    rate = native_rate * args.speedup
+    samples = int(rate * (args.duration + 5)) + 100
+    burst = {'jitter': args.jitter, 'burst_every': args.burst_every, 'burst_size': args.burst_size}
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONWARNINGS="ignore", **extra_env)
+    # A sped-up replay moves faster than any robot; the GPS filter would drop it as outliers
+    env.setdefault("GPS_FILTER", "none")
+    env.setdefault("DISTANCE_SERVER", "")  # viewers straight to the simulator, not a local distance_daemon.py
+
+    replay = gps = None
+    if transport == "http":
+        gps = FakeGPS(synthetic_path(samples), rate=rate, jitter=args.jitter)
+        server = start_http_server(gps, port=0)
+        env['ESP_IP'] = f"127.0.0.1:{server.server_address[1]}"
+    else:
+        if transport == "distance":
+            values = synthetic_distances(samples, no_echo=0)
+            encode = distance_encoder(values)
+        else:
+            encode = gps_encoder(synthetic_path(samples), "text" if transport == "text" else "nmea")
+        replay = Replay([i / native_rate for i in range(samples)], encode, args.speedup,
+                        loop=False, record=True, **burst)
+        server = start_stream_server(lambda: replay, port=0)
+        port = server.server_address[1]
+        if transport == "distance":
+            env.update(ESP_IP="127.0.0.1", ESP_PORT=str(port))
+        elif transport == "nmea-tcp":
+            env['ESP_NMEA'] = f"127.0.0.1:{port}"
+        else:
+            env['GPS_PORT'] = f"socket://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:  # trip logs and KML land here
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name,
+                              "--duration", str(args.duration)],
+                             cwd=tmp, env=env, capture_output=True, text=True)
+    server.shutdown()
+    if out.returncode != 0:
+        print(f"{name:15s} failed:\n{out.stderr[-2000:]}")
+        return
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    if kind == "viewer":
+        frames = result['frames']
+        taken = frames[-1][1] - frames[0][1]
+        elapsed = frames[-1][0] - frames[0][0]
+        latency = [end - sent_time(replay, count) for end, count, _ in frames
+                   if count and sent_time(replay, count) is not None]
+        frame_ms = [f[2] * 1000 for f in frames]
+        print(f"{name:15s} {rate:8.0f}/s offered {taken / elapsed:8.0f}/s taken in"
+              f"  latency p50 {percentile(latency, .5) * 1000:7.1f} ms p95 {percentile(latency, .95) * 1000:7.1f} ms"
+              f"  frame p50 {percentile(frame_ms, .5):5.1f} ms p95 {percentile(frame_ms, .95):5.1f} ms")
+    else:
+        arrivals = result['arrivals']
+        if len(arrivals) < 2:
+            print(f"{name:15s} {rate:8.0f}/s offered        0/s taken in")
+            return
+        latency = []
+        for t, lat in arrivals:
+            i = round((lat - LAT0) / STEP)
+            sent = gps.start + i / gps.rate if gps else sent_time(replay, i + 1)
+            if sent is not None:
+                latency.append(t - sent)
+        elapsed = arrivals[-1][0] - arrivals[0][0]
+        print(f"{name:15s} {rate:8.0f}/s offered {(len(arrivals) - 1) / elapsed:8.0f}/s taken in"
+              f"  latency p50 {percentile(latency, .5) * 1000:7.1f} ms p95 {percentile(latency, .95) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay benchmark of the viewers and servers")
+    parser.add_argument("targets", nargs="*", help=", ".join(TARGETS) + " (default: all)")
+    parser.add_argument("--speedup", type=float, default=100.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-size", type=int, default=10)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        script, kind = TARGETS[args.child][:2]
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run_child(script, kind, args.duration)))
+        sys.exit(0)
+
+    print(f"speedup {args.speedup:g}x, {args.duration:g} s per target, jitter {args.jitter * 1000:g} ms,"
+          f" bursts {'every %d of %d' % (args.burst_every, args.burst_size) if args.burst_every else 'off'}")
+    for name in args.targets or TARGETS:
+        bench(name, args)
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from track_store import SCALE, TrackStore
+
+# Ingest stalls caused by /location readers. One writer appends fixes at
+# 200 Hz while reader threads keep fetching the whole kept path, as a page
+# load or a client without a cursor does. TrackStore readers copy array
+# slices without the writer's lock; LockedTrackStore builds the path while
+# holding the lock that append() needs, like TrackStore did before. Lateness
+# is how long after its scheduled time each append completed: waiting for
+# the lock and for the GIL both count.
+#
+#   python benchmarks/bench_shared_state.py [readers]
+
+POINTS = 20_000     # kept fixes
+RATE = 200          # writer appends per second
+READERS = 4         # default, or the first argument
+RUN_SECONDS = 5
+
+
+class LockedTrackStore(TrackStore):
+    def points_since(self, since):
+        with self.write_lock:
+            return super().points_since(since)
+
+
+def run(store_class, readers):
+    store = store_class(capacity=POINTS)
+    for i in range(POINTS):
+        store.append(25 + i / SCALE, 81 + i / SCALE, 1.0, 7, i)
+    stop = threading.Event()
+    reads = [0] * readers
+
+    def reader(k):
+        while not stop.is_set():
+            store.points_since(0)
+            reads[k] += 1
+
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+    for t in threads:
+        t.start()
+
+    late = []
+    begin = deadline = time.perf_counter()
+    while time.perf_counter() < begin + RUN_SECONDS:
+        deadline = max(deadline + 1 / RATE, time.perf_counter() - 1 / RATE)  # skip missed slots
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+        store.append(25.0, 81.0, 1.0, 7)
+        late.append(time.perf_counter() - deadline)
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    for t in threads:
+        t.join()
+
+    late.sort()
+    print(f"  {store_class.__name__:17s} {len(late) / elapsed:5.0f} appends/s"
+          f"  late p50 {late[len(late) // 2] * 1000:6.2f} ms  p99 {late[int(len(late) * 0.99)] * 1000:6.2f} ms"
+          f"  max {late[-1] * 1000:6.2f} ms  reads {sum(reads) / elapsed:4.0f}/s")
+
+
+if __name__ == "__main__":
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else READERS
+    print(f"{POINTS:,} kept fixes, {readers} readers fetching all of them, writer at {RATE} Hz")
+    for store_class in (LockedTrackStore, TrackStore):
+        run(store_class, readers)
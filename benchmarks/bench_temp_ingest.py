@@ -0,0 +1,126 @@
+import argparse
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Codes"))
+from temp import IngestServer
+
+# Load generator for the GPS ingest of Codes/temp.py. N senders each keep a
+# connection open and write "lat,lon" lines, in batches, at a given rate per
+# sender or as fast as they can; a consumer thread drains the ingest queue.
+# Reports fixes per second written to the sockets, parsed by the server,
+# taken off the queue and dropped from it (flat out, the writers fill the
+# socket buffers faster than one thread can parse). The first row is the old
+# one-connection-per-fix protocol, for comparison. With --target the fixes go
+# to a running temp.py instead.
+#
+#   python benchmarks/bench_temp_ingest.py [--rate 0] [--duration 3] [senders ...]
+#   python benchmarks/bench_temp_ingest.py --target 127.0.0.1:5050 --rate 50 10
+
+SENDERS = (1, 10, 100)
+BATCH = 50  # lines per send() when sending flat out
+LAT0, LON0 = 25.4691, 81.8199
+
+
+def line(i):
+    return f"{LAT0 + (i % 10000) * 1e-6:.7f},{LON0 + (i % 7919) * 1e-6:.7f}\n".encode()
+
+
+def sender(address, rate, stop, counts, index):
+    """One long-lived connection; rate fixes/s, or flat out for rate 0."""
+    sent = 0
+    try:
+        with socket.create_connection(address) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            start = time.perf_counter()
+            while not stop.is_set():
+                if rate:
+                    due = int((time.perf_counter() - start) * rate) + 1  # fixes that should be out by now
+                    if due <= sent:
+                        time.sleep(min(0.01, (sent + 1) / rate - (time.perf_counter() - start)))
+                        continue
+                    n = due - sent
+                else:
+                    n = BATCH
+                sock.sendall(b''.join(line(sent + k) for k in range(n)))
+                sent += n
+    except OSError:
+        counts['refused'] += 1
+    counts[index] = sent
+
+
+def one_per_connection(address, stop, counts):
+    """The old protocol: connect, one record without a newline, close."""
+    sent = 0
+    while not stop.is_set():
+        try:
+            with socket.create_connection(address) as sock:
+                sock.sendall(line(sent).strip())
+            sent += 1
+        except OSError:
+            counts['refused'] += 1
+    counts[0] = sent
+
+
+def drain(fixes, stop, taken):
+    while not stop.is_set():
+        try:
+            fixes.get(timeout=0.1)
+            taken[0] += 1
+        except queue.Empty:
+            pass
+
+
+def run(address, senders, args, server=None, persistent=True):
+    stop = threading.Event()
+    counts = {'refused': 0}
+    taken = [0]
+    if server:
+        threading.Thread(target=drain, args=(server.fixes, stop, taken), daemon=True).start()
+    if persistent:
+        threads = [threading.Thread(target=sender, args=(address, args.rate, stop, counts, i))
+                   for i in range(senders)]
+    else:
+        threads = [threading.Thread(target=one_per_connection, args=(address, stop, counts))]
+    received, dropped = (server.received, server.dropped) if server else (0, 0)
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()  # flat out, writers may still wait on full socket buffers
+    elapsed = time.perf_counter() - start
+    sent = sum(v for k, v in counts.items() if k != 'refused')
+    name = f"{senders:4d} senders" if persistent else "one connection per fix"
+    if server is None:
+        print(f"{name:24s} {sent / elapsed:10,.0f} fixes/s sent, {counts['refused']} refused")
+        return
+    print(f"{name:24s} {sent / elapsed:10,.0f} fixes/s written  {(server.received - received) / elapsed:10,.0f} parsed"
+          f"  {taken[0] / elapsed:10,.0f} consumed  {(server.dropped - dropped) / elapsed:10,.0f} dropped"
+          f"  {counts['refused']} refused")
+    time.sleep(0.5)  # the server finishes what is still buffered before the next row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=0.0, help="fixes per second per sender, 0 for flat out")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--target", help="host:port of a running temp.py instead of an in-process server")
+    parser.add_argument("senders", nargs="*", type=int, default=SENDERS)
+    args = parser.parse_args()
+
+    if args.target:
+        host, port = args.target.rsplit(":", 1)
+        for n in args.senders:
+            run((host, int(port)), n, args)
+        sys.exit()
+    server = IngestServer("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    run(server.address, 1, args, server, persistent=False)
+    for n in args.senders:
+        run(server.address, n, args, server)
@@ -0,0 +1,118 @@
+import http.server
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tile_cache import Prefetcher, TileCache, tile_xy
+
+# Tile serving from tile_cache.py: cost of one tile from the memory LRU and
+# from the MBTiles file, then a drive where the dashboard follows the robot
+# and loads its viewport each fix, against an upstream that answers after
+# UPSTREAM_MS. Reports how long the viewport loads take with and without the
+# per-fix prefetch, online with an empty store and offline from a filled one.
+#
+#   python benchmarks/bench_tiles.py [fixes]
+
+TILE_BYTES = 20000         # a typical street-map PNG
+UPSTREAM_MS = 40
+VIEW = (5, 4)              # tiles across and down in the dashboard's viewport
+ZOOM = 17
+FIXES = 300
+FIX_INTERVAL = 0.05        # s between fixes, wall clock (the drive runs sped up)
+SPEED = 12.0               # m/s
+LAT0, LON0 = 25.4691, 81.8199
+
+
+class Upstream(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(UPSTREAM_MS / 1000)
+        body = self.path.encode().ljust(TILE_BYTES, b'\0')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_upstream():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+
+
+def drive(count):
+    heading = 0.6
+    for i in range(count):
+        heading += 0.002 * math.sin(i / 50)
+        d = SPEED * i  # meters along the drive, one fix per simulated second
+        yield (LAT0 + d * math.cos(heading) / 111195.0,
+               LON0 + d * math.sin(heading) / (111195.0 * math.cos(math.radians(LAT0))))
+
+
+def viewport(lat, lon):
+    x, y = tile_xy(lat, lon, ZOOM)
+    return [(ZOOM, int(x) + dx, int(y) + dy)
+            for dy in range(-(VIEW[1] // 2), VIEW[1] - VIEW[1] // 2)
+            for dx in range(-(VIEW[0] // 2), VIEW[0] - VIEW[0] // 2)]
+
+
+def run(cache, prefetch, fixes):
+    prefetcher = Prefetcher(cache, zooms=(ZOOM,))
+    loads, shown = [], set()
+    for i, (lat, lon) in enumerate(drive(fixes)):
+        tick = time.perf_counter()
+        if prefetch:
+            prefetcher.update(lat, lon, float(i))
+        wanted = [key for key in viewport(lat, lon) if key not in shown]  # the browser keeps shown tiles
+        if wanted:
+            start = time.perf_counter()
+            for key in wanted:
+                cache.get(*key)
+                shown.add(key)
+            loads.append((time.perf_counter() - start) * 1000)
+        time.sleep(max(0.0, FIX_INTERVAL - (time.perf_counter() - tick)))
+    return loads
+
+
+def report(name, loads):
+    loads = sorted(loads)
+    print(f"  {name:34s} {len(loads):4d} pans  median {statistics.median(loads):7.2f} ms"
+          f"  p95 {loads[int(len(loads) * .95)]:7.2f} ms  worst {loads[-1]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    fixes = int(sys.argv[1]) if len(sys.argv) > 1 else FIXES
+    url = start_upstream()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Single tile lookups
+        cache = TileCache(os.path.join(tmp, "single.mbtiles"), url="")
+        keys = [(ZOOM, x, y) for x in range(100000, 100040) for y in range(50000, 50025)]
+        for z, x, y in keys:
+            cache.store.put(z, x, y, os.urandom(TILE_BYTES))
+        start = time.perf_counter()
+        for key in keys:
+            cache.get(*key)
+        disk = (time.perf_counter() - start) / len(keys) * 1e6
+        start = time.perf_counter()
+        for _ in range(10):
+            for key in keys:
+                cache.get(*key)
+        memory = (time.perf_counter() - start) / len(keys) / 10 * 1e6
+        print(f"one tile: {memory:.1f} us from memory, {disk:.1f} us from the MBTiles file,"
+              f" about {UPSTREAM_MS} ms upstream")
+
+        print(f"following the robot at zoom {ZOOM}, {VIEW[0]}x{VIEW[1]} tile viewport, {fixes} fixes:")
+        for prefetch in (False, True):
+            cache = TileCache(os.path.join(tmp, f"online{prefetch}.mbtiles"), url=url)
+            report(f"online, empty store, {'prefetch' if prefetch else 'no prefetch'}", run(cache, prefetch, fixes))
+        for prefetch in (False, True):
+            filled = os.path.join(tmp, f"online{prefetch}.mbtiles")  # what the online drive stored
+            cache = TileCache(filled, url="")
+            report(f"offline, filled store, {'prefetch' if prefetch else 'no prefetch'}", run(cache, prefetch, fixes))
@@ -0,0 +1,287 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from distance_filter import parse_reading
+from distance_log import DistanceLog
+
+# Headless owner of the ESP's distance socket. The firmware (Codes/esp_wifi.c++)
+# serves one client at a time, so this holds that connection, records every
+# reading to a distance log (distance_log.py) and fans the stream out to any
+# number of local clients:
+#
+#   TCP        the ESP's own protocol, one reading per line ("No echo" kept),
+#              so map_2D.py and aa.py read it unchanged
+#   WebSocket  a text message per batch: {"t": received, "d": [cm or null, ...]}
+#
+# New clients first get the last BACKLOG readings, so a plot starts full. A
+# client that falls behind loses its oldest chunks rather than slowing the
+# others. After IDLE_CHECK seconds without readings each client's connection
+# is checked (WebSocket clients are pinged), so viewers that went away while
+# the ESP is quiet do not keep their thread and queue. The viewers connect
+# here when DISTANCE_SERVER answers and go to the ESP directly otherwise.
+#
+#   python distance_daemon.py [--esp 192.168.137.112:80] [--port 8090] [--ws-port 8091]
+#   python map_2D.py    # and aa.py, as many as wanted
+
+DISTANCE_SERVER = os.environ.get("DISTANCE_SERVER", "127.0.0.1:8090")  # "" to always use the ESP
+ESP_ADDRESS = f"{os.environ.get('ESP_IP', '192.168.137.112')}:{os.environ.get('ESP_PORT', 80)}"
+DEFAULT_LOG = "distance.dlog"
+BACKLOG = 200       # readings replayed to a new client
+MAX_PENDING = 256   # chunks queued per client before its oldest are dropped
+IDLE_CHECK = 5.0    # s without readings before a client's connection is checked
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def connect(esp_address, server=DISTANCE_SERVER, timeout=None):
+    """(socket, address) of the distance stream: the daemon if it answers, else the ESP."""
+    if server:
+        host, port = server.rsplit(":", 1)
+        try:
+            sock = socket.create_connection((host, int(port)), timeout=0.5)
+            sock.settimeout(timeout)
+            return sock, server
+        except OSError:
+            pass
+    sock = socket.create_connection(esp_address, timeout=timeout)
+    return sock, f"{esp_address[0]}:{esp_address[1]}"
+
+
+class Hub:
+    """Fans chunks of the stream out to subscribed clients. publish() never blocks."""
+
+    def __init__(self, backlog=BACKLOG, max_pending=MAX_PENDING):
+        self.recent = deque(maxlen=backlog)  # (received, line)
+        self.max_pending = max_pending
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.published = 0  # readings so far
+
+    def publish(self, received, lines):
+        chunk = (received, lines)
+        with self.lock:
+            self.recent.extend((received, line) for line in lines)
+            self.published += len(lines)
+            clients = list(self.clients)
+        for q in clients:
+            try:
+                q.put_nowait(chunk)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(chunk)
+                except queue.Full:
+                    pass
+
+    def subscribe(self, alive=None):
+        """Generator of (received, [line, ...]) chunks, starting with the backlog.
+
+        Ends once `alive()`, called after every IDLE_CHECK seconds without a
+        chunk, returns False.
+        """
+        q = queue.Queue(self.max_pending)
+        with self.lock:
+            self.clients.add(q)
+            recent = list(self.recent)
+        try:
+            if recent:
+                yield recent[-1][0], [line for _, line in recent]
+            while True:
+                try:
+                    yield q.get(timeout=IDLE_CHECK)
+                except queue.Empty:
+                    if alive and not alive():
+                        return
+        finally:
+            with self.lock:
+                self.clients.discard(q)
+
+
+def read_esp(address, hub, log=None, timeout=5):
+    """Read the ESP's distance stream forever, reconnecting, and publish every line."""
+    host, port = address.rsplit(":", 1)
+    while True:
+        buffer = b''
+        try:
+            with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+                print(f"Connected to ESP at {address}")
+                while True:
+                    try:
+                        data = sock.recv(4096)
+                    except socket.timeout:
+                        continue  # the sensor is just quiet
+                    if not data:
+                        break
+                    received = time.time()
+                    buffer += data
+                    *lines, buffer = buffer.split(b'\n')
+                    lines = [line.rstrip(b'\r') for line in lines if line.strip()]
+                    if not lines:
+                        continue
+                    if log:
+                        log.append(received, [parse_reading(line) for line in lines])
+                    hub.publish(received, lines)
+        except Exception as e:
+            print("ESP stream error:", e)
+        time.sleep(1)  # reconnect
+
+
+def connected(sock):
+    """False once the peer has closed `sock`; never blocks or consumes data."""
+    try:
+        if not select.select([sock], [], [], 0)[0]:
+            return True  # nothing to read: still open
+        return sock.recv(1, socket.MSG_PEEK) != b''
+    except OSError:
+        return False
+
+
+def make_tcp_server(hub, host="127.0.0.1", port=8090):
+    """Line protocol server, same format as the ESP."""
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                for _, lines in hub.subscribe(lambda: connected(self.request)):
+                    self.request.sendall(b''.join(line + b'\r\n' for line in lines))
+            except OSError:
+                pass  # client went away
+
+    return _server(Handler, host, port)
+
+
+def make_ws_server(hub, host="127.0.0.1", port=8091):
+    """WebSocket server for browser pages; incoming data messages are ignored."""
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            headers = {}
+            for line in iter(self.rfile.readline, b'\r\n'):
+                if not line:
+                    return
+                name, _, value = line.decode('latin-1').partition(":")
+                headers[name.strip().lower()] = value.strip()
+            key = headers.get('sec-websocket-key')
+            if not key:
+                self.wfile.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                return
+            accept = base64.b64encode(hashlib.sha1(key.encode() + WS_GUID).digest())
+            self.wfile.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.send_lock = threading.Lock()  # frames from this thread and the reader's replies
+            self.closed = threading.Event()  # the client closed, or the connection broke
+            threading.Thread(target=self.read_frames, daemon=True).start()
+            try:
+                for received, lines in hub.subscribe(self.ping):
+                    if self.closed.is_set():
+                        break
+                    values = [parse_reading(line) for line in lines]
+                    message = json.dumps({'t': received, 'd': [None if v != v else v for v in values]})
+                    self.send(ws_frame(message.encode()))
+            except OSError:
+                pass
+
+        def send(self, frame):
+            with self.send_lock:
+                self.request.sendall(frame)
+
+        def ping(self):
+            """Liveness check while idle; a dead peer makes the send fail eventually."""
+            if self.closed.is_set():
+                return False
+            try:
+                self.send(ws_frame(b'', WS_PING))
+                return True
+            except OSError:
+                return False
+
+        def read_frames(self):
+            # Client frames: answer pings, echo a close and stop; data is ignored
+            try:
+                while True:
+                    opcode, payload = read_ws_frame(self.rfile)
+                    if opcode == WS_CLOSE:
+                        self.send(ws_frame(payload[:2], WS_CLOSE))
+                        break
+                    if opcode == WS_PING:
+                        self.send(ws_frame(payload, WS_PONG))
+            except (OSError, EOFError):
+                pass
+            self.closed.set()
+
+    return _server(Handler, host, port)
+
+
+def ws_frame(payload, opcode=WS_TEXT):
+    """One unmasked, final WebSocket frame (server to client), text by default."""
+    n = len(payload)
+    first = 0x80 | opcode
+    if n < 126:
+        header = bytes((first, n))
+    elif n < 1 << 16:
+        header = bytes((first, 126)) + n.to_bytes(2, 'big')
+    else:
+        header = bytes((first, 127)) + n.to_bytes(8, 'big')
+    return header + payload
+
+
+def read_ws_frame(rfile):
+    """(opcode, unmasked payload) of the next frame; EOFError when the stream ends."""
+    def read(n):
+        data = rfile.read(n)
+        if len(data) < n:
+            raise EOFError
+        return data
+    first, second = read(2)
+    n = second & 0x7f
+    if n == 126:
+        n = int.from_bytes(read(2), 'big')
+    elif n == 127:
+        n = int.from_bytes(read(8), 'big')
+    mask = read(4) if second & 0x80 else None  # clients always mask
+    payload = read(n)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0f, payload
+
+
+def _server(handler, host, port):
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record the ESP distance stream and serve it to viewers")
+    parser.add_argument("--esp", default=ESP_ADDRESS, help="ESP distance socket, host:port")
+    parser.add_argument("--host", default="127.0.0.1", help="address to serve on, 0.0.0.0 for the LAN")
+    parser.add_argument("--port", type=int, default=int(DISTANCE_SERVER.rsplit(":", 1)[-1] or 8090),
+                        help="line protocol port")
+    parser.add_argument("--ws-port", type=int, default=8091, help="WebSocket port, 0 to disable")
+    parser.add_argument("--log", default=DEFAULT_LOG, help="distance log to append to, '' for none")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # exit cleanly so the log's last batch is synced
+    hub = Hub()
+    make_tcp_server(hub, args.host, args.port)
+    print(f"Serving distances on {args.host}:{args.port}")
+    if args.ws_port:
+        make_ws_server(hub, args.host, args.ws_port)
+        print(f"WebSocket on ws://{args.host}:{args.ws_port}/")
+    read_esp(args.esp, hub, DistanceLog(args.log) if args.log else None)
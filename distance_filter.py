@@ -0,0 +1,147 @@
+import math
+import numpy as np
+
+# Cleans the ultrasonic distance stream before it is plotted and compared
+# with the viewers' thresholds. Readings arrive a few per frame and are
+# filtered as one NumPy batch per frame, in this order:
+#
+#   range    readings outside MIN_CM..MAX_CM (0 / "No echo") are dropouts:
+#            the filtered series holds its last value through them
+#   Hampel   a reading further than SIGMAS robust standard deviations
+#            (1.4826 * MAD, at least MIN_SPREAD) from the median of the
+#            last WINDOW readings is a spike and replaced by that median.
+#            The window trails, so a real step shows WINDOW // 2 readings late
+#   rate     the filtered distance rises at most MAX_RISE cm per reading;
+#            falls (something closing in) are not limited unless max_fall is set
+#   EMA      exponential smoothing with ALPHA, in closed form per block
+#
+# Each stage keeps its state across batches, so the result is the same
+# however the readings are split into frames. process() returns the raw
+# batch (NaN for lines that were not a number) next to the filtered one.
+
+MIN_CM, MAX_CM = 2.0, 200.0  # HC-SR04 range
+WINDOW = 3
+SIGMAS = 3.0
+MIN_SPREAD = 2.0  # cm, so integer readings of a still target do not count as spikes
+MAX_RISE = 30.0   # cm per reading
+ALPHA = 0.5
+
+
+def _median(rows):
+    # np.median's per-call overhead is most of the cost for a window of 3 or 5
+    s = np.sort(rows, axis=1)
+    w = rows.shape[1]
+    return (s[:, (w - 1) // 2] + s[:, w // 2]) / 2
+
+
+def parse_reading(text):
+    """Distance in cm from one line of the stream, NaN for 'No echo' and garbage."""
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+class DistanceFilter:
+    """Range check, Hampel despiking, rate limit and EMA over batches of readings.
+
+    window=1, max_rise=None and alpha=1 turn the respective stage off.
+    """
+
+    def __init__(self, window=WINDOW, sigmas=SIGMAS, max_rise=MAX_RISE, max_fall=None, alpha=ALPHA,
+                 low=MIN_CM, high=MAX_CM, min_spread=MIN_SPREAD):
+        self.window = window
+        self.sigmas = sigmas
+        self.max_rise = max_rise
+        self.max_fall = max_fall
+        self.alpha = alpha
+        self.low, self.high = low, high
+        self.min_spread = min_spread
+        self.history = np.empty(0)  # last window - 1 valid readings, for the Hampel window
+        self.limited = math.nan     # last output of the rate limit
+        self.last = math.nan        # last filtered value
+        self.spikes = 0             # readings replaced so far
+        self.dropouts = 0
+
+    def process(self, values):
+        """Filter a batch; returns (raw, filtered) float arrays of the same length."""
+        raw = np.asarray(values, dtype=float)
+        n = len(raw)
+        if not n:
+            return raw, raw.copy()
+        valid = (raw >= self.low) & (raw <= self.high)  # False for NaN
+        self.dropouts += n - int(valid.sum())
+        v = raw[valid]
+        if len(v):
+            v = self._rate_limit(self._despike(v))
+            v = self._ema(v)
+        # Dropouts hold the previous filtered value
+        out = np.concatenate(([self.last], np.empty(n)))
+        out[1:][valid] = v
+        slot = np.where(np.concatenate(([True], valid)), np.arange(n + 1), 0)
+        out = out[np.maximum.accumulate(slot)][1:]
+        self.last = out[-1]
+        return raw, out
+
+    def _despike(self, v):
+        w = self.window
+        if w <= 1:
+            return v
+        ext = np.concatenate((self.history, v))
+        self.history = ext[-(w - 1):]
+        m = min(len(v), len(ext) - w + 1)  # readings with a full window behind them
+        if m <= 0:
+            return v
+        start = len(ext) - m - w + 1
+        win = np.column_stack([ext[start + k:start + k + m] for k in range(w)])  # row i: window ending at tail[i]
+        med = _median(win)
+        spread = 1.4826 * _median(np.abs(win - med[:, None]))
+        tail = v[-m:]
+        spike = np.abs(tail - med) > self.sigmas * np.maximum(spread, self.min_spread)
+        if spike.any():
+            v = v.copy()
+            v[len(v) - m:][spike] = med[spike]
+            self.spikes += int(spike.sum())
+        return v
+
+    def _rate_limit(self, v):
+        rise = math.inf if self.max_rise is None else self.max_rise
+        fall = math.inf if self.max_fall is None else self.max_fall
+        prev = v[0] if math.isnan(self.limited) else self.limited
+        step = np.diff(v, prepend=prev)
+        over = np.flatnonzero((step > rise) | (step < -fall)).tolist()
+        if over:
+            out = v.tolist()
+            done = 0  # readings [0, done) are final
+            for i in over:
+                if i < done:
+                    continue
+                # Clip one reading at a time until the output has caught up
+                # with the input; after that the input's own steps apply again
+                y = out[i - 1] if i else prev
+                while i < len(out):
+                    c = min(max(out[i], y - fall), y + rise)
+                    if c == out[i]:
+                        break
+                    out[i] = y = c
+                    i += 1
+                done = i
+            v = np.array(out)
+        self.limited = v[-1]
+        return v
+
+    def _ema(self, v):
+        a = self.alpha
+        if a >= 1:
+            return v
+        b = 1.0 - a
+        y0 = v[0] if math.isnan(self.last) else self.last
+        block = int(250 / -math.log10(b)) if b > 0 else len(v)  # keeps b ** -block finite
+        out = np.empty(len(v))
+        for s in range(0, len(v), block):
+            x = v[s:s + block]
+            p = b ** np.arange(len(x))  # y[i] = b^(i+1) y0 + a sum_j b^(i-j) x[j]
+            y = p * (b * y0 + a * np.cumsum(x / p))
+            out[s:s + len(x)] = y
+            y0 = y[-1]
+        return out
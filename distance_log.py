@@ -0,0 +1,40 @@
+import struct
+import sys
+import numpy as np
+from record_log import RecordLog, RecordLogReader
+
+# Append-only binary log of the ultrasonic distance stream, written by
+# distance_daemon.py. Records are fixed 12-byte structs, the time the reading
+# was received and the distance in cm (NaN for "No echo"), in a record_log.py
+# log like the trip log. DistanceLogReader memory-maps the file for
+# time-range queries; the command line prints a log as text, one reading per
+# line, which esp_simulator.py --distances replays:
+#
+#   python distance_log.py distance.dlog [> capture.txt]
+
+RECORD = struct.Struct('<df')
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('distance', '<f4')])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+class DistanceLog(RecordLog):
+    """Writer; owned by a single reader thread."""
+
+    def __init__(self, file_path, sync_every=64, sync_seconds=5.0):
+        super().__init__(file_path, RECORD_DTYPE, sync_every, sync_seconds)
+
+    def append(self, t, distances):
+        """Record readings received together at time `t`."""
+        self.write(b''.join(RECORD.pack(t, d) for d in distances), len(distances))
+
+
+class DistanceLogReader(RecordLogReader):
+    """Time-range queries over a distance log; see RecordLogReader."""
+
+    def __init__(self, file_path):
+        super().__init__(file_path, RECORD_DTYPE)
+
+
+if __name__ == '__main__':
+    for d in DistanceLogReader(sys.argv[1]).refresh()['distance'].tolist():
+        print("No echo" if d != d else f"{d:g}")
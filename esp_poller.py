@@ -0,0 +1,63 @@
+import time
+import requests
+
+# Polls the ESP /gps endpoint over one persistent HTTP connection.
+# Polls are scheduled against absolute deadlines, so request latency does not
+# stretch the period. The interval shrinks while the fix is changing and grows
+# back while the robot stands still.
+
+
+class EspPoller:
+    def __init__(self, endpoint, min_interval=0.25, max_interval=2.0, timeout=2, metrics=None):
+        self.endpoint = endpoint
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.interval = 1.0
+        self.session = requests.Session()  # keeps the TCP connection alive between polls
+        self.last_fix = None
+        self.metrics = metrics  # records poll_rtt_ms when set
+
+    def poll(self):
+        """Fetch one reading. Returns the decoded JSON, or None on a non-200 reply.
+
+        The reading gets a 'received' time.time() stamp for latency metrics.
+        """
+        start = time.perf_counter()
+        resp = self.session.get(self.endpoint, timeout=self.timeout)
+        if self.metrics:
+            self.metrics.observe('poll_rtt_ms', (time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        data['received'] = time.time()
+        return data
+
+    def adapt(self, data):
+        """Poll faster while the position changes, slower while it doesn't."""
+        fix = (data.get('lat'), data.get('lon'))
+        if fix[0] is None or fix == self.last_fix:
+            self.interval = min(self.max_interval, self.interval * 1.25)
+        else:
+            self.interval = max(self.min_interval, self.interval / 2)
+        self.last_fix = fix
+
+    def run(self, on_data):
+        """Poll forever, calling on_data(json) for every successful reply."""
+        deadline = time.monotonic()
+        while True:
+            try:
+                data = self.poll()
+                if data is not None:
+                    self.adapt(data)
+                    on_data(data)
+            except Exception as e:
+                print("GPS fetch error:", e)
+                self.session.close()  # reconnect on the next poll
+
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()  # fell behind: skip missed slots instead of bursting
@@ -0,0 +1,290 @@
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from distance_log import DistanceLogReader
+from geodesy import load_track
+from kml_sink import load_kml_path
+from nmea import encode_fix
+
+# Stand-in for the robot's hardware so every script can be run and load-tested
+# without it. Three transports, each replaying a recorded or synthetic stream:
+#
+#   HTTP /gps     the ESP8266 in Codes/GPS+wifi.c++, for Map_GPS.py / fleet.py
+#   distance TCP  the ultrasonic stream of Codes/2D.c++, for map_2D.py / aa.py
+#   serial        the GPS sketch output (text, CSV or raw NMEA) for SVmap_GPS.py,
+#                 over TCP (pyserial socket:// URL), a pty, or a real COM port
+#
+# GPS comes from a .kml path (one fix per 1/--rate seconds) or a .trip log (its
+# own timestamps); distances from a capture with one reading per line, a
+# distance_daemon.py log (.dlog), or a synthetic walk. --speedup replays N times faster than recorded; --jitter and
+# --burst-every/--burst-size add the delays and stalls of a real Wi-Fi link.
+#
+#   python esp_simulator.py --port 8080
+#   ESP_IP=127.0.0.1:8080 python Map_GPS.py
+#
+#   python esp_simulator.py --distance-port 8081 --speedup 20
+#   ESP_IP=127.0.0.1 ESP_PORT=8081 python map_2D.py
+#
+#   python esp_simulator.py --serial-port 8082 --serial-format nmea --rate 10
+#   GPS_PORT=socket://127.0.0.1:8082 GPS_FORMAT=nmea python SVmap_GPS.py
+#   ESP_NMEA=127.0.0.1:8082 python Map_GPS.py    # as the ESP's raw NMEA port
+#
+# --count N starts N independent HTTP units on consecutive ports for fleet.py.
+
+DEFAULT_KML = "live_path.kml"
+DISTANCE_RATE = 2.0  # readings per second of Codes/2D.c++ (delay(500))
+
+
+class FakeGPS:
+    """Replays a path at `rate` fixes per second, looping at the end."""
+
+    def __init__(self, points, rate=1.0, satellites=7, latency=0.0, offset=0, jitter=0.0):
+        self.points = points
+        self.rate = rate
+        self.satellites = satellites
+        self.latency = latency  # seconds the fake ESP takes to answer
+        self.jitter = jitter    # plus up to this much, at random
+        self.start = time.monotonic() - offset / rate  # start `offset` points in
+
+    def current(self):
+        i = int((time.monotonic() - self.start) * self.rate) % len(self.points)
+        lat, lon = self.points[i]
+        return {'lat': round(lat, 6), 'lon': round(lon, 6), 'satellites': self.satellites}
+
+    def delay(self):
+        return self.latency + random.uniform(0, self.jitter) if self.jitter else self.latency
+
+
+def make_http_server(gps, host="127.0.0.1", port=8080):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def do_GET(self):
+            if self.path != "/gps":
+                self.send_error(404)
+                return
+            delay = gps.delay()
+            if delay:
+                time.sleep(delay)
+            body = json.dumps(gps.current()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def start_http_server(gps, host="127.0.0.1", port=8080):
+    """Run the fake /gps endpoint on a daemon thread and return the server."""
+    server = make_http_server(gps, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---- Streamed transports ----
+
+class Replay:
+    """Paces recorded samples onto the wall clock.
+
+    `times` are the recorded sample times in seconds (any origin). Sample i is
+    due at (times[i] - times[0]) / speedup after the start, plus up to `jitter`
+    seconds. With burst_every set, after every burst_every samples the next
+    burst_size are held back and sent together, like a stalled link flushing.
+    """
+
+    def __init__(self, times, encode, speedup=1.0, jitter=0.0, burst_every=0, burst_size=10,
+                 loop=True, record=False):
+        self.times = [t - times[0] for t in times]
+        self.encode = encode  # encode(i, t) -> bytes; t is the replayed timestamp
+        self.speedup = speedup
+        self.jitter = jitter
+        self.burst_every = burst_every
+        self.burst_size = burst_size
+        self.loop = loop
+        self.sent = [] if record else None  # (monotonic send time, sample count) per chunk
+        step = self.times[-1] / (len(times) - 1) if len(times) > 1 else 1.0
+        self.period = self.times[-1] + step  # one lap, for looping
+
+    def chunks(self):
+        """Yield the bytes of each batch of samples once it is due."""
+        start = time.monotonic()
+        epoch = time.time()  # replayed timestamps run from now, at speedup times real time
+        count = 0
+        batch = []
+        while True:
+            for i, t in enumerate(self.times):
+                offset = (count // len(self.times)) * self.period + t
+                batch.append(self.encode(i, epoch + offset))
+                count += 1
+                if self.burst_every and (count - 1) % (self.burst_every + self.burst_size) < self.burst_size:
+                    continue  # held back until the end of the burst
+                due = start + offset / self.speedup
+                if self.jitter:
+                    due += random.uniform(0, self.jitter)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if self.sent is not None:
+                    self.sent.append((time.monotonic(), count))
+                yield b"".join(batch)
+                batch = []
+            if not self.loop:
+                if batch:
+                    yield b"".join(batch)
+                return
+
+
+def gps_encoder(points, fmt, satellites=7):
+    """encode(i, t) for the serial output formats of the GPS sketches."""
+    def encode(i, t):
+        lat, lon = points[i]
+        if fmt == "nmea":
+            return encode_fix(t, lat, lon, satellites=satellites)
+        if fmt == "csv":
+            return f"{lat:.6f},{lon:.6f},0.00,0.0\r\n".encode()
+        return (f"Latitude: {lat:.6f}\r\nLongitude: {lon:.6f}\r\nSatellites in use: {satellites}\r\n"
+                "---------------------------\r\n").encode()
+    return encode
+
+
+def distance_encoder(values):
+    """encode(i, t) for the ultrasonic sketch: one reading per line, 0 is 'No echo'."""
+    lines = [b"No echo\r\n" if not v else b"%d\r\n" % v for v in values]
+    return lambda i, t: lines[i]
+
+
+def synthetic_distances(count, seed=1, no_echo=0.02):
+    """A robot approaching and backing off obstacles, in whole cm up to 200."""
+    rng = random.Random(seed)
+    values = []
+    for i in range(count):
+        d = 100 + 80 * math.sin(i / 40) + rng.gauss(0, 4)
+        values.append(0 if rng.random() < no_echo else int(min(max(d, 2), 200)))
+    return values
+
+
+def load_distances(file_path):
+    if file_path.endswith(".dlog"):  # recorded by distance_daemon.py
+        return [0 if d != d else int(d) for d in DistanceLogReader(file_path).refresh()['distance'].tolist()]
+    values = []
+    with open(file_path) as f:
+        for line in f:
+            try:
+                values.append(int(float(line)))
+            except ValueError:
+                values.append(0)  # "No echo" and noise replay as misses
+    return values
+
+
+def load_gps(file_path, rate=1.0):
+    """(times, points) from a .trip log (recorded times) or a .kml path (1/rate apart)."""
+    if file_path.endswith(".trip"):
+        t, lat, lon = load_track(file_path)
+        return t.tolist(), list(zip(lat.tolist(), lon.tolist()))
+    points = load_kml_path(file_path)
+    return [i / rate for i in range(len(points))], points
+
+
+def make_stream_server(make_replay, host="127.0.0.1", port=8081):
+    """TCP server sending every client its own replay from the start."""
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # a reading per packet, like the ESP
+            try:
+                for chunk in make_replay().chunks():
+                    self.request.sendall(chunk)
+            except OSError:
+                pass  # client went away
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stream_server(make_replay, host="127.0.0.1", port=8081):
+    """Run a stream server on a daemon thread and return it."""
+    server = make_stream_server(make_replay, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_serial(replay, port):
+    """Write a replay to a serial device, or to a new pty when port is 'pty'."""
+    if port == "pty":
+        master, slave = os.openpty()
+        print(f"Serial replay on {os.ttyname(slave)}")
+        write = lambda data: os.write(master, data)
+    else:
+        import serial
+        ser = serial.serial_for_url(port, 9600)
+        print(f"Serial replay on {port}")
+        write = ser.write
+    for chunk in replay.chunks():
+        write(chunk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake ESP GPS and distance endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP /gps port, 0 to disable")
+    parser.add_argument("--track", "--kml", dest="track", default=DEFAULT_KML,
+                        help="GPS to replay: .kml path or .trip log")
+    parser.add_argument("--rate", type=float, default=1.0, help="fixes per second of a .kml path")
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay N times faster (1-1000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per HTTP response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds per sample")
+    parser.add_argument("--burst-every", type=int, default=0, help="hold back samples after every N")
+    parser.add_argument("--burst-size", type=int, default=10, help="samples held back per burst")
+    parser.add_argument("--count", type=int, default=1, help="number of HTTP units, on consecutive ports")
+    parser.add_argument("--distance-port", type=int, default=0, help="distance stream port for map_2D.py/aa.py")
+    parser.add_argument("--distances", help="distance capture to replay (default: synthetic)")
+    parser.add_argument("--serial-port", type=int, default=0, help="TCP port for GPS_PORT=socket://host:port")
+    parser.add_argument("--serial", help="also write the serial stream to this device, or 'pty'")
+    parser.add_argument("--serial-format", choices=("text", "csv", "nmea"), default="text")
+    args = parser.parse_args()
+
+    times, points = load_gps(args.track, args.rate)
+    burst = {'jitter': args.jitter, 'burst_every': args.burst_every, 'burst_size': args.burst_size}
+
+    if args.port:
+        native_rate = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 else args.rate
+        for i in range(args.count):
+            gps = FakeGPS(points, rate=native_rate * args.speedup, latency=args.latency,
+                          offset=i * 7, jitter=args.jitter)
+            start_http_server(gps, args.host, args.port + i)
+        print(f"Fake ESP serving http://{args.host}:{args.port}/gps ({len(points)} points)"
+              + (f" and {args.count - 1} more on the following ports" if args.count > 1 else ""))
+
+    if args.distance_port:
+        values = load_distances(args.distances) if args.distances else synthetic_distances(2000)
+        times_d = [i / DISTANCE_RATE for i in range(len(values))]
+        start_stream_server(lambda: Replay(times_d, distance_encoder(values), args.speedup, **burst),
+                            args.host, args.distance_port)
+        print(f"Distance stream on {args.host}:{args.distance_port}"
+              f" ({DISTANCE_RATE * args.speedup:g} readings/s)")
+
+    def serial_replay():
+        return Replay(times, gps_encoder(points, args.serial_format), args.speedup, **burst)
+
+    if args.serial_port:
+        start_stream_server(serial_replay, args.host, args.serial_port)
+        print(f"Serial {args.serial_format} stream on socket://{args.host}:{args.serial_port}")
+    if args.serial:
+        threading.Thread(target=write_serial, args=(serial_replay(), args.serial), daemon=True).start()
+
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,84 @@
+import time
+from geodesy import RunningStats
+from geofence import GeofenceEngine
+from gps_filter import make_filter
+from location_cache import LocationCache
+from metrics import COUNT_BUCKETS
+from tile_cache import Prefetcher
+from track_index import TrackIndex
+from track_lod import TrackLod
+from track_store import DEFAULT_CAPACITY, TrackStore
+from trip_log import TripLog, TripLogReader, restore
+
+# Everything one robot's fixes go through, shared by Map_GPS.py, SVmap_GPS.py
+# and every robot of fleet.py. Per fix: the filter drops outliers and smooths
+# it, then the running stats, the TrackStore, the trip log, the level-of-
+# detail paths, the track index and the geofences are brought up to date,
+# the tiles ahead are prefetched and a new snapshot replaces `latest`, which
+# is also pushed to /stream clients if there is a broadcaster.
+#
+# Only the ingest thread calls handle(). `latest` is always a new dict that
+# is never modified afterwards, so request threads read a consistent fix
+# without locking: take the reference once, then use that.
+
+
+class FixPipeline:
+    def __init__(self, trip_log_file, geofence_file, tiles, metrics, capacity=DEFAULT_CAPACITY,
+                 broadcaster=None, name=None):
+        self.name = name  # robot id in log lines, for fleets
+        self.metrics = metrics
+        self.track = TrackStore(capacity)  # time, lat, lon, speed and satellites of every kept fix
+        restore(self.track, trip_log_file)
+        self.trip_log = TripLog(trip_log_file)  # every fix, kept across restarts
+        self.trip_reader = TripLogReader(trip_log_file)
+        self.stats = RunningStats()  # distance & speed, updated per fix
+        self.stats.seed_from(self.track)
+        self.gps_filter = make_filter()  # smooths fixes and drops outliers before they are stored
+        self.lod = TrackLod(capacity)  # simplified paths for zoomed-out maps
+        self.lod.update(self.track)
+        self.location_cache = LocationCache(self.track, self.lod)  # /location bodies of the current fix
+        self.track_index = TrackIndex(capacity)  # grid of the track for /near and fence visits
+        self.track_index.update(self.track)
+        self.geofences = GeofenceEngine(geofence_file)  # enter / exit events per fix
+        self.prefetcher = Prefetcher(tiles)  # loads the tiles around and ahead of the robot
+        self.broadcaster = broadcaster  # pushes each new fix to /stream clients
+        self.latest = {'lat': None, 'lon': None, 'satellites': 0, 'speed': 0, 'distance': self.stats.distance}
+
+    def handle(self, data):
+        """Take one reading ('lat', 'lon', optionally 't', 'hdop', 'satellites');
+        returns the new snapshot, or None if the reading was dropped."""
+        lat = data.get('lat')
+        lon = data.get('lon')
+        if lat is None or lon is None:
+            return None
+
+        now = data.get('t') or time.time()  # NMEA fixes carry the receiver's UTC time
+        filtered = self.gps_filter.update(now, lat, lon, data.get('hdop'))
+        if filtered is None:
+            self.metrics.rate('outliers').add()
+            return None
+        lat, lon, speed = filtered  # the filter's speed for every consumer, not the receiver's
+        satellites = data.get('satellites', 0)
+        self.stats.update(now, lat, lon)
+
+        self.track.append(lat, lon, speed, satellites, now)
+        self.trip_log.append(now, lat, lon, speed, satellites)
+        vertex = self.lod.update(self.track)
+        self.track_index.update(self.track)
+        events = self.geofences.update(now, lat, lon)
+        for event in events:
+            print(f"Geofence {event['fence']}: {event['event']}" + (f" ({self.name})" if self.name else ""))
+        self.prefetcher.update(lat, lon, now)
+        self.latest = latest = {
+            'lat': lat,
+            'lon': lon,
+            'satellites': satellites,
+            'speed': speed,  # km/h
+            'distance': self.stats.distance
+        }
+        if self.broadcaster:
+            self.broadcaster.publish(latest | vertex | ({'fence_events': events} if events else {}),
+                                     self.track.seq)
+            self.metrics.observe('queue_depth', self.broadcaster.backlog(), COUNT_BUCKETS)
+        self.metrics.record_fix(data)
+        return latest
@@ -0,0 +1,230 @@
+from flask import Flask, Response, abort, render_template, jsonify, request
+import heapq
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from esp_poller import EspPoller
+from fix_pipeline import FixPipeline
+from gps_stream import FixBroadcaster
+from metrics import Metrics
+from tile_cache import TileCache
+
+# Fleet mode: one process polls the /gps endpoint of many ESP GPS units.
+# A single scheduler thread keeps every robot's next poll deadline in a heap
+# and hands due polls to a small thread pool, so dozens of robots share a few
+# threads instead of one process each.
+#
+#   python fleet.py rover1=192.168.137.98 rover2=192.168.137.27
+#
+# Each robot gets the usual dashboard and endpoints under /robots/<id>/.
+# In production: python serve.py fleet.py rover1=... rover2=...
+
+MAX_HISTORY = 24 * 3600  # fixes kept per robot, a day at 1 Hz (about 1.8 MB)
+POLL_WORKERS = 8
+TRIP_LOG_DIR = "trips"  # a <robot_id>.trip log and <robot_id>.fences.json per robot
+
+app = Flask(__name__)
+metrics = Metrics()  # fleet-wide, served on /metrics
+tiles = TileCache(metrics=metrics)  # map tiles for /tiles, shared by every robot's dashboard
+
+
+class Robot:
+    """Poller and fix pipeline (track, trip log, paths, index, fences) of one robot."""
+
+    __slots__ = ('robot_id', 'poller', 'deadline', 'pipeline')
+
+    def __init__(self, robot_id, esp_ip):
+        self.robot_id = robot_id
+        self.poller = EspPoller(f"http://{esp_ip}/gps", metrics=metrics)
+        self.deadline = 0.0
+        self.pipeline = FixPipeline(os.path.join(TRIP_LOG_DIR, f"{robot_id}.trip"),
+                                    os.path.join(TRIP_LOG_DIR, f"{robot_id}.fences.json"),
+                                    tiles, metrics, capacity=MAX_HISTORY,
+                                    broadcaster=FixBroadcaster(), name=robot_id)
+
+    def latest(self):
+        # Replaced as a whole per fix and never modified, so always consistent
+        return self.pipeline.latest
+
+
+class Fleet:
+    def __init__(self, workers=POLL_WORKERS):
+        self.robots = {}
+        self.heap = []  # (deadline, robot_id)
+        self.cond = threading.Condition()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet-poll")
+        self.polls = 0
+        self.running = False
+
+    def add(self, robot_id, esp_ip):
+        robot = Robot(robot_id, esp_ip)
+        robot.deadline = time.monotonic()
+        with self.cond:
+            self.robots[robot_id] = robot
+            heapq.heappush(self.heap, (robot.deadline, robot_id))
+            self.cond.notify()
+        return robot
+
+    def start(self):
+        with self.cond:
+            self.running = True
+        threading.Thread(target=self._schedule, daemon=True).start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.pool.shutdown(wait=True)
+
+    def _schedule(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    self.cond.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                if not self.running:
+                    return
+                _, robot_id = heapq.heappop(self.heap)
+                # Under the lock: stop() cannot shut the pool down between the
+                # check above and this submit, which would raise RuntimeError
+                self.pool.submit(self._poll, self.robots[robot_id])
+
+    def _poll(self, robot):
+        poller = robot.poller
+        try:
+            data = poller.poll()
+            if data is not None:
+                poller.adapt(data)
+                robot.pipeline.handle(data)
+        except Exception as e:
+            print(f"GPS fetch error ({robot.robot_id}):", e)
+            poller.session.close()
+
+        # Same drift-free schedule as EspPoller.run, one heap entry per robot
+        now = time.monotonic()
+        robot.deadline += poller.interval
+        if robot.deadline < now:
+            robot.deadline = now
+        with self.cond:
+            self.polls += 1
+            if not self.running:
+                return
+            heapq.heappush(self.heap, (robot.deadline, robot.robot_id))
+            self.cond.notify()
+
+
+fleet = Fleet()
+
+
+def get_robot(robot_id):
+    robot = fleet.robots.get(robot_id)
+    if robot is None:
+        abort(404)
+    return robot
+
+
+@app.route('/robots')
+def robots():
+    return jsonify({robot_id: robot.latest() for robot_id, robot in fleet.robots.items()})
+
+
+@app.route('/robots/<robot_id>/')
+def robot_index(robot_id):
+    get_robot(robot_id)
+    return render_template('indexSV.html', base=f'/robots/{robot_id}/')
+
+
+@app.route('/robots/<robot_id>/location')
+def robot_location(robot_id):
+    pipeline = get_robot(robot_id).pipeline
+    since = request.args.get('since', 0, type=int)
+    data = pipeline.latest
+    level = pipeline.lod.level_for(request.args.get('zoom', type=float),
+                                   request.args.get('tolerance', type=float), data['lat'])
+    with metrics.timer('serialize_ms'):
+        return Response(pipeline.location_cache.body(data, since, level), mimetype='application/json')
+
+
+@app.route('/robots/<robot_id>/history')
+def robot_history(robot_id):
+    pipeline = get_robot(robot_id).pipeline
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    max_points = request.args.get('max_points', 5000, type=int)
+    tolerance = request.args.get('tolerance', type=float)
+    return jsonify({'path': pipeline.trip_reader.path(start, end, max_points, tolerance)})
+
+
+@app.route('/robots/<robot_id>/near')
+def robot_near(robot_id):
+    pipeline = get_robot(robot_id).pipeline
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    r = request.args.get('r', type=float)
+    if lat is None or lon is None or not r or r <= 0:
+        return Response("lat, lon and r (meters) are required", status=400)
+    return jsonify(pipeline.track_index.near(lat, lon, r, request.args.get('limit', 500, type=int)))
+
+
+@app.route('/robots/<robot_id>/fences')
+def robot_fences(robot_id):
+    geofences = get_robot(robot_id).pipeline.geofences
+    events, seq = geofences.events_since(request.args.get('since', 0, type=int))
+    return jsonify({'fences': geofences.describe(), 'events': events, 'seq': seq})
+
+
+@app.route('/robots/<robot_id>/fences/<name>', methods=['PUT', 'DELETE'])
+def robot_fence(robot_id, name):
+    geofences = get_robot(robot_id).pipeline.geofences
+    if request.method == 'DELETE':
+        return ('', 204) if geofences.remove(name) else Response("No such fence", status=404)
+    try:
+        geofences.set(name, (request.get_json(silent=True) or {}).get('polygon'))
+    except (ValueError, TypeError) as e:
+        return Response(str(e), status=400)
+    return ('', 204)
+
+
+@app.route('/robots/<robot_id>/fences/<name>/visits')
+def robot_fence_visits(robot_id, name):
+    pipeline = get_robot(robot_id).pipeline
+    visits = pipeline.geofences.visits(name, pipeline.track_index)
+    if visits is None:
+        return Response("No such fence", status=404)
+    return jsonify({'visits': visits})
+
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def tile(z, x, y):
+    data = tiles.get(z, x, y)
+    if data is None:
+        abort(404)
+    return Response(data, mimetype='image/png', headers={'Cache-Control': 'public, max-age=86400'})
+
+
+@app.route('/metrics')
+def metrics_json():
+    return jsonify(metrics.snapshot() | {'robots': len(fleet.robots), 'polls': fleet.polls})
+
+
+@app.route('/robots/<robot_id>/stream')
+def robot_stream(robot_id):
+    broadcaster = get_robot(robot_id).pipeline.broadcaster
+    if not broadcaster.accepting():
+        return Response("Too many streams, poll location", status=503)
+    return Response(broadcaster.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def start(specs):
+    """Add robots given as robot_id=esp_ip and start polling them."""
+    for spec in specs:
+        robot_id, esp_ip = spec.split('=', 1)
+        fleet.add(robot_id, esp_ip)
+    fleet.start()
+
+
+if __name__ == '__main__':
+    start(sys.argv[1:])
+    app.run(debug=False, host='0.0.0.0', threaded=True)
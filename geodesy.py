@@ -0,0 +1,139 @@
+import math
+import sys
+import numpy as np
+from track_store import SCALE
+
+# Distance and speed over GPS tracks.
+# haversine() is the scalar form for one pair of fixes; the *_np functions
+# take whole lat/lon arrays (degrees) and work on every segment at once.
+# RunningStats applies the same math one fix at a time for the live servers.
+#
+#   python geodesy.py live_path.kml      # or a .trip log
+
+R = 6371000  # meters
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Element-wise haversine distance in meters between two sets of points."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(d_phi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(d_lambda/2)**2
+    return R * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def segment_distances(lat, lon):
+    """Length in meters of each of the len(lat) - 1 segments of a track."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return haversine_np(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+def cumulative_distance(lat, lon):
+    """Distance travelled in meters at each point, starting at 0."""
+    out = np.zeros(len(lat))
+    np.cumsum(segment_distances(lat, lon), out=out[1:])
+    return out
+
+
+def segment_speeds(t, lat, lon):
+    """Speed in km/h over each segment; 0 where the timestamps do not advance."""
+    dt = np.diff(np.asarray(t, dtype=float))
+    dist = segment_distances(lat, lon)
+    return np.divide(dist, dt, out=np.zeros_like(dist), where=dt > 0) * 3.6
+
+
+def bounding_box(lat, lon):
+    """(min_lat, min_lon, max_lat, max_lon), or None for an empty track."""
+    if len(lat) == 0:
+        return None
+    return (float(np.min(lat)), float(np.min(lon)), float(np.max(lat)), float(np.max(lon)))
+
+
+def track_stats(lat, lon, t=None):
+    """Summary of a whole track in one vectorized pass."""
+    dist = segment_distances(lat, lon)
+    stats = {'points': len(lat), 'distance': float(dist.sum()), 'bbox': bounding_box(lat, lon)}
+    if t is not None and len(t) > 1:
+        speeds = segment_speeds(t, lat, lon)
+        duration = float(t[-1] - t[0])
+        stats.update({
+            'duration': duration,
+            'max_speed': float(speeds.max()),
+            'avg_speed': stats['distance'] / duration * 3.6 if duration > 0 else 0.0,
+        })
+    return stats
+
+
+class RunningStats:
+    """Total distance, max speed and bounding box, updated fix by fix."""
+
+    def __init__(self):
+        self.distance = 0.0
+        self.max_speed = 0.0
+        self.bbox = None
+        self.last = None  # (t, lat, lon) of the previous fix
+
+    def update(self, t, lat, lon):
+        """Add a fix; returns (meters, km/h) since the previous one."""
+        distance = speed = 0.0
+        if self.last:
+            prev_t, prev_lat, prev_lon = self.last
+            distance = haversine(prev_lat, prev_lon, lat, lon)
+            dt = t - prev_t
+            speed = distance / dt * 3.6 if dt > 0 else 0.0
+            self.distance += distance
+            self.max_speed = max(self.max_speed, speed)
+        self.last = (t, lat, lon)
+        if self.bbox is None:
+            self.bbox = (lat, lon, lat, lon)
+        else:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            self.bbox = (min(min_lat, lat), min(min_lon, lon), max(max_lat, lat), max(max_lon, lon))
+        return distance, speed
+
+    def seed(self, t, lat, lon):
+        """Start from an existing track (e.g. restored from a trip log) in one pass."""
+        if len(lat) == 0:
+            return
+        stats = track_stats(lat, lon, t)
+        self.distance = stats['distance']
+        self.max_speed = stats.get('max_speed', 0.0)
+        self.bbox = stats['bbox']
+        self.last = (float(t[-1]), float(lat[-1]), float(lon[-1]))
+
+    def seed_from(self, track):
+        """seed() from everything currently kept in a TrackStore."""
+        cols = track.columns()
+        self.seed(np.asarray(cols['time']), np.asarray(cols['lat']) / SCALE,
+                  np.asarray(cols['lon']) / SCALE)
+
+
+def load_track(file_path):
+    """(t or None, lat, lon) arrays from a .kml path or a .trip log."""
+    # Imported here so the math above does not pull in the file formats
+    from kml_sink import load_kml_path
+    from trip_log import TripLogReader
+    if file_path.endswith('.trip'):
+        records = TripLogReader(file_path).refresh()
+        return records['time'], records['lat'] / SCALE, records['lon'] / SCALE
+    points = np.array(load_kml_path(file_path), dtype=float).reshape(-1, 2)
+    return None, points[:, 0], points[:, 1]
+
+
+if __name__ == '__main__':
+    for file_path in sys.argv[1:]:
+        t, lat, lon = load_track(file_path)
+        print(file_path)
+        for key, value in track_stats(lat, lon, t).items():
+            print(f"  {key:10s} {value}")
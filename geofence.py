@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+import numpy as np
+from track_index import M_PER_DEG, visits
+
+# Polygon geofences checked on every fix, with enter / exit events.
+#
+# Each fence keeps its polygon in local meters around its center, with the
+# edge slopes precomputed, so a point-in-polygon test is one even-odd ray
+# count over all edges in NumPy. Per fix only the fences whose bounding box
+# holds the fix are tested. A robot inside a fence leaves it only once it is
+# more than HYSTERESIS_METERS outside, and either change needs CONFIRM_FIXES
+# fixes in a row, so GPS jitter along an edge does not produce a stream of
+# enter/exit pairs.
+#
+# Fences are kept in a JSON file ({name: [[lat, lon], ...]}) across restarts.
+# GeofenceEngine.visits() answers "when was the robot in this fence" from a
+# TrackIndex, testing only the fixes in the fence's bounding box.
+
+HYSTERESIS_METERS = 3.0
+CONFIRM_FIXES = 2
+MAX_EVENTS = 1000  # kept for /fences?since=
+
+
+class Fence:
+    """One polygon, [[lat, lon], ...] with at least three vertices."""
+
+    def __init__(self, name, polygon):
+        pts = np.asarray(polygon, dtype=float)
+        if pts.ndim != 2 or pts.shape[1] != 2 or len(pts) < 3 or not np.isfinite(pts).all():
+            raise ValueError("a fence needs at least three [lat, lon] vertices")
+        if (pts[0] == pts[-1]).all():
+            pts = pts[:-1]  # closed ring given: drop the repeated vertex
+        self.name = name
+        self.polygon = pts.tolist()
+        self.lat0, self.lon0 = float(pts[:, 0].mean()), float(pts[:, 1].mean())
+        self.cos0 = math.cos(math.radians(self.lat0))
+        self.x, self.y = self._local(pts[:, 0], pts[:, 1])
+        self.x2, self.y2 = np.roll(self.x, -1), np.roll(self.y, -1)
+        dy = self.y2 - self.y
+        self.slope = np.divide(self.x2 - self.x, dy, out=np.zeros_like(dy), where=dy != 0)
+        self.box = (pts[:, 0].min(), pts[:, 0].max(), pts[:, 1].min(), pts[:, 1].max())
+
+    def _local(self, lat, lon):
+        return (lon - self.lon0) * M_PER_DEG * self.cos0, (lat - self.lat0) * M_PER_DEG
+
+    def contains(self, lat, lon):
+        """Boolean array, which of the points (degree arrays) are inside."""
+        px, py = self._local(np.asarray(lat, dtype=float)[:, None], np.asarray(lon, dtype=float)[:, None])
+        crosses = (self.y > py) != (self.y2 > py)
+        return np.count_nonzero(crosses & (px < self.x + (py - self.y) * self.slope), axis=1) % 2 == 1
+
+    def distance(self, lat, lon):
+        """Meters from a point to the fence's edge."""
+        px, py = self._local(lat, lon)
+        dx, dy = self.x2 - self.x, self.y2 - self.y
+        length2 = dx * dx + dy * dy
+        u = np.clip(np.divide((px - self.x) * dx + (py - self.y) * dy, length2,
+                              out=np.zeros_like(dx), where=length2 > 0), 0.0, 1.0)
+        return float(np.hypot(self.x + u * dx - px, self.y + u * dy - py).min())
+
+
+class GeofenceEngine:
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        # (fences by name, names, bounding boxes as an (n, 4) array); replaced as a whole on a change
+        self.state = ({}, [], np.empty((0, 4)))
+        self.inside = set()  # names of the fences the robot is in; ingest thread only
+        self.pending = {}    # name: fixes in a row that disagree with self.inside
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.event_seq = 0
+        self.lock = threading.Lock()  # changes to the fences and the event list
+        if file_path and os.path.exists(file_path):
+            with open(file_path) as f:
+                for name, polygon in json.load(f).items():
+                    self._put(Fence(name, polygon))
+
+    def _put(self, fence=None, remove=None):
+        fences = dict(self.state[0])
+        if fence is not None:
+            fences[fence.name] = fence
+        fences.pop(remove, None)
+        names = list(fences)
+        self.state = (fences, names, np.array([fences[n].box for n in names]).reshape(-1, 4))
+
+    def _save(self):
+        if self.file_path:
+            tmp = self.file_path + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump({name: fence.polygon for name, fence in self.state[0].items()}, f)
+            os.replace(tmp, self.file_path)
+
+    def set(self, name, polygon):
+        """Add or replace a fence; ValueError if the polygon is not one."""
+        fence = Fence(name, polygon)
+        with self.lock:
+            self._put(fence)
+            self._save()
+
+    def remove(self, name):
+        with self.lock:
+            if name not in self.state[0]:
+                return False
+            self._put(remove=name)
+            self._save()
+        return True
+
+    def update(self, t, lat, lon):
+        """Check one fix against every fence; returns its enter / exit events."""
+        fences, names, boxes = self.state
+        hit = np.flatnonzero((boxes[:, 0] <= lat) & (lat <= boxes[:, 1])
+                             & (boxes[:, 2] <= lon) & (lon <= boxes[:, 3]))
+        now = {names[i] for i in hit.tolist() if fences[names[i]].contains([lat], [lon])[0]}
+        for name in self.inside - now:
+            fence = fences.get(name)
+            if fence is not None and fence.distance(lat, lon) <= HYSTERESIS_METERS:
+                now.add(name)  # just outside: still in, until it is clearly out
+        self.pending = {name: self.pending.get(name, 0) + 1 for name in now ^ self.inside}
+        events = []
+        for name in sorted(self.pending):
+            if self.pending[name] < CONFIRM_FIXES and name in fences:
+                continue
+            del self.pending[name]
+            if name in self.inside:
+                self.inside.discard(name)
+                kind = 'exit'
+            else:
+                self.inside.add(name)
+                kind = 'enter'
+            if name in fences:  # no exit event for a fence that was deleted
+                events.append({'fence': name, 'event': kind, 't': t, 'lat': lat, 'lon': lon})
+        if events:
+            with self.lock:
+                for event in events:
+                    self.event_seq += 1
+                    event['id'] = self.event_seq
+                    self.events.append(event)
+        return events
+
+    def events_since(self, since):
+        """(events with id > since, newest id)."""
+        with self.lock:
+            return [e for e in self.events if e['id'] > since], self.event_seq
+
+    def describe(self):
+        fences = self.state[0]
+        inside = self.inside
+        return [{'name': name, 'polygon': fence.polygon, 'inside': name in inside}
+                for name, fence in fences.items()]
+
+    def visits(self, name, index):
+        """Visits of the track in a TrackIndex to a fence, or None if there is no such fence."""
+        fence = self.state[0].get(name)
+        if fence is None:
+            return None
+        lat, lon, t, seq = index.within_box(*fence.box)
+        inside = np.zeros(len(t), dtype=bool)
+        for i in range(0, len(t), 4096):  # points x edges at a time
+            inside[i:i + 4096] = fence.contains(lat[i:i + 4096], lon[i:i + 4096])
+        return visits(t[inside], seq[inside])
@@ -0,0 +1,225 @@
+import argparse
+import math
+import os
+import numpy as np
+from geodesy import R, track_stats
+from track_store import SCALE
+from trip_log import TripLog, TripLogReader
+
+# Smooths GPS fixes before they are stored, so receiver jitter does not turn
+# into phantom speed and distance, and rejects fixes that jump away.
+#
+# KalmanFilter is a constant-velocity filter on local east/north meters.
+# With position-only fixes and the same noise on both axes, the two axes
+# are independent two-state filters, so a fix costs a few dozen float
+# operations and no matrices. A fix whose innovation is outside GATE
+# (squared Mahalanobis distance, chi-square with 2 degrees of freedom) is
+# dropped; after MAX_REJECTS in a row, or a gap of RESTART_SECONDS, the
+# filter restarts at the new fix instead. While the estimated speed is
+# below STILL_SPEED the output position is held, within HOLD_METERS, so a
+# parked robot adds no distance.
+#
+# Fixes carrying 'hdop' (NMEA) are weighted by it. filter_track() runs the
+# same filter over a stored track and smooths it backwards (Rauch-Tung-
+# Striebel); the command line re-filters a trip log with it:
+#
+#   python gps_filter.py live_path.trip [--out filtered.trip]
+#
+# GPS_FILTER=none in the servers' environment stores fixes unfiltered.
+
+ACCEL_NOISE = 0.5       # m/s^2, how quickly the robot can change velocity
+UERE = 3.0              # m, position error at HDOP 1
+DEFAULT_SIGMA = 4.0     # m, position error of fixes without HDOP
+GATE = 13.8             # chi-square, 2 dof, 99.9 %
+MAX_REJECTS = 5
+RESTART_SECONDS = 30.0
+STILL_SPEED = 0.3       # m/s
+HOLD_METERS = 3.0
+INITIAL_SPEED = 5.0     # m/s, velocity uncertainty of a fresh start
+M_PER_DEG = R * math.pi / 180
+
+
+class KalmanFilter:
+    """Constant-velocity Kalman filter with an outlier gate, one fix at a time."""
+
+    def __init__(self, accel_noise=ACCEL_NOISE, sigma=DEFAULT_SIGMA, gate=GATE):
+        self.q = accel_noise ** 2
+        self.sigma = sigma
+        self.gate = gate
+        self.t = None
+        self.rejected = 0  # outliers dropped so far
+        self.starts = 0    # fresh starts so far: the first fix, gaps and MAX_REJECTS
+
+    def _start(self, t, x, y, r):
+        self.t = t
+        self.starts += 1
+        # Per axis: position, velocity and covariance [[a, b], [b, c]]
+        self.px, self.vx, self.ax, self.bx, self.cx = x, 0.0, r, 0.0, INITIAL_SPEED ** 2
+        self.py, self.vy, self.ay, self.by, self.cy = y, 0.0, r, 0.0, INITIAL_SPEED ** 2
+        self.rejects = 0
+        self.held = (x, y)
+
+    def _local(self, lat, lon):
+        if self.t is None:
+            self.lat0, self.lon0 = lat, lon
+            self.cos0 = math.cos(math.radians(lat))
+        return (lon - self.lon0) * M_PER_DEG * self.cos0, (lat - self.lat0) * M_PER_DEG
+
+    def _predict(self, dt):
+        q3, q2, q1 = self.q * dt ** 3 / 3, self.q * dt ** 2 / 2, self.q * dt
+        self.px += self.vx * dt
+        self.ax, self.bx, self.cx = (self.ax + 2 * self.bx * dt + self.cx * dt * dt + q3,
+                                     self.bx + self.cx * dt + q2, self.cx + q1)
+        self.py += self.vy * dt
+        self.ay, self.by, self.cy = (self.ay + 2 * self.by * dt + self.cy * dt * dt + q3,
+                                     self.by + self.cy * dt + q2, self.cy + q1)
+
+    def step(self, t, x, y, r):
+        """Filter one fix in local meters; returns False if it was gated out."""
+        if self.t is None or t - self.t > RESTART_SECONDS:
+            self._start(t, x, y, r)
+            return True
+        dt = max(t - self.t, 0.0)
+        self._predict(dt)
+        self.t = t
+        sx, sy = self.ax + r, self.ay + r
+        ix, iy = x - self.px, y - self.py
+        if ix * ix / sx + iy * iy / sy > self.gate:
+            self.rejected += 1
+            self.rejects += 1
+            if self.rejects >= MAX_REJECTS:  # the robot really is somewhere else
+                self._start(t, x, y, r)
+                return True
+            return False
+        self.rejects = 0
+        kx, gx = self.ax / sx, self.bx / sx
+        self.px += kx * ix
+        self.vx += gx * ix
+        self.ax, self.bx, self.cx = (1 - kx) * self.ax, (1 - kx) * self.bx, self.cx - gx * self.bx
+        ky, gy = self.ay / sy, self.by / sy
+        self.py += ky * iy
+        self.vy += gy * iy
+        self.ay, self.by, self.cy = (1 - ky) * self.ay, (1 - ky) * self.by, self.cy - gy * self.by
+        return True
+
+    def update(self, t, lat, lon, hdop=None):
+        """Filtered (lat, lon, speed km/h) for a fix, or None for an outlier."""
+        r = (UERE * hdop) ** 2 if hdop else self.sigma ** 2
+        x, y = self._local(lat, lon)
+        if not self.step(t, x, y, r):
+            return None
+        speed = math.hypot(self.vx, self.vy)
+        hx, hy = self.held
+        if speed >= STILL_SPEED or math.hypot(self.px - hx, self.py - hy) > HOLD_METERS:
+            self.held = hx, hy = self.px, self.py
+        return self.lat0 + hy / M_PER_DEG, self.lon0 + hx / (M_PER_DEG * self.cos0), speed * 3.6
+
+
+class PassThrough:
+    """No filtering: fixes as received, speed from consecutive positions."""
+
+    def __init__(self):
+        self.last = None
+        self.rejected = 0
+
+    def update(self, t, lat, lon, hdop=None):
+        speed = 0.0
+        if self.last:
+            prev_t, prev_lat, prev_lon = self.last
+            dy = (lat - prev_lat) * M_PER_DEG
+            dx = (lon - prev_lon) * M_PER_DEG * math.cos(math.radians(lat))
+            speed = math.hypot(dx, dy) / (t - prev_t) * 3.6 if t > prev_t else 0.0
+        self.last = (t, lat, lon)
+        return lat, lon, speed
+
+
+FILTERS = {'kalman': KalmanFilter, 'none': PassThrough}
+
+
+def make_filter(name=None):
+    """The filter named by `name`, or by GPS_FILTER in the environment (default kalman)."""
+    return FILTERS[name or os.environ.get("GPS_FILTER", "kalman")]()
+
+
+def filter_track(t, lat, lon, hdop=None, smooth=True):
+    """Filter a whole track; returns (lat, lon, speed km/h, kept) arrays.
+
+    `kept` marks the fixes that passed the outlier gate; the other arrays
+    hold only those. With `smooth`, every fix also uses the ones after it.
+    """
+    kf = KalmanFilter()
+    n = len(t)
+    kept = np.zeros(n, dtype=bool)
+    states = []  # per kept fix: t, filtered state and covariance of both axes
+    restarts = set()  # indices into states where the filter started afresh
+    for i, (ti, la, lo) in enumerate(zip(np.asarray(t, float).tolist(), np.asarray(lat, float).tolist(),
+                                          np.asarray(lon, float).tolist())):
+        h = hdop[i] if hdop is not None else None
+        r = (UERE * h) ** 2 if h else kf.sigma ** 2
+        x, y = kf._local(la, lo)
+        starts = kf.starts
+        if kf.step(ti, x, y, r):
+            kept[i] = True
+            if kf.starts != starts:
+                restarts.add(len(states))
+            states.append([ti, kf.px, kf.vx, kf.ax, kf.bx, kf.cx, kf.py, kf.vy, kf.ay, kf.by, kf.cy])
+    if smooth:
+        _rts(states, kf.q, restarts)
+    s = np.array(states, dtype=float).reshape(-1, 11)
+    out_lat = kf.lat0 + s[:, 6] / M_PER_DEG if len(s) else s[:, 6]
+    out_lon = kf.lon0 + s[:, 1] / (M_PER_DEG * kf.cos0) if len(s) else s[:, 1]
+    return out_lat, out_lon, np.hypot(s[:, 2], s[:, 7]) * 3.6, kept
+
+
+def _rts(states, q, restarts=()):
+    """Rauch-Tung-Striebel backward pass over filter_track() states, in place (means only).
+
+    Never smooths across an index in `restarts`, where the filter started
+    afresh after a gap or MAX_REJECTS outliers.
+    """
+    for k in range(len(states) - 2, -1, -1):
+        if k + 1 in restarts:
+            continue
+        dt = max(states[k + 1][0] - states[k][0], 0.0)
+        for o in (1, 6):  # x axis, then y
+            p, v, a, b, c = states[k][o:o + 5]
+            # Prediction of k + 1 from k
+            pp, pv = p + v * dt, v
+            pa = a + 2 * b * dt + c * dt * dt + q * dt ** 3 / 3
+            pb = b + c * dt + q * dt ** 2 / 2
+            pc = c + q * dt
+            det = pa * pc - pb * pb
+            if det <= 0:
+                continue
+            # Gain C = P F^T P_pred^-1, with F^T = [[1, 0], [dt, 1]]
+            m00, m01, m10, m11 = a + b * dt, b, b + c * dt, c
+            c00 = (m00 * pc - m01 * pb) / det
+            c01 = (m01 * pa - m00 * pb) / det
+            c10 = (m10 * pc - m11 * pb) / det
+            c11 = (m11 * pa - m10 * pb) / det
+            dp = states[k + 1][o] - pp
+            dv = states[k + 1][o + 1] - pv
+            states[k][o] = p + c00 * dp + c01 * dv
+            states[k][o + 1] = v + c10 * dp + c11 * dv
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-filter a stored GPS track")
+    parser.add_argument("trip", help="trip log to read")
+    parser.add_argument("--out", help="write the filtered fixes to this trip log")
+    parser.add_argument("--no-smooth", action="store_true", help="forward filter only, as live")
+    args = parser.parse_args()
+
+    records = TripLogReader(args.trip).refresh()
+    t = records['time']
+    lat, lon = records['lat'] / SCALE, records['lon'] / SCALE
+    f_lat, f_lon, speed, kept = filter_track(t, lat, lon, smooth=not args.no_smooth)
+    print(f"{args.trip}: {len(t)} fixes, {int((~kept).sum())} outliers dropped")
+    for name, stats in (("raw", track_stats(lat, lon, t)), ("filtered", track_stats(f_lat, f_lon, t[kept]))):
+        print(f"  {name:9s} distance {stats['distance']:10.1f} m  max speed {stats.get('max_speed', 0):7.1f} km/h")
+    if args.out:
+        log = TripLog(args.out)
+        for row in zip(t[kept].tolist(), f_lat.tolist(), f_lon.tolist(), speed.tolist(),
+                       records['satellites'][kept].tolist()):
+            log.append(*row)
+        log.close()
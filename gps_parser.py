@@ -0,0 +1,86 @@
+# Incremental parser for the text the Arduino GPS sketches print over serial.
+# Feed it raw byte chunks as they arrive (ser.read(ser.in_waiting)); it keeps
+# any partial line between calls and returns every fix completed so far.
+#
+# Two formats are understood, and may even be mixed on one port:
+#
+#   block (SVmap_GPS.py, map_GPS copy 2.py):    CSV (map_GPS copy.py, +bluetooth):
+#       Latitude: 25.469152                         25.469152,81.819950,0.4,97.2
+#       Longitude: 81.819950                        lat,lon[,speed[,alt]]
+#       Satellites in use: 7
+#       ---------------------------
+#
+# Both sketches print "Satellites in use:" last, so a block ends there and the
+# fix is returned as soon as that line arrives. The dashed line and the next
+# "Latitude:" line also end a block, for a sketch that skips the satellites.
+#
+# A CSV line must have one of `csv_fields` field counts (a sketch that always
+# prints lat,lon,speed,alt passes (4,)) and coordinates on the globe; stray or
+# partial lines are skipped.
+
+LAT_PREFIX = b"Latitude:"
+LON_PREFIX = b"Longitude:"
+SAT_PREFIX = b"Satellites in use:"
+SEPARATOR = b"-----"
+CSV_FIELDS = (2, 3, 4)
+
+
+class FixParser:
+    def __init__(self, csv_fields=CSV_FIELDS):
+        self.buffer = b""
+        self.block = {}  # fields of the block being read
+        self.csv_fields = csv_fields
+
+    def feed(self, data):
+        """Add raw bytes; returns a list of fix dicts with at least 'lat' and 'lon'."""
+        self.buffer += data
+        if b"\n" not in data:
+            return []
+        *lines, self.buffer = self.buffer.split(b"\n")
+        fixes = []
+        parse_line = self.parse_line
+        for line in lines:
+            fix = parse_line(line.strip())
+            if fix:
+                fixes.append(fix)
+        return fixes
+
+    def parse_line(self, line):
+        """Advance the state machine by one line; returns a completed fix or None."""
+        try:
+            head = line[:2]  # dispatch on the first bytes before any full prefix check
+            if head == b"La" and line.startswith(LAT_PREFIX):
+                done = self.end_block()  # a new block also ends the previous one
+                try:
+                    self.block['lat'] = float(line[len(LAT_PREFIX):])
+                except ValueError:
+                    pass
+                return done
+            if head == b"Lo" and line.startswith(LON_PREFIX):
+                self.block['lon'] = float(line[len(LON_PREFIX):])
+            elif head == b"Sa" and line.startswith(SAT_PREFIX):
+                self.block['satellites'] = int(line[len(SAT_PREFIX):])
+                return self.end_block()
+            elif head == b"--" and line.startswith(SEPARATOR):
+                return self.end_block()
+            elif b"," in line:
+                parts = line.split(b",")
+                if len(parts) not in self.csv_fields:
+                    return None
+                fix = {'lat': float(parts[0]), 'lon': float(parts[1])}
+                if not (abs(fix['lat']) <= 90 and abs(fix['lon']) <= 180):  # also false for nan
+                    return None
+                if len(parts) > 2:
+                    fix['speed'] = float(parts[2])
+                if len(parts) > 3:
+                    fix['alt'] = float(parts[3])
+                return fix
+        except ValueError:
+            pass  # garbled line, e.g. the first one after opening the port
+        return None
+
+    def end_block(self):
+        block, self.block = self.block, {}
+        if 'lat' in block and 'lon' in block:
+            return block
+        return None
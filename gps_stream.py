@@ -0,0 +1,73 @@
+import json
+import queue
+import threading
+
+# Push new GPS fixes to dashboards as Server-Sent Events.
+# The ingest thread publishes each fix once; it is serialized once and
+# copied into a small bounded queue per connected client.
+#
+# Every open stream holds a server thread for as long as the page is open.
+# Set FixBroadcaster.max_streams to leave threads for ordinary requests:
+# beyond it, /stream answers 503 and the page polls /location instead.
+
+KEEPALIVE_SECONDS = 15
+
+
+class FixBroadcaster:
+    max_streams = None  # open streams allowed across all broadcasters, None for no limit
+    open_streams = 0
+    streams_lock = threading.Lock()
+
+    def __init__(self, max_pending=32):
+        self.max_pending = max_pending  # per-client backlog before old events are dropped
+        self.clients = set()
+        self.lock = threading.Lock()
+
+    def publish(self, fix, seq):
+        """Send one fix to every subscriber. Never blocks the caller."""
+        event = f"id: {seq}\ndata: {json.dumps(fix | {'seq': seq})}\n\n"
+        with self.lock:
+            clients = list(self.clients)
+        for q in clients:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client: drop its oldest event. The seq gap makes the
+                # page resync through /location?since=.
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    pass
+
+    def backlog(self):
+        """Events waiting in the fullest client queue."""
+        with self.lock:
+            return max((q.qsize() for q in self.clients), default=0)
+
+    def accepting(self):
+        """Whether another stream may be opened under max_streams."""
+        return self.max_streams is None or FixBroadcaster.open_streams < self.max_streams
+
+    def stream(self):
+        """Generator of SSE chunks for one client, for use in a Flask Response."""
+        q = queue.Queue(self.max_pending)
+        with self.lock:
+            self.clients.add(q)
+        with FixBroadcaster.streams_lock:
+            FixBroadcaster.open_streams += 1
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            with self.lock:
+                self.clients.discard(q)
+            with FixBroadcaster.streams_lock:
+                FixBroadcaster.open_streams -= 1
@@ -0,0 +1,110 @@
+import os
+import re
+from collections import deque
+
+# Keeps live_path.kml in sync with the GPS history without re-rendering it.
+# New coordinates are written over the old footer and the footer is written
+# again after them, so each update costs the new points plus a few hundred
+# bytes. A full rewrite (temp file + atomic rename) only happens on the first
+# write, after a reset, or when the file has grown to twice max_points.
+
+KML_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+    <name>Live GPS Path</name>
+    <Placemark>
+        <name>Path</name>
+        <LineString>
+            <tessellate>1</tessellate>
+            <coordinates>
+'''
+
+KML_FOOTER = '''            </coordinates>
+        </LineString>
+    </Placemark>
+    <Placemark>
+        <name>Current Location</name>
+        <Point>
+            <coordinates>{lon},{lat},0</coordinates>
+        </Point>
+    </Placemark>
+</Document>
+</kml>'''
+
+
+class KmlSink:
+    def __init__(self, file_path, max_points=500):
+        self.file_path = file_path
+        self.max_points = max_points
+        self.recent = deque(maxlen=max_points)  # coordinate lines kept for rewrites
+        self.seq = 0                            # history seq already written
+        self.in_file = 0                        # coordinate lines currently in the file
+        self.footer_offset = None               # byte offset of the footer, None until first write
+        self.current = (0, 0)
+        self.last_line = None                   # newest coordinate line written
+
+    def write(self, points, seq, reset=False):
+        """Add `points` ([lat, lon] appended since self.seq) to the file.
+
+        `reset` means the points do not follow on from what was written
+        before, so the file is rebuilt from them.
+        """
+        if not points and not reset:
+            return
+        if reset:
+            self.recent.clear()
+            self.last_line = None
+        lines = []
+        for lat, lon in points:
+            line = f"{lon},{lat},0\n".encode()
+            if line != self.last_line:  # a robot standing still repeats its fix
+                lines.append(line)
+                self.last_line = line
+        self.recent.extend(lines)
+        self.seq = seq
+        if points:
+            self.current = points[-1]
+
+        try:
+            if reset or self.footer_offset is None or self.in_file + len(lines) > 2 * self.max_points:
+                self._rewrite()
+            else:
+                self._append(lines)
+        except Exception as e:
+            print("KML write error:", e)
+            self.footer_offset = None  # rebuild on the next write
+
+    def _footer(self):
+        lat, lon = self.current
+        return KML_FOOTER.format(lat=lat, lon=lon).encode()
+
+    def _rewrite(self):
+        header = KML_HEADER.encode()
+        coords = b"".join(self.recent)
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header + coords + self._footer())
+        os.replace(tmp_path, self.file_path)
+        self.footer_offset = len(header) + len(coords)
+        self.in_file = len(self.recent)
+
+    def _append(self, lines):
+        coords = b"".join(lines)
+        with open(self.file_path, "r+b") as f:
+            f.seek(self.footer_offset)
+            f.write(coords + self._footer())
+            f.truncate()
+        self.footer_offset += len(coords)
+        self.in_file += len(lines)
+
+
+def load_kml_path(file_path):
+    """Return [(lat, lon), ...] from the first <coordinates> block of a KML file."""
+    with open(file_path) as f:
+        text = f.read()
+    block = re.search(r"<coordinates>(.*?)</coordinates>", text, re.S).group(1)
+    points = []
+    for item in block.split():
+        lon, lat = item.split(",")[:2]
+        points.append((float(lat), float(lon)))
+    return points
@@ -0,0 +1,53 @@
+import json
+import threading
+
+# Serialized /location responses. Between two fixes every dashboard that is
+# up to date polls with the same `since` and gets the same bytes, and every
+# page load (since=0) the same whole path, so each distinct body is built
+# once per fix and then served as-is until the next fix arrives. Requests
+# for a level of detail (see track_lod.py) are cached per level as well.
+# Without one, a client that starts or falls behind gets the newest
+# PATH_POINTS fixes, not the whole multi-day track.
+
+PATH_POINTS = 500
+
+
+class LocationCache:
+    def __init__(self, track, lod=None, max_entries=256, max_points=PATH_POINTS):
+        self.track = track
+        self.lod = lod
+        self.max_points = max_points  # of the raw path per body; 'reset' is set when it cuts
+        self.max_entries = max_entries  # distinct `since` values kept per fix
+        # (fix snapshot, track seq, {since: body}); replaced as a whole on a new fix
+        self.state = (None, -1, {})  # keys: since, or (since, level)
+        self.build_lock = threading.Lock()  # one build per body, even when many clients miss at once
+
+    def body(self, latest, since, level=None):
+        """JSON bytes of latest | {'path', 'seq', 'reset'} for a client at `since`.
+
+        `latest` must be the server's current fix snapshot, a dict that is
+        replaced rather than modified when a fix arrives. With `level` the
+        path is that level of detail, and 'level' / 'tolerance' are added.
+        """
+        key = since if level is None else (since, level)
+        snapshot, seq, bodies = self.state
+        current = self.track.seq
+        if snapshot is not latest or seq != current:
+            bodies = {}
+            self.state = (latest, current, bodies)
+        body = bodies.get(key)
+        if body is None:
+            with self.build_lock:
+                body = bodies.get(key)
+                if body is None:
+                    if level is None:
+                        path, seq, reset = self.track.points_since(since, self.max_points)
+                        extra = {}
+                    else:
+                        path, seq, reset = self.lod.path_since(level, since)
+                        extra = {'level': level, 'tolerance': self.lod.tolerances[level]}
+                    body = json.dumps(latest | {'path': path, 'seq': seq, 'reset': reset} | extra,
+                                      separators=(',', ':')).encode()
+                    if len(bodies) < self.max_entries:
+                        bodies[key] = body
+        return body
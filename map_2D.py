@@ -1,15 +1,23 @@
+import os
 import matplotlib
-matplotlib.use("Qt5Agg")
+if "MPLBACKEND" not in os.environ:  # e.g. MPLBACKEND=Agg for headless benchmarks
+    matplotlib.use("Qt5Agg")
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import socket
+import threading
+import queue
+import time
 import numpy as np
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.collections import PolyCollection
+from distance_daemon import connect
+from distance_filter import DistanceFilter, parse_reading
+from metrics import FrameMeter
 
 # ---- ESP TCP Settings ----
-ESP_IP = "192.168.137.112"  # Replace with your ESP IP if different
-ESP_PORT = 80
+ESP_IP = os.environ.get("ESP_IP", "192.168.137.112")  # Replace with your ESP IP if different
+ESP_PORT = int(os.environ.get("ESP_PORT", 80))
 
 # ---- Color mapping thresholds (cm) ----
 LOW_THRESH = 25.0
@@ -17,6 +25,11 @@ HIGH_THRESH = 100.0
 VMIN = 0.0
 VMAX = 210.0
 
+# ---- Filter settings (see distance_filter.py) ----
+# A wider Hampel window and more smoothing than aa.py: this view is for
+# reading the shape of the surroundings, the raw readings are drawn behind it
+distance_filter = DistanceFilter(window=5, alpha=0.3)
+
 # ---- Custom colormap ----
 _p1 = LOW_THRESH / VMAX
 _p2 = HIGH_THRESH / VMAX
@@ -31,95 +44,140 @@ stops = [
 ]
 custom_cmap = LinearSegmentedColormap.from_list('rainbow_custom', stops)
 
-# ---- Connect to ESP ----
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.settimeout(2.0)
+# ---- Connect ----
+# Through distance_daemon.py when it is running (it holds the ESP's only
+# connection and logs every reading), otherwise straight to the ESP
 try:
-    sock.connect((ESP_IP, ESP_PORT))
-    print(f"Connected to ESP at {ESP_IP}:{ESP_PORT}")
+    sock, source = connect((ESP_IP, ESP_PORT), timeout=2.0)
+    print(f"Connected to {source}")
 except Exception as e:
     print(f"Failed to connect: {e}")
     sock = None
 
-recv_buffer = b''
+# ---- Background reader ----
+readings = queue.SimpleQueue()  # (received, distance or NaN for "No echo"), drained once per frame
+
+def read_distances():
+    """Read newline-delimited distances from the ESP and queue every one, stamped on arrival."""
+    global sock
+    recv_buffer = b''
+    while sock:
+        try:
+            data = sock.recv(4096)
+        except socket.timeout:
+            continue
+        except Exception:
+            data = b''
+        if not data:
+            print("ESP connection closed")
+            sock.close()
+            sock = None
+            break
+
+        received = time.monotonic()
+        recv_buffer += data
+        *lines, recv_buffer = recv_buffer.split(b'\n')
+        for raw in lines:
+            readings.put((received, parse_reading(raw)))
+
+if sock:
+    threading.Thread(target=read_distances, daemon=True).start()
+
+# ---- Visible window ----
+WINDOW = 100  # number of readings kept on screen
+
+# Ring buffers written twice (slot i and i + WINDOW) so the visible window is
+# always the contiguous slice ring[head:head + WINDOW], oldest to newest.
+ring = np.zeros(2 * WINDOW)      # filtered
+raw_ring = np.zeros(2 * WINDOW)  # as received
+head = 0   # next slot to write
+index = 0  # total readings received
+
+# Fixed x positions: readings relative to the newest one (at 0)
+x_data = np.arange(-WINDOW + 1, 1, dtype=float)
+
+# Fill polygons are preallocated; only their y coordinates change per frame
+verts = np.zeros((WINDOW - 1, 4, 2))
+verts[:, 0, 0] = verts[:, 1, 0] = x_data[:-1]
+verts[:, 2, 0] = verts[:, 3, 0] = x_data[1:]
+norm = plt.Normalize(VMIN, VMAX)
+
+def push_readings(values):
+    """Filter a batch of readings and write both series into the ring buffers."""
+    global head, index
+    raw, filtered = distance_filter.process(values)
+    count = len(raw)
+    raw, filtered = raw[-WINDOW:], filtered[-WINDOW:]
+    slots = (head + np.arange(len(raw))) % WINDOW
+    for buffer, series in ((ring, filtered), (raw_ring, raw)):
+        buffer[slots] = series
+        buffer[slots + WINDOW] = series
+    head = (head + len(raw)) % WINDOW
+    index += count
 
 # ---- Set up plot ----
 fig, ax = plt.subplots(figsize=(12, 5))
-ax.set_xlim(0, 100)
+ax.set_xlim(-WINDOW + 1, 0)
 ax.set_ylim(VMIN, VMAX)
 ax.set_yticks(range(int(VMIN), int(VMAX) + 1, 20))
-ax.set_xlabel("Reading Number")
+ax.set_xlabel(f"Reading (last {WINDOW}, newest at 0)")
 ax.set_ylabel("Distance (cm)")
 ax.set_title("Robot Live Distance Line Graph")
 ax.grid(True, which='both', linestyle='--', linewidth=0.5)
 
-x_data, y_data = [], []
-line, = ax.plot(x_data, y_data, c='blue')
+raw_line, = ax.plot([], [], c='lightgray', lw=1)
+line, = ax.plot([], [], c='blue')
 scat = ax.scatter([], [], c=[], cmap=custom_cmap, vmin=VMIN, vmax=VMAX)
-fill = None
-index = 0
+fill = PolyCollection([], edgecolors='none', alpha=0.4)
+ax.add_collection(fill)
+counter = ax.text(0.01, 0.97, "", transform=ax.transAxes, va='top')
+# Frame time, readings taken in per frame and how long they waited in the queue.
+# Press 'm' to hide it; drawing text costs a few ms per frame on slow machines.
+meter = FrameMeter()
+overlay = ax.text(0.99, 0.97, "", transform=ax.transAxes, va='top', ha='right',
+                  fontsize=8, color='dimgray')
+fig.canvas.mpl_connect('key_press_event', lambda event: event.key == 'm'
+                       and overlay.set_visible(not overlay.get_visible()))
+
+def init():
+    return fill, raw_line, line, scat, counter, overlay
 
 # ---- Update function ----
 def update(frame):
-    global index, fill, recv_buffer, sock
-    distance = None
-    line_serial = None
-
-    if sock:
+    batch = []
+    while True:
         try:
-            data = sock.recv(1024)
-            if data:
-                recv_buffer += data
-                parts = recv_buffer.split(b'\n')
-                if len(parts) > 1:
-                    line_serial = parts[0].decode(errors='ignore').strip()
-                    recv_buffer = b'\n'.join(parts[1:])
-        except socket.timeout:
-            line_serial = None
-        except Exception:
-            sock.close()
-            sock = None
-            line_serial = None
-
-    if line_serial:
-        try:
-            distance = float(line_serial)
-        except Exception:
-            distance = None
-
-    if distance is not None:
-        x_data.append(index)
-        y_data.append(distance)
-        index += 1
-        ax.set_xlim(max(0, index-100), index)
-        line.set_data(x_data, y_data)
-
-        if fill:
-            fill.remove()
-
-        if len(x_data) > 1:
-            norm = plt.Normalize(VMIN, VMAX)
-            cmap = custom_cmap
-            polys, poly_colors = [], []
-            for i in range(1, len(x_data)):
-                poly = [
-                    (x_data[i-1], 0),
-                    (x_data[i-1], y_data[i-1]),
-                    (x_data[i], y_data[i]),
-                    (x_data[i], 0)
-                ]
-                polys.append(poly)
-                poly_colors.append(cmap(norm(min(y_data[i-1], y_data[i]))))
-            fill = PolyCollection(polys, facecolors=poly_colors, edgecolors='none', alpha=0.4)
-            ax.add_collection(fill)
-
-        scat.set_offsets(list(zip(x_data, y_data)))
-        scat.set_array(np.array(y_data))
-
-    return line, scat
+            batch.append(readings.get_nowait())
+        except queue.Empty:
+            break
+
+    lag = None
+    if batch:
+        lag = time.monotonic() - batch[0][0]
+        push_readings([d for _, d in batch])
+        n = min(index, WINDOW)
+        y = ring[head:head + WINDOW]
+
+        raw_line.set_data(x_data[-n:], raw_ring[head:head + WINDOW][-n:])
+        line.set_data(x_data[-n:], y[-n:])
+        scat.set_offsets(np.column_stack((x_data[-n:], y[-n:])))
+        scat.set_array(y[-n:])
+
+        if n > 1:
+            verts[:, 1, 1] = y[:-1]
+            verts[:, 2, 1] = y[1:]
+            fill.set_verts(verts[WINDOW - n:])
+            fill.set_facecolors(custom_cmap(norm(np.minimum(y[:-1], y[1:])))[WINDOW - n:])
+
+        counter.set_text(f"Reading #{index}")
+
+    meter.tick(len(batch), lag)
+    overlay.set_text(meter.text())
+    return fill, raw_line, line, scat, counter, overlay
 
 # ---- Animate ----
-ani = animation.FuncAnimation(fig, update, interval=50)
+ani = animation.FuncAnimation(fig, update, init_func=init, interval=50,
+                              blit=True, cache_frame_data=False)
 sm = plt.cm.ScalarMappable(cmap=custom_cmap, norm=plt.Normalize(vmin=VMIN, vmax=VMAX))
 sm.set_array([])
 cbar = plt.colorbar(sm, ax=ax, pad=0.02)
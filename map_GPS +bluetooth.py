@@ -1,6 +1,8 @@
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, request
 import serial
 import threading
+from gps_parser import FixParser
+from track_store import TrackStore
 
 app = Flask(__name__)
 
@@ -9,21 +11,17 @@ ser = serial.Serial('COM6', 9600, timeout=1)
 
 # Shared GPS data
 gps_data = {'lat': 0, 'lon': 0}
-path = []  # store all coordinates
+track = TrackStore()  # store all coordinates
+PATH_POINTS = 500  # newest fixes sent to a page that starts or falls behind
 
 # Thread to read GPS data continuously
 def read_gps():
-    global gps_data, path
+    global gps_data
+    parser = FixParser(csv_fields=(4,))  # the sketch prints lat,lon,speed,alt
     while True:
-        line = ser.readline().decode('utf-8').strip()
-        if line and line.count(',') == 3:
-            try:
-                lat, lon, speed, alt = map(float, line.split(','))
-                gps_data['lat'] = lat
-                gps_data['lon'] = lon
-                path.append([lat, lon])  # add to path
-            except:
-                continue
+        for fix in parser.feed(ser.read(ser.in_waiting or 1)):
+            track.append(fix['lat'], fix['lon'], fix.get('speed', 0.0))  # add to path
+            gps_data = {'lat': fix['lat'], 'lon': fix['lon']}  # replaced, never modified
 
 threading.Thread(target=read_gps, daemon=True).start()
 
@@ -52,14 +50,16 @@ def index():
             var marker = L.marker([{gps_data['lat']}, {gps_data['lon']}]).addTo(map);
             var polyline = L.polyline([], {{color: 'red'}}).addTo(map);
 
+            var since = 0;  // seq of the last path points received
             function updateMap() {{
-                fetch('/coords').then(response => response.json()).then(data => {{
+                fetch('/coords?since=' + since).then(response => response.json()).then(data => {{
                     var lat = data.lat;
                     var lon = data.lon;
-                    var path = data.path;
 
                     marker.setLatLng([lat, lon]);
-                    polyline.setLatLngs(path);
+                    if (data.reset) polyline.setLatLngs(data.path);
+                    else data.path.forEach(p => polyline.addLatLng(p));
+                    since = data.seq;
                     map.setView([lat, lon]);
                 }});
             }}
@@ -74,7 +74,10 @@ def index():
 # Endpoint for current coordinates + path
 @app.route('/coords')
 def coords():
-    return jsonify({'lat': gps_data['lat'], 'lon': gps_data['lon'], 'path': path})
+    # Only points appended after the client's last 'seq' are sent back, at most
+    # PATH_POINTS; 'reset' tells the page to replace its path with them
+    path, seq, reset = track.points_since(request.args.get('since', 0, type=int), PATH_POINTS)
+    return jsonify(gps_data | {'path': path, 'seq': seq, 'reset': reset})
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=False)  # the reloader would open the serial port a second time
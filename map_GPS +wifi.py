@@ -1,20 +1,136 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, Response, request, render_template_string, jsonify
+import json
+import os
+import threading
+import time
+import numpy as np
+from track_store import SCALE, TrackStore
+from trip_log import RECORD_DTYPE, TripLog, restore
+
+# The ESP32 pushes its fixes here over Wi-Fi, either one per request
+# (GET /update?lat=..&lon=..) or many per request (POST /update/batch), so it
+# can buffer through Wi-Fi dropouts and flush. A batch is CSV lines
+# "seq,time,lat,lon" or, with Content-Type application/octet-stream, packed
+# BATCH_DTYPE records. Every fix is written to the trip log and synced before
+# the reply; fixes whose seq the device has already had stored are skipped,
+# so a batch is simply resent until it is acknowledged.
+#
+# Seqs count within one boot of the device: ?boot= (any id that changes when
+# the device restarts, e.g. a random number picked at power-up) starts a new
+# count. Without it, a batch entirely more than RESET_GAP below the newest
+# stored seq is taken as a restarted counter rather than old duplicates.
+#
+#   python "map_GPS +wifi.py"
+#   curl --data-binary $'1,1760000000,25.4691,81.8199\n2,1760000001,25.4692,81.8199' \
+#        -H 'Content-Type: text/csv' 'http://localhost:5000/update/batch?device=esp32&boot=8731'
 
 app = Flask(__name__)
 
-gps_data = {'lat': 0, 'lon': 0}
-path = []
+TRIP_LOG_FILE = "wifi_path.trip"  # every fix, kept across restarts
+SEQ_FILE = TRIP_LOG_FILE + ".seq"  # {device: [boot, newest seq stored]}, JSON
+MAX_BATCH_BYTES = 1 << 20
+# Packed batch record, 20 bytes: lat / lon in 1e-7 degrees like the trip log;
+# a time of 0 means "when received", for devices without a clock
+BATCH_DTYPE = np.dtype([('seq', '<u4'), ('time', '<f8'), ('lat', '<i4'), ('lon', '<i4')])
+PATH_POINTS = 500  # newest fixes sent to a page that starts or falls behind
+INVALID = 2 ** 31 - 1  # lat / lon of a CSV fix that did not parse as a coordinate
+RESET_GAP = MAX_BATCH_BYTES // BATCH_DTYPE.itemsize  # more than one batch can hold
+
+track = TrackStore()
+restore(track, TRIP_LOG_FILE)
+trip_log = TripLog(TRIP_LOG_FILE)
+last_seqs = {}  # device -> [boot, newest seq stored in that boot]
+if os.path.exists(SEQ_FILE):
+    with open(SEQ_FILE) as f:
+        last_seqs = json.load(f)
+ingest_lock = threading.Lock()  # one writer at a time for the log, the track and last_seqs
+last = track.last()
+gps_data = {'lat': last[0], 'lon': last[1]} if last else {'lat': 0, 'lon': 0}
 
 @app.route('/update')
 def update():
+    global gps_data
     lat = request.args.get('lat', type=float)
     lon = request.args.get('lon', type=float)
-    if lat and lon:
-        gps_data['lat'] = lat
-        gps_data['lon'] = lon
-        path.append([lat, lon])
+    if lat is not None and lon is not None:  # 0.0 is a valid coordinate
+        now = time.time()
+        with ingest_lock:
+            trip_log.append(now, lat, lon)
+            track.append(lat, lon, t=now)
+            gps_data = {'lat': lat, 'lon': lon}  # replaced, never modified
     return "OK"
 
+def parse_batch(body, mimetype):
+    """BATCH_DTYPE array of a batch body; ValueError if it is malformed."""
+    if mimetype == 'application/octet-stream':
+        if len(body) % BATCH_DTYPE.itemsize:
+            raise ValueError(f"Body is not a whole number of {BATCH_DTYPE.itemsize}-byte records")
+        return np.frombuffer(body, BATCH_DTYPE)
+    rows = [line.split(b',') for line in body.splitlines() if line.strip()]
+    for number, row in enumerate(rows, 1):
+        if len(row) != 4:
+            raise ValueError(f"Line {number}: CSV lines are seq,time,lat,lon")
+    try:
+        values = np.array(rows, dtype=float).reshape(-1, 4)
+    except ValueError:
+        raise ValueError("CSV lines are seq,time,lat,lon, all numbers") from None
+    seqs = values[:, 0]
+    if not ((seqs >= 0) & (seqs < 2 ** 32) & (seqs == np.floor(seqs))).all():
+        raise ValueError("seq must be a whole number from 0 to 2**32 - 1")
+    fixes = np.empty(len(values), BATCH_DTYPE)
+    fixes['seq'] = values[:, 0]
+    fixes['time'] = values[:, 1]
+    for name, column, limit in (('lat', 2, 90), ('lon', 3, 180)):
+        degrees = values[:, column]
+        ok = np.abs(degrees) <= limit  # also false for nan
+        fixes[name] = np.where(ok, np.round(np.where(ok, degrees, 0) * SCALE), INVALID)
+    return fixes
+
+def ingest(device, fixes, boot=None):
+    """Store the fixes newer than the device's last seq in this boot; returns the reply."""
+    global gps_data
+    last_boot, last_seq = last_seqs.get(device, (None, -1))
+    if boot != last_boot or (len(fixes) and int(fixes['seq'].max()) + RESET_GAP < last_seq):
+        last_seq = -1  # the device restarted its count
+    received = len(fixes)
+    seqs, first = np.unique(fixes['seq'], return_index=True)  # sorted, each seq once
+    fixes = fixes[first[seqs > last_seq]]
+    valid = (np.abs(fixes['lat']) <= 90 * SCALE) & (np.abs(fixes['lon']) <= 180 * SCALE) \
+        & np.isfinite(fixes['time'])
+    stored = fixes[valid]
+    if len(stored):
+        records = np.zeros(len(stored), RECORD_DTYPE)
+        records['time'] = np.where(stored['time'] > 0, stored['time'], time.time())
+        records['lat'] = stored['lat']
+        records['lon'] = stored['lon']
+        trip_log.append_many(records)  # on disk before it is acknowledged
+        for t, lat, lon in records[['time', 'lat', 'lon']].tolist():
+            track.append(lat / SCALE, lon / SCALE, t=t)
+        gps_data = {'lat': int(records['lat'][-1]) / SCALE, 'lon': int(records['lon'][-1]) / SCALE}
+    if len(fixes):
+        last_seq = int(fixes['seq'][-1])
+        last_seqs[device] = [boot, last_seq]
+        tmp = SEQ_FILE + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(last_seqs, f)
+        os.replace(tmp, SEQ_FILE)  # after the log: a crash in between stores a resent fix twice, never none
+    return {'stored': len(stored), 'duplicates': received - len(fixes), 'invalid': len(fixes) - len(stored),
+            'last_seq': last_seq, 'boot': boot}
+
+@app.route('/update/batch', methods=['POST'])
+def update_batch():
+    # ?device= names the sender whose seqs these are and ?boot= its current
+    # count; the reply's last_seq is the newest one stored, so the device can
+    # drop everything up to it
+    if (request.content_length or 0) > MAX_BATCH_BYTES:
+        return Response("Batch too large", status=413)
+    try:
+        fixes = parse_batch(request.get_data(), request.mimetype)
+    except ValueError as e:
+        return Response(str(e), status=400)
+    with ingest_lock:
+        return jsonify(ingest(request.args.get('device', 'default'), fixes, request.args.get('boot')))
+
 @app.route('/')
 def index():
     template = f"""
@@ -37,10 +153,13 @@ def index():
             var marker = L.marker([{gps_data['lat']}, {gps_data['lon']}]).addTo(map);
             var polyline = L.polyline([], {{color: 'red'}}).addTo(map);
 
+            var since = 0;  // seq of the last path points received
             function updateMap() {{
-                fetch('/coords').then(r => r.json()).then(data => {{
+                fetch('/coords?since=' + since).then(r => r.json()).then(data => {{
                     marker.setLatLng([data.lat, data.lon]);
-                    polyline.setLatLngs(data.path);
+                    if (data.reset) polyline.setLatLngs(data.path);
+                    else data.path.forEach(p => polyline.addLatLng(p));
+                    since = data.seq;
                     map.setView([data.lat, data.lon]);
                 }});
             }}
@@ -54,7 +173,10 @@ def index():
 
 @app.route('/coords')
 def coords():
-    return jsonify({'lat': gps_data['lat'], 'lon': gps_data['lon'], 'path': path})
+    # Only points appended after the client's last 'seq' are sent back, at most
+    # PATH_POINTS; 'reset' tells the page to replace its path with them
+    path, seq, reset = track.points_since(request.args.get('since', 0, type=int), PATH_POINTS)
+    return jsonify(gps_data | {'path': path, 'seq': seq, 'reset': reset})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
+    app.run(host='0.0.0.0', debug=False)  # never expose the debugger on the network
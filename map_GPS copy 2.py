@@ -1,7 +1,9 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 import serial
 import threading
 import time
+from gps_parser import FixParser
+from track_store import TrackStore
 
 app = Flask(__name__)
 
@@ -9,40 +11,28 @@ app = Flask(__name__)
 ser = serial.Serial('COM2', 9600, timeout=1)
 
 # Store GPS history for path
-gps_history = []
+track = TrackStore()
 
 # Shared latest GPS coordinates
 latest_data = {'lat': None, 'lon': None, 'satellites': 0}
 
 def read_gps_continuously():
     """Background thread to constantly read GPS from Arduino."""
-    global latest_data, gps_history
+    global latest_data
+    parser = FixParser()
     while True:
         try:
-            while ser.in_waiting:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line.startswith("Latitude:"):
-                    lat = float(line.split(":")[1].strip())
-
-                    # Read longitude line
-                    lon_line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if lon_line.startswith("Longitude:"):
-                        lon = float(lon_line.split(":")[1].strip())
-                    else:
-                        continue
-
-                    # Read satellites line
-                    sat_line = ser.readline().decode('utf-8', errors='ignore').strip()
-                    if sat_line.startswith("Satellites in use:"):
-                        satellites = int(sat_line.split(":")[1].strip())
-                    else:
-                        satellites = 0
-
-                    latest_data.update({'lat': lat, 'lon': lon, 'satellites': satellites})
-                    gps_history.append([lat, lon])
+            # Whatever has arrived; blocks up to the port timeout when idle
+            data = ser.read(ser.in_waiting or 1)
+            for fix in parser.feed(data):
+                lat, lon = fix['lat'], fix['lon']
+                satellites = fix.get('satellites', 0)
+                track.append(lat, lon, satellites=satellites)
+                # A new dict per fix, never modified: readers need no lock
+                latest_data = {'lat': lat, 'lon': lon, 'satellites': satellites}
         except Exception as e:
             print("GPS read error:", e)
-        time.sleep(0.1)
+            time.sleep(1)
 
 # Start GPS reading thread
 threading.Thread(target=read_gps_continuously, daemon=True).start()
@@ -53,12 +43,10 @@ def index():
 
 @app.route('/location')
 def location():
-    return jsonify({
-        'lat': latest_data['lat'],
-        'lon': latest_data['lon'],
-        'satellites': latest_data['satellites'],
-        'path': gps_history
-    })
+    # Only points appended after the client's last 'seq' are sent back
+    since = request.args.get('since', 0, type=int)
+    path, seq, reset = track.points_since(since)
+    return jsonify(latest_data | {'path': path, 'seq': seq, 'reset': reset})
 
 if __name__ == '__main__':
     app.run(debug=False)
@@ -1,5 +1,6 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 import serial
+from track_store import TrackStore
 
 app = Flask(__name__)
 
@@ -7,7 +8,8 @@ app = Flask(__name__)
 ser = serial.Serial('COM4', 9600, timeout=1)
 
 # Store GPS history for path
-gps_history = []
+track = TrackStore()
+PATH_POINTS = 500  # newest fixes sent to a page that starts or falls behind
 
 def get_gps_coordinates():
     """Read GPS data from Arduino serial. Returns (lat, lon, speed, altitude)"""
@@ -33,14 +35,19 @@ def index():
 def location():
     lat, lon, speed, altitude = get_gps_coordinates()
     if lat is not None and lon is not None:
-        gps_history.append([lat, lon])
+        track.append(lat, lon, speed)
+    # Only points after the client's last 'seq', at most PATH_POINTS; 'reset'
+    # means they replace the client's path
+    path, seq, reset = track.points_since(request.args.get('since', 0, type=int), PATH_POINTS)
     return jsonify({
         'lat': lat,
         'lon': lon,
         'speed': speed,
         'altitude': altitude,
-        'path': gps_history
+        'path': path,
+        'seq': seq,
+        'reset': reset
     })
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=False)  # the reloader would open the serial port a second time
@@ -0,0 +1,212 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# In-process measurements of the ingest pipelines, served as JSON on /metrics.
+# Every sample is stamped when its bytes are received; the servers then record
+# how long each stage took:
+#
+#   poll_rtt_ms     HTTP request to the ESP /gps endpoint (EspPoller)
+#   parse_ms        decoding one chunk of serial / NMEA bytes
+#   ingest_ms       bytes received -> fix stored and published
+#   fix_age_ms      receiver timestamp -> fix stored (NMEA fixes only)
+#   serialize_ms    building a /location response
+#   served_age_ms   newest fix stored -> /location response built
+#   queue_depth     events waiting in the fullest /stream client queue
+#   serial_backlog_bytes  bytes still waiting on the serial port after a read
+#
+# plus points/s as a rate. Histograms have fixed buckets, so observe() costs a
+# bisect and a few additions whatever the traffic.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                   1000, 2500, 5000, 10000)  # ms
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket: above every bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.min = float('inf')
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+            if value < self.min:
+                self.min = value
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating inside the one holding rank q."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(max(low + (high - low) * (rank - seen) / n, self.min), self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            if not self.count:
+                return {'count': 0}
+            return {
+                'count': self.count,
+                'mean': round(self.total / self.count, 3),
+                'p50': round(self.quantile(0.5), 3),
+                'p95': round(self.quantile(0.95), 3),
+                'p99': round(self.quantile(0.99), 3),
+                'max': round(self.max, 3),
+                'buckets': {str(b): n for b, n in zip(self.bounds + ('inf',), self.counts) if n},
+            }
+
+
+class Rate:
+    """Events per second over the last `window` whole seconds."""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.seconds = deque()  # [second, count], oldest first
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        second = int(time.monotonic())
+        with self.lock:
+            self.total += n
+            if self.seconds and self.seconds[-1][0] == second:
+                self.seconds[-1][1] += n
+            else:
+                self.seconds.append([second, n])
+                while self.seconds[0][0] <= second - self.window:
+                    self.seconds.popleft()
+
+    def snapshot(self):
+        now = int(time.monotonic())
+        with self.lock:
+            # Completed seconds only; empty seconds count as 0
+            counts = dict((s, n) for s, n in self.seconds if now - self.window <= s < now)
+            total = self.total
+        per_second = sorted(counts.get(s, 0) for s in range(now - self.window, now))
+        return {
+            'total': total,
+            'per_s': round(sum(per_second) / self.window, 2),
+            'per_s_last': counts.get(now - 1, 0),
+            'per_s_p50': per_second[len(per_second) // 2],
+            'per_s_max': per_second[-1],
+        }
+
+
+class Metrics:
+    """Named histograms and rates, created on first use."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.rates = {}
+        self.marks = {}  # name -> time.time() of the last event
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS):
+        h = self.histograms.get(name)
+        if h is None:
+            with self.lock:
+                h = self.histograms.setdefault(name, Histogram(bounds))
+        return h
+
+    def rate(self, name):
+        r = self.rates.get(name)
+        if r is None:
+            with self.lock:
+                r = self.rates.setdefault(name, Rate())
+        return r
+
+    def observe(self, name, value, bounds=LATENCY_BUCKETS):
+        self.histogram(name, bounds).observe(value)
+
+    def mark(self, name, t=None):
+        self.marks[name] = time.time() if t is None else t
+
+    def since(self, name):
+        """Seconds since mark(name), or None if it never happened."""
+        t = self.marks.get(name)
+        return None if t is None else time.time() - t
+
+    @contextmanager
+    def timer(self, name):
+        """Observe the duration of a with-block in ms."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def record_fix(self, fix, stored=None):
+        """Ingest latencies of one stored fix, from its 'received' / 't' stamps."""
+        stored = time.time() if stored is None else stored
+        if 'received' in fix:
+            self.observe('ingest_ms', (stored - fix['received']) * 1000)
+        if 't' in fix:
+            self.observe('fix_age_ms', (stored - fix['t']) * 1000)
+        self.rate('points').add()
+        self.mark('fix', stored)
+
+    def snapshot(self):
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'histograms': {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+            'rates': {name: r.snapshot() for name, r in sorted(self.rates.items())},
+            'seconds_since': {name: round(time.time() - t, 3) for name, t in self.marks.items()},
+        }
+
+
+class FrameMeter:
+    """Frame time, backlog and reading lag of a matplotlib viewer, for an in-plot overlay.
+
+    The overlay text only changes every `refresh` seconds: it stays readable,
+    and text is among the most expensive things matplotlib draws.
+    """
+
+    def __init__(self, window=50, refresh=0.25):
+        self.periods = deque(maxlen=window)  # seconds between frames
+        self.last = None
+        self.backlog = 0
+        self.lag = None
+        self.refresh = refresh
+        self.shown = ""
+        self.shown_at = 0.0
+
+    def tick(self, backlog=0, lag=None):
+        """Call once per frame. `backlog`: readings taken in; `lag`: seconds the oldest waited."""
+        now = time.perf_counter()
+        if self.last is not None:
+            self.periods.append(now - self.last)
+        self.last = now
+        self.backlog = backlog
+        if lag is not None:
+            self.lag = lag
+
+    def text(self):
+        now = time.perf_counter()
+        if self.periods and now - self.shown_at >= self.refresh:
+            period = sum(self.periods) / len(self.periods)
+            self.shown = (f"{period * 1000:.0f} ms/frame (max {max(self.periods) * 1000:.0f})"
+                          f"  backlog {self.backlog}")
+            if self.lag is not None:
+                self.shown += f"  lag {self.lag * 1000:.0f} ms"
+            self.shown_at = now
+        return self.shown
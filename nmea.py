@@ -0,0 +1,228 @@
+import calendar
+import socket
+import time
+import numpy as np
+
+# Decodes the raw NMEA 0183 stream of the GPS receiver on the host, instead
+# of polling the ESP for what TinyGPS++ last decoded. Every fix the receiver
+# outputs (5-10 Hz on most modules) comes out, stamped with its own UTC time.
+#
+# Bytes are fed in chunks as they arrive. When a chunk holds a batch of
+# sentences (a TCP read, or the backlog after a stall) their checksums are
+# verified in one numpy pass; a few sentences are cheaper checked in a plain
+# loop. GGA, RMC and VTG are used;
+# sentences with the same UTC time belong to one epoch and are merged into
+# one fix dict:
+#
+#   {'t': unix time, 'lat': deg, 'lon': deg, 'speed': km/h, 'course': deg,
+#    'satellites': n, 'alt': m, 'hdop': h}   (keys present when reported)
+#
+# An epoch is complete once both its GGA and RMC have arrived, or when a
+# sentence with a newer time shows up (receivers that only send one of them).
+#
+#   GPS_PORT=COM5 GPS_FORMAT=nmea python SVmap_GPS.py
+#   ESP_NMEA=192.168.137.98:2947 python Map_GPS.py   # ESP raw passthrough
+
+KNOTS_TO_KMH = 1.852
+DAY = 86400
+BATCH_MIN = 16  # sentences per feed() from which the numpy checksum pays off
+
+
+def checksum(body):
+    """XOR of the bytes between '$' and '*'."""
+    value = 0
+    for byte in body:
+        value ^= byte
+    return value
+
+
+def parse_coord(value, hemisphere):
+    """'ddmm.mmmm' / 'dddmm.mmmm' plus N/S/E/W to signed degrees."""
+    v = float(value)
+    degrees = int(v // 100)
+    coord = degrees + (v - degrees * 100) / 60
+    return -coord if hemisphere in (b"S", b"W") else coord
+
+
+def parse_tod(value):
+    """'hhmmss.ss' to seconds since midnight UTC."""
+    return int(value[0:2]) * 3600 + int(value[2:4]) * 60 + float(value[4:])
+
+
+class NmeaParser:
+    def __init__(self):
+        self.buffer = b""
+        self.epoch = None      # time-of-day field of the epoch being assembled
+        self.fix = {}          # fields of that epoch
+        self.seen = set()      # sentence types seen in that epoch
+        self.day = None        # unix time of 00:00 UTC on the current date
+        self.last_t = None
+        self.bad_checksums = 0
+
+    def feed(self, data):
+        """Add raw bytes; returns the fixes completed by them, oldest first."""
+        self.buffer += data
+        if b"\n" not in data:
+            return []
+        *lines, self.buffer = self.buffer.split(b"\n")
+
+        # Keep well-formed '$...*hh' sentences and check them all at once
+        sentences = []
+        for line in lines:
+            line = line.strip()
+            if len(line) > 9 and line[0] == 36 and line[-3] == 42:  # '$', '*'
+                sentences.append(line)
+        if not sentences:
+            return []
+        bodies = [s[1:-3] for s in sentences]
+        if len(bodies) >= BATCH_MIN:
+            starts = np.zeros(len(bodies), dtype=np.intp)
+            np.cumsum([len(b) for b in bodies[:-1]], out=starts[1:])
+            sums = np.bitwise_xor.reduceat(np.frombuffer(b"".join(bodies), dtype=np.uint8),
+                                           starts).tolist()
+        else:
+            sums = [checksum(b) for b in bodies]
+
+        fixes = []
+        for sentence, body, value in zip(sentences, bodies, sums):
+            try:
+                if int(sentence[-2:], 16) != value:
+                    self.bad_checksums += 1
+                    continue
+                fix = self.parse_sentence(body.split(b","))
+            except ValueError:
+                continue  # checksum fine but a field is garbled
+            if fix:
+                fixes.append(fix)
+        return fixes
+
+    def parse_sentence(self, fields):
+        """Merge one checksummed sentence (split on ','); returns a completed fix or None."""
+        kind = fields[0][2:]  # drop the talker: GP, GN, GL, GA, ...
+        if kind == b"GGA" and len(fields) > 9:
+            done = self.start_epoch(fields[1])
+            if fields[6] not in (b"", b"0"):  # 0 = no fix
+                self.fix['lat'] = parse_coord(fields[2], fields[3])
+                self.fix['lon'] = parse_coord(fields[4], fields[5])
+                if fields[9]:
+                    self.fix['alt'] = float(fields[9])
+                if fields[8]:
+                    self.fix['hdop'] = float(fields[8])
+            if fields[7]:
+                self.fix['satellites'] = int(fields[7])
+        elif kind == b"RMC" and len(fields) > 9:
+            done = self.start_epoch(fields[1])
+            if len(fields[9]) == 6:
+                d = fields[9]
+                self.day = calendar.timegm((2000 + int(d[4:6]), int(d[2:4]), int(d[0:2]), 0, 0, 0))
+            if fields[2] == b"A":  # A = valid, V = warning
+                self.fix['lat'] = parse_coord(fields[3], fields[4])
+                self.fix['lon'] = parse_coord(fields[5], fields[6])
+                if fields[7]:
+                    self.fix['speed'] = float(fields[7]) * KNOTS_TO_KMH
+                if fields[8]:
+                    self.fix['course'] = float(fields[8])
+        elif kind == b"VTG" and len(fields) > 7:
+            # No time of its own: belongs to the epoch being assembled
+            if fields[7]:
+                self.fix['speed'] = float(fields[7])
+            if fields[1]:
+                self.fix['course'] = float(fields[1])
+            return None
+        else:
+            return None
+
+        self.seen.add(kind)
+        if done is None and self.epoch is not None and len(self.seen) == 2:  # GGA and RMC
+            return self.end_epoch()
+        return done
+
+    def start_epoch(self, tod):
+        """Switch to the epoch of time field `tod`; returns the previous one if it is cut short."""
+        if tod == self.epoch or not tod:
+            return None
+        if self.epoch is None:  # keep fields (VTG) that arrived ahead of it
+            self.epoch = tod
+            return None
+        done = self.end_epoch()
+        self.epoch = tod
+        return done
+
+    def end_epoch(self):
+        fix, self.fix = self.fix, {}
+        self.seen = set()
+        epoch, self.epoch = self.epoch, None
+        if epoch is None or 'lat' not in fix:
+            return None
+        fix['t'] = self.timestamp(parse_tod(epoch))
+        return fix
+
+    def timestamp(self, tod):
+        """Unix time of a time of day, on the date of the last RMC."""
+        if self.day is None:
+            # No RMC yet: take today's UTC date, closest to the host clock
+            now = time.time()
+            self.day = now - now % DAY
+            if tod - now % DAY > DAY / 2:
+                self.day -= DAY
+            elif now % DAY - tod > DAY / 2:
+                self.day += DAY
+        t = self.day + tod
+        if self.last_t is not None and t < self.last_t - DAY / 2:
+            self.day += DAY  # midnight passed before the next RMC date
+            t += DAY
+        self.last_t = t
+        return t
+
+
+def encode_sentence(body):
+    """'GPGGA,...' to a complete '$GPGGA,...*hh\\r\\n' line."""
+    raw = body.encode()
+    return b"$%s*%02X\r\n" % (raw, checksum(raw))
+
+
+def encode_fix(t, lat, lon, speed=0.0, course=0.0, satellites=7, alt=0.0, hdop=1.0):
+    """GGA, RMC and VTG sentences for one fix, as a receiver outputs them."""
+    centis = round(t * 100)
+    tm = time.gmtime(centis // 100)
+    tod = f"{tm.tm_hour:02d}{tm.tm_min:02d}{tm.tm_sec:02d}.{centis % 100:02d}"
+    date = f"{tm.tm_mday:02d}{tm.tm_mon:02d}{tm.tm_year % 100:02d}"
+
+    def coord(value, width, hemispheres):
+        degrees = int(abs(value))
+        minutes = (abs(value) - degrees) * 60
+        return f"{degrees:0{width}d}{minutes:08.5f},{hemispheres[value < 0]}"
+
+    lat_s, lon_s = coord(lat, 2, "NS"), coord(lon, 3, "EW")
+    knots = speed / KNOTS_TO_KMH
+    return (encode_sentence(f"GPRMC,{tod},A,{lat_s},{lon_s},{knots:.3f},{course:.2f},{date},,,A")
+            + encode_sentence(f"GPVTG,{course:.2f},T,,M,{knots:.3f},N,{speed:.3f},K,A")
+            + encode_sentence(f"GPGGA,{tod},{lat_s},{lon_s},1,{satellites:02d},{hdop:.2f},"
+                              f"{alt:.1f},M,0.0,M,,"))
+
+
+def run_tcp(address, on_fix, timeout=5, metrics=None):
+    """Read NMEA from a TCP passthrough ('host:port') forever, calling on_fix(fix).
+
+    Fixes are stamped with the time.time() their bytes were 'received'.
+    """
+    host, port = address.rsplit(":", 1)
+    while True:
+        parser = NmeaParser()
+        try:
+            with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+                while True:
+                    data = sock.recv(4096)
+                    if not data:
+                        break
+                    received = time.time()
+                    start = time.perf_counter()
+                    fixes = parser.feed(data)
+                    if metrics:
+                        metrics.observe('parse_ms', (time.perf_counter() - start) * 1000)
+                    for fix in fixes:
+                        fix['received'] = received
+                        on_fix(fix)
+        except Exception as e:
+            print("NMEA stream error:", e)
+        time.sleep(1)  # reconnect
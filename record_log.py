@@ -0,0 +1,111 @@
+import atexit
+import mmap
+import os
+import time
+import numpy as np
+
+# Append-only file of fixed-size records of a NumPy dtype with a 'time'
+# field, the storage under trip_log.py and distance_log.py. RecordLog writes
+# through a buffered file, flushed on every append so readers see each record
+# at once, and fsync'ed in batches. RecordLogReader memory-maps the file and
+# answers time-range queries with NumPy views into the map, by binary search
+# while the times are ascending. Writers may mix clocks (GPS time, host time,
+# a device's), so a log that goes back in time is searched with a mask.
+
+
+class RecordLog:
+    """Writer; owned by a single thread."""
+
+    def __init__(self, file_path, dtype, sync_every=32, sync_seconds=5.0):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.file_path = file_path
+        self.dtype = np.dtype(dtype)
+        self.sync_every = sync_every      # fsync after this many records...
+        self.sync_seconds = sync_seconds  # ...or this long since the last one
+        self.f = open(file_path, 'ab')
+        # Drop a partial record left by a crash mid-write so records stay aligned
+        size = self.f.tell()
+        if size % self.dtype.itemsize:
+            self.f.truncate(size - size % self.dtype.itemsize)
+            self.f.seek(0, os.SEEK_END)
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        atexit.register(self.sync)  # don't lose the last unsynced batch on a clean exit
+
+    def write(self, data, count):
+        """Append `count` records already packed as `data` bytes."""
+        self.f.write(data)
+        self.f.flush()  # readers see it at once; only the fsync is batched
+        self.pending += count
+        if self.pending >= self.sync_every or time.monotonic() - self.last_sync > self.sync_seconds:
+            self.sync()
+
+    def sync(self):
+        if self.f.closed:
+            return
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+
+class RecordLogReader:
+    """Zero-copy time-range queries over a record log that may still be growing."""
+
+    def __init__(self, file_path, dtype):
+        self.file_path = file_path
+        self.dtype = np.dtype(dtype)
+        self.map = None
+        self.records = np.empty(0, self.dtype)
+        self.times = np.empty(0, '<f8')  # records['time'] copied contiguous, with room to grow
+        self.ascending = True  # whether self.times never decreases
+
+    def refresh(self):
+        """Re-map the file if it has grown since the last query."""
+        try:
+            size = os.path.getsize(self.file_path)
+        except FileNotFoundError:
+            return self.records
+        count = size // self.dtype.itemsize
+        if count != len(self.records):
+            with open(self.file_path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            records = np.frombuffer(self.map, self.dtype, count)
+            old = min(len(self.records), count)
+            if count > len(self.times):
+                grown = np.empty(max(count, 2 * len(self.times)), '<f8')
+                grown[:old] = self.times[:old]
+                self.times = grown
+            self.times[old:count] = records['time'][old:]  # only what was appended is copied
+            if old == 0:
+                self.ascending = True
+            new = self.times[max(old - 1, 0):count]
+            self.ascending = self.ascending and bool((new[1:] >= new[:-1]).all())
+            self.records = records
+        return self.records
+
+    def between(self, start=None, end=None):
+        """Records with start <= time < end, in file order.
+
+        A view into the map while the log's times are ascending, else a copy.
+        """
+        records = self.refresh()
+        times = self.times[:len(records)]  # searchsorted would copy the strided records['time'] per call
+        if not self.ascending:
+            keep = np.ones(len(records), dtype=bool)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times < end
+            return records[keep]
+        lo = 0 if start is None else int(np.searchsorted(times, start))
+        hi = len(records) if end is None else int(np.searchsorted(times, end))
+        return records[lo:hi]
+
+    def tail(self, count):
+        records = self.refresh()
+        return records[max(len(records) - count, 0):]
@@ -0,0 +1,67 @@
+import argparse
+import importlib.util
+import os
+import sys
+from gps_stream import FixBroadcaster
+
+# Production entry point for the GPS dashboards, instead of app.run():
+#
+#   python serve.py Map_GPS.py [--port 5000] [--threads 32]
+#   python serve.py SVmap_GPS.py
+#   python serve.py fleet.py rover1=192.168.137.98 rover2=192.168.137.27
+#
+# One process with a pool of request threads. The script is imported once,
+# so its ingest thread (ESP poller, serial reader, fleet scheduler) runs once
+# and every request reads the same TrackStore; separate worker processes
+# would each poll the ESP or fight over the serial port. Under gunicorn the
+# equivalent is --workers 1 --threads N.
+#
+# Uses waitress when installed (pip install waitress), else werkzeug's
+# threaded server. Each open /stream holds a thread, so streams are capped
+# at --threads minus --reserve; further dashboards fall back to polling.
+
+
+def load(script):
+    """Import a server script by path; its ingest threads start here."""
+    path = os.path.abspath(script)
+    name = os.path.splitext(os.path.basename(path))[0]
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve(app, host, port, threads, connections):
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        from werkzeug.serving import make_server
+        print("waitress not installed, using werkzeug's threaded server")
+        make_server(host, port, app, threaded=True).serve_forever()
+        return
+    waitress_serve(app, host=host, port=port, threads=threads, connection_limit=connections,
+                   asyncore_use_poll=True)  # select() stops at 1024 sockets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a GPS dashboard with a production WSGI server")
+    parser.add_argument("script", help="Map_GPS.py, SVmap_GPS.py, fleet.py, ...")
+    parser.add_argument("args", nargs="*", help="passed to the script's start(), e.g. fleet robots")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32, help="request threads")
+    parser.add_argument("--reserve", type=int, default=8, help="threads kept free of /stream clients")
+    parser.add_argument("--connections", type=int, default=1000, help="open connections accepted")
+    args = parser.parse_args()
+
+    FixBroadcaster.max_streams = max(0, args.threads - args.reserve)
+    module = load(args.script)
+    if hasattr(module, 'start'):
+        module.start(args.args)
+    elif args.args:
+        parser.error(f"{args.script} takes no arguments")
+    print(f"Serving {args.script} on http://{args.host}:{args.port}"
+          f" ({args.threads} threads, up to {FixBroadcaster.max_streams} streams)")
+    serve(module.app, args.host, args.port, args.threads, args.connections)
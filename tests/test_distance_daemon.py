@@ -0,0 +1,74 @@
+import base64
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import distance_daemon
+from distance_daemon import WS_CLOSE, WS_PING, WS_PONG, Hub, make_tcp_server, make_ws_server, read_ws_frame
+
+# Clients that go away while the ESP is quiet must leave hub.clients without
+# waiting for a publish. IDLE_CHECK is shortened so the checks run quickly.
+
+
+def wait_for(condition, seconds=3.0):
+    deadline = time.monotonic() + seconds
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def client_frame(opcode, payload=b''):
+    mask = b'\x01\x02\x03\x04'
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return bytes((0x80 | opcode, 0x80 | len(payload))) + mask + masked
+
+
+def ws_connect(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=3)
+    key = base64.b64encode(os.urandom(16))
+    sock.sendall(b"GET / HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Key: " + key + b"\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    rfile = sock.makefile('rb')
+    while rfile.readline() != b'\r\n':
+        pass
+    return sock, rfile
+
+
+def test_subscribe_ends_when_client_is_gone(monkeypatch):
+    monkeypatch.setattr(distance_daemon, 'IDLE_CHECK', 0.05)
+    hub = Hub()
+    chunks = hub.subscribe(lambda: False)
+    assert list(chunks) == [] and not hub.clients
+
+
+def test_tcp_client_that_disconnects_is_dropped(monkeypatch):
+    monkeypatch.setattr(distance_daemon, 'IDLE_CHECK', 0.05)
+    hub = Hub()
+    server = make_tcp_server(hub, port=0)
+    sock = socket.create_connection(server.server_address)
+    assert wait_for(lambda: len(hub.clients) == 1)
+    sock.close()
+    assert wait_for(lambda: not hub.clients)
+    server.shutdown()
+
+
+def test_ws_ping_and_close(monkeypatch):
+    monkeypatch.setattr(distance_daemon, 'IDLE_CHECK', 0.05)
+    hub = Hub()
+    server = make_ws_server(hub, port=0)
+    sock, rfile = ws_connect(server.server_address[1])
+    assert wait_for(lambda: len(hub.clients) == 1)
+    assert read_ws_frame(rfile)[0] == WS_PING  # the server checks an idle client
+    sock.sendall(client_frame(WS_PING, b'hi'))
+    while (frame := read_ws_frame(rfile))[0] == WS_PING:
+        pass
+    assert frame == (WS_PONG, b'hi')
+    sock.sendall(client_frame(WS_CLOSE, b'\x03\xe8'))
+    while (frame := read_ws_frame(rfile))[0] == WS_PING:
+        pass
+    assert frame == (WS_CLOSE, b'\x03\xe8')
+    assert wait_for(lambda: not hub.clients)
+    sock.close()
+    server.shutdown()
@@ -0,0 +1,25 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gps_filter import M_PER_DEG, MAX_REJECTS, filter_track
+
+
+def test_smoothing_stops_at_a_reject_restart():
+    # Parked at A, then every fix 500 m north: the filter restarts there after
+    # MAX_REJECTS outliers, and smoothing must not pull A's fixes towards B
+    t = np.arange(60, dtype=float)
+    lat = np.where(t < 30, 25.4691, 25.4691 + 500 / M_PER_DEG)
+    lon = np.full(60, 81.8199)
+    f_lat, f_lon, speed, kept = filter_track(t, lat, lon)
+    assert (~kept).sum() == MAX_REJECTS - 1
+    assert np.abs(f_lat[:30] - 25.4691).max() * M_PER_DEG < 1.0
+    assert np.abs(f_lat[-10:] - lat[-1]).max() * M_PER_DEG < 1.0
+
+
+def test_smoothing_stops_at_a_gap():
+    t = np.concatenate((np.arange(20.0), 100 + np.arange(20.0)))
+    lat = np.where(t < 50, 25.4691, 25.4691 + 200 / M_PER_DEG)
+    f_lat, _, _, kept = filter_track(t, lat, np.full(40, 81.8199))
+    assert kept.all() and np.abs(f_lat[:20] - 25.4691).max() * M_PER_DEG < 1.0
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gps_parser import FixParser
+
+
+def test_block_without_separator_ends_at_satellites():
+    parser = FixParser()
+    fixes = parser.feed(b"Latitude: 25.469152\r\nLongitude: 81.819950\r\nSatellites in use: 7\r\n")
+    assert fixes == [{'lat': 25.469152, 'lon': 81.81995, 'satellites': 7}]
+
+
+def test_block_with_separator_is_emitted_once():
+    parser = FixParser()
+    fixes = parser.feed(b"Latitude: 25.1\nLongitude: 81.2\nSatellites in use: 7\n-----------\n")
+    assert fixes == [{'lat': 25.1, 'lon': 81.2, 'satellites': 7}]
+
+
+def test_separator_and_next_latitude_are_fallbacks():
+    parser = FixParser()
+    assert parser.feed(b"Latitude: 25.1\nLongitude: 81.2\nSatellites in use: ?\n") == []
+    assert parser.feed(b"-----\n") == [{'lat': 25.1, 'lon': 81.2}]
+    assert parser.feed(b"Latitude: 25.3\nLongitude: 81.4\nLatitude: 25.5\n") == [{'lat': 25.3, 'lon': 81.4}]
+
+
+def test_csv_lines_and_partial_reads():
+    parser = FixParser()
+    assert parser.feed(b"25.469152,81.8199") == []
+    assert parser.feed(b"50,0.4,97.2\n") == [{'lat': 25.469152, 'lon': 81.81995, 'speed': 0.4, 'alt': 97.2}]
+
+
+def test_csv_field_count_and_range():
+    parser = FixParser(csv_fields=(4,))
+    assert parser.feed(b"25.1,81.2\n25.1,81.2,0.4\n25.1,81.2,0.4,97,5\n,\n") == []
+    assert parser.feed(b"25.1,81.2,0.4,97.2\n") == [{'lat': 25.1, 'lon': 81.2, 'speed': 0.4, 'alt': 97.2}]
+    default = FixParser()
+    assert default.feed(b"25.1,81.2\n1,2,3,4,5\n912.5,81.2\nnan,81.2\n") == [{'lat': 25.1, 'lon': 81.2}]
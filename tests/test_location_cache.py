@@ -0,0 +1,23 @@
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from location_cache import PATH_POINTS, LocationCache
+from track_store import TrackStore
+
+
+def test_raw_path_is_capped():
+    track = TrackStore(capacity=5000)
+    for i in range(2000):
+        track.append(25.4691 + i * 1e-6, 81.8199)
+    cache = LocationCache(track)
+    latest = {'lat': 25.4711, 'lon': 81.8199}
+    first = json.loads(cache.body(latest, 0))
+    assert first['reset'] and len(first['path']) == PATH_POINTS and first['seq'] == 2000
+    assert first['path'][-1] == pytest.approx([25.4691 + 1999 * 1e-6, 81.8199])
+    track.append(25.5, 81.8)
+    latest = {'lat': 25.5, 'lon': 81.8}
+    update = json.loads(cache.body(latest, first['seq']))
+    assert not update['reset'] and update['path'] == [[25.5, 81.8]]
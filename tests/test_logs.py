@@ -0,0 +1,45 @@
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from distance_log import DistanceLog, DistanceLogReader
+from trip_log import TripLog, TripLogReader
+
+
+def test_trip_log_reader_sees_appends_before_sync(tmp_path):
+    path = str(tmp_path / "path.trip")
+    log, reader = TripLog(path, sync_every=1000), TripLogReader(path)
+    for t in range(10):
+        log.append(100.0 + t, 25.4691 + t * 1e-5, 81.8199)
+    assert log.pending == 10  # not fsync'ed yet
+    assert reader.between(103, 106)['time'].tolist() == [103.0, 104.0, 105.0]
+    assert reader.between(103.5, None)['time'].tolist()[0] == 104.0
+    assert len(reader.between(None, 100)) == 0 and len(reader.between(200, 300)) == 0
+    log.close()
+
+
+def test_distance_log_reader_sees_appends_before_sync(tmp_path):
+    path = str(tmp_path / "distance.dlog")
+    log, reader = DistanceLog(path, sync_every=1000), DistanceLogReader(path)
+    log.append(5.0, [12.5, float('nan')])
+    log.append(6.0, [13.0])
+    assert log.pending == 3
+    records = reader.between(5.0, 6.0)
+    assert len(records) == 2 and records['distance'][0] == 12.5 and math.isnan(records['distance'][1])
+    assert reader.between(6.0)['distance'].tolist() == [13.0]
+    log.close()
+
+
+def test_trip_log_with_times_out_of_order(tmp_path):
+    path = str(tmp_path / "path.trip")
+    log, reader = TripLog(path), TripLogReader(path)
+    for t in (100.0, 101.0, 102.0):
+        log.append(t, 25.4691, 81.8199)
+    assert reader.between(101, 103)['time'].tolist() == [101.0, 102.0] and reader.ascending
+    for t in (50.0, 103.0, 101.5):  # e.g. a device clock, then host time
+        log.append(t, 25.4691, 81.8199)
+    assert reader.between(101, 103)['time'].tolist() == [101.0, 102.0, 101.5]
+    assert reader.between(None, 100)['time'].tolist() == [50.0]
+    assert not reader.ascending
+    log.close()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tile_cache import TileCache, bulk_allowed
+
+OSM = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+
+
+def cache_with_upstream(tmp_path, monkeypatch, url):
+    cache = TileCache(str(tmp_path / "tiles.mbtiles"), url=url)
+    fetched = []
+    monkeypatch.setattr(cache, '_fetch', lambda z, x, y: fetched.append((z, x, y)) or b"png")
+    return cache, fetched
+
+
+def test_bulk_allowed_only_for_own_servers():
+    assert not bulk_allowed("")
+    assert not bulk_allowed(OSM)
+    assert not bulk_allowed("https://a.tile.openstreetmap.org/{z}/{x}/{y}.png")
+    assert bulk_allowed("http://127.0.0.1:8080/{z}/{x}/{y}.png")
+    assert bulk_allowed("http://tiles.notopenstreetmap.org.example/{z}/{x}/{y}.png")
+
+
+def test_prefetch_from_public_server_only_reads_the_file(tmp_path, monkeypatch):
+    cache, fetched = cache_with_upstream(tmp_path, monkeypatch, OSM)
+    cache.store.put(16, 1, 2, b"stored")
+    cache.prefetch([(16, 1, 2), (16, 1, 3)])
+    cache.pending.join()
+    assert fetched == [] and (16, 1, 2) in cache.memory and (16, 1, 3) not in cache.memory
+    assert cache.get(16, 1, 3) == b"png" and fetched == [(16, 1, 3)]  # a page asking is still served
+
+
+def test_prefetch_from_own_server_downloads(tmp_path, monkeypatch):
+    cache, fetched = cache_with_upstream(tmp_path, monkeypatch, "http://tiles.local/{z}/{x}/{y}.png")
+    cache.prefetch([(16, 1, 3)])
+    cache.pending.join()
+    assert fetched == [(16, 1, 3)]
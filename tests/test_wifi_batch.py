@@ -0,0 +1,109 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from serve import load
+
+# POST /update/batch of "map_GPS +wifi.py": CSV parsing, resends, device
+# reboots and malformed bodies. Each test loads the script in its own
+# temporary directory, so it starts with an empty trip log and seq file.
+
+
+@pytest.fixture
+def wifi(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return load(os.path.join(ROOT, "map_GPS +wifi.py"))
+
+
+def csv(*seqs, lat=25.4691):
+    return b"".join(b"%d,%d,%.7f,81.8199\n" % (s, 1760000000 + s, lat + s * 1e-6) for s in seqs)
+
+
+def post(module, body, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return module.app.test_client().post(f"/update/batch?{query}", data=body, content_type='text/csv')
+
+
+def test_parse_batch_csv(wifi):
+    fixes = wifi.parse_batch(b"1,1760000000,25.4691,81.8199\r\n\n2,0,-0.5,0\n", 'text/csv')
+    assert fixes['seq'].tolist() == [1, 2]
+    assert fixes['time'].tolist() == [1760000000, 0]
+    assert fixes['lat'].tolist() == [254691000, -5000000]
+    assert fixes['lon'].tolist() == [818199000, 0]
+
+
+@pytest.mark.parametrize("body", [
+    b"10,1760000000,25.4\n11,1760000001,25.4692,81.8199,5\n",  # fields shifted between lines
+    b"1,1760000000,25.4691\n",
+    b"x,1760000000,25.4691,81.8199\n",
+    b"-1,1760000000,25.4691,81.8199\n",
+    b"1.5,1760000000,25.4691,81.8199\n",
+])
+def test_parse_batch_rejects_malformed_lines(wifi, body):
+    with pytest.raises(ValueError):
+        wifi.parse_batch(body, 'text/csv')
+
+
+def test_malformed_batch_leaves_seq_alone(wifi):
+    assert post(wifi, csv(1, 2), device="a").get_json()['last_seq'] == 2
+    assert post(wifi, b"10,1760000000,25.4\n11,1760000001,25.4692,81.8199,5\n", device="a").status_code == 400
+    reply = post(wifi, csv(3), device="a").get_json()
+    assert (reply['stored'], reply['last_seq']) == (1, 3)
+
+
+def test_resend_is_idempotent(wifi):
+    first = post(wifi, csv(1, 2, 3), device="a").get_json()
+    again = post(wifi, csv(1, 2, 3, 4), device="a").get_json()
+    assert (first['stored'], first['last_seq']) == (3, 3)
+    assert (again['stored'], again['duplicates'], again['last_seq']) == (1, 3, 4)
+    assert len(wifi.track) == 4
+
+
+def test_seq_survives_restart(wifi):
+    post(wifi, csv(1, 2), device="a", boot=7)
+    restarted = load(os.path.join(ROOT, "map_GPS +wifi.py"))
+    reply = post(restarted, csv(1, 2, 3), device="a", boot=7).get_json()
+    assert (reply['stored'], reply['duplicates']) == (1, 2)
+    assert len(restarted.track) == 3
+
+
+def test_reboot_with_new_boot_id_starts_a_new_count(wifi):
+    assert post(wifi, csv(1, 2), device="a", boot=7).get_json()['last_seq'] == 2
+    reply = post(wifi, csv(1), device="a", boot=8).get_json()
+    assert (reply['stored'], reply['last_seq'], reply['boot']) == (1, 1, '8')
+    assert post(wifi, csv(1), device="a", boot=8).get_json()['duplicates'] == 1
+
+
+def test_counter_reset_without_boot_id(wifi):
+    post(wifi, csv(wifi.RESET_GAP + 100), device="a")
+    reply = post(wifi, csv(1, 2), device="a").get_json()
+    assert (reply['stored'], reply['last_seq']) == (2, 2)
+
+
+def test_devices_are_independent(wifi):
+    post(wifi, csv(5), device="a")
+    assert post(wifi, csv(5), device="b").get_json()['stored'] == 1
+
+
+def test_packed_batch_and_invalid_fixes(wifi):
+    records = np.zeros(3, wifi.BATCH_DTYPE)
+    records['seq'] = [1, 2, 3]
+    records['lat'] = [254691000, 91 * 10 ** 7, 0]  # the middle one is off the globe
+    records['lon'] = 818199000
+    reply = wifi.app.test_client().post('/update/batch?device=a', data=records.tobytes(),
+                                        content_type='application/octet-stream').get_json()
+    assert (reply['stored'], reply['invalid'], reply['last_seq']) == (2, 1, 3)
+    assert wifi.gps_data == {'lat': 0.0, 'lon': 81.8199}
+
+
+def test_coords_sends_new_points_after_the_cursor(wifi):
+    client = wifi.app.test_client()
+    post(wifi, csv(*range(1, 601)), device="a")
+    first = client.get('/coords').get_json()
+    assert first['reset'] and len(first['path']) == wifi.PATH_POINTS and first['seq'] == 600
+    post(wifi, csv(601, 602), device="a")
+    update = client.get(f"/coords?since={first['seq']}").get_json()
+    assert not update['reset'] and len(update['path']) == 2 and update['seq'] == 602
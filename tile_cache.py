@@ -0,0 +1,355 @@
+import argparse
+import math
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Map tiles for the dashboards from a local MBTiles file, so they load and pan
+# without the internet. A tile is looked up in an in-memory LRU (MEMORY_BYTES),
+# then in the MBTiles file (SQLite, TMS rows), then, only if TILE_URL is set
+# and the upstream answered recently, fetched once and stored. The Flask apps
+# serve them on /tiles/<z>/<x>/<y>.png; the dashboards load a tile the app
+# does not have from openstreetmap.org in the browser, as they did before.
+#
+# Per fix, a Prefetcher queues the tiles around the robot and ahead of it
+# along its heading, at the zooms the dashboard follows it at; background
+# threads load them from the MBTiles file into memory before the map pans
+# there. They download missing tiles only from a self-hosted TILE_URL.
+#
+# Fill the file from your own tile server, e.g. around a past trip or a
+# bounding box:
+#
+#   export TILE_URL='http://tiles.local/{z}/{x}/{y}.png'
+#   python tile_cache.py seed --trip live_path.trip --zooms 14-18
+#   python tile_cache.py seed --bbox 25.40 81.75 25.52 81.90 --zooms 12-17
+#   python tile_cache.py assets   # Leaflet itself, into static/leaflet/
+#   python tile_cache.py info
+#
+# Any MBTiles file of raster PNG tiles works as TILE_FILE. There is no
+# default upstream. openstreetmap.org's tile policy forbids bulk downloads and
+# prefetching, so with TILE_URL pointing there tiles are only fetched as a
+# page asks for them, and seed refuses to run.
+
+TILE_FILE = os.environ.get("TILE_FILE", "tiles.mbtiles")
+TILE_URL = os.environ.get("TILE_URL", "")  # e.g. http://tiles.local/{z}/{x}/{y}.png; "" never goes online
+NO_BULK_HOSTS = ("openstreetmap.org",)  # no seeding or prefetching from these
+USER_AGENT = "Robot-GPS-dashboard/1.0 (local tile cache)"
+MEMORY_BYTES = 64 * 1024 * 1024
+MAX_ZOOM = 19
+FETCH_TIMEOUT = 5.0
+OFFLINE_RETRY = 60.0  # s after a failed fetch before trying the upstream again
+PREFETCH_ZOOMS = (15, 16, 17, 18)
+PREFETCH_RING = 1        # tiles on each side of the robot's tile
+AHEAD_SECONDS = 60.0     # how far ahead, at the current speed
+MAX_AHEAD_TILES = 4      # per zoom
+MIN_MOVE_METERS = 5.0    # less than this since the last heading keeps the old one
+PREFETCH_QUEUE = 2048
+PREFETCH_WORKERS = 2     # threads; also the most upstream downloads at once for prefetch
+EARTH_CIRCUMFERENCE = 40075016.686
+LEAFLET_URL = "https://unpkg.com/leaflet@1.9.4/dist/"
+LEAFLET_FILES = ("leaflet.js", "leaflet.css", "images/layers.png", "images/layers-2x.png",
+                 "images/marker-icon.png", "images/marker-icon-2x.png", "images/marker-shadow.png")
+
+
+def tile_xy(lat, lon, z):
+    """Fractional tile coordinates (x, y) of a point at zoom z (Web Mercator, XYZ rows)."""
+    n = 1 << z
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def bulk_allowed(url):
+    """Whether an upstream may be seeded from and prefetched from: set, and not a public server."""
+    host = urlsplit(url).hostname or ""
+    return bool(url) and not any(host == h or host.endswith("." + h) for h in NO_BULK_HOSTS)
+
+
+class TileStore:
+    """An MBTiles file: one SQLite connection per thread, created if missing."""
+
+    def __init__(self, file_path=TILE_FILE):
+        self.file_path = file_path
+        self.local = threading.local()
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER,"
+                   " tile_row INTEGER, tile_data BLOB)")
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        if db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0] == 0:
+            db.executemany("INSERT INTO metadata VALUES (?, ?)",
+                           [('name', 'robot tiles'), ('format', 'png'), ('type', 'baselayer')])
+        db.commit()
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.file_path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")  # readers do not wait for the prefetch thread's writes
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, z, x, y):
+        row = self._db().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y)).fetchone()  # MBTiles rows count from the south
+        return row[0] if row else None
+
+    def has(self, z, x, y):
+        return self._db().execute(
+            "SELECT 1 FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+            (z, x, (1 << z) - 1 - y)).fetchone() is not None
+
+    def put(self, z, x, y, data):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, data))
+        db.commit()
+
+    def counts(self):
+        """{zoom: tiles} of the whole file."""
+        return dict(self._db().execute("SELECT zoom_level, COUNT(*) FROM tiles GROUP BY zoom_level"))
+
+
+class TileCache:
+    """Memory LRU over a TileStore, with optional upstream fetches and background prefetch."""
+
+    def __init__(self, file_path=TILE_FILE, url=TILE_URL, max_bytes=MEMORY_BYTES, metrics=None):
+        self.store = TileStore(file_path)
+        self.url = url
+        self.prefetch_upstream = bulk_allowed(url)  # otherwise prefetch only reads the file
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self.memory = OrderedDict()  # (z, x, y) -> PNG bytes, least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.offline_until = 0.0
+        self.session = None
+        self.pending = queue.Queue(PREFETCH_QUEUE)
+        self.workers = []
+
+    def _count(self, name):
+        if self.metrics:
+            self.metrics.rate(name).add()
+
+    def _remember(self, key, data):
+        with self.lock:
+            if key not in self.memory:
+                self.memory[key] = data
+                self.size += len(data)
+                while self.size > self.max_bytes and self.memory:
+                    self.size -= len(self.memory.popitem(last=False)[1])
+
+    def get(self, z, x, y, upstream=True):
+        """PNG bytes of a tile, or None if it is not stored and cannot (or may not) be fetched."""
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z):
+            return None
+        key = (z, x, y)
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+        if data is not None:
+            self._count('tiles_memory')
+            return data
+        data = self.store.get(z, x, y)
+        if data is not None:
+            self._count('tiles_disk')
+        elif upstream:
+            data = self._fetch(z, x, y)
+        if data is None:
+            self._count('tiles_missing')
+            return None
+        self._remember(key, data)
+        return data
+
+    def _fetch(self, z, x, y):
+        if not self.url or time.monotonic() < self.offline_until:
+            return None
+        import requests  # only needed online
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.headers['User-Agent'] = USER_AGENT
+        try:
+            response = self.session.get(self.url.format(z=z, x=x, y=y), timeout=FETCH_TIMEOUT)
+        except requests.RequestException:
+            self.offline_until = time.monotonic() + OFFLINE_RETRY
+            return None
+        if response.status_code != 200 or not response.content:
+            return None  # e.g. 404 past the upstream's max zoom; the upstream itself is up
+        self.store.put(z, x, y, response.content)
+        self._count('tiles_upstream')
+        return response.content
+
+    def prefetch(self, keys):
+        """Queue tiles to be loaded into memory in the background; never blocks."""
+        if not self.workers:
+            self.workers = [threading.Thread(target=self._prefetch_forever, daemon=True)
+                            for _ in range(PREFETCH_WORKERS)]
+            for worker in self.workers:
+                worker.start()
+        for key in keys:
+            try:
+                self.pending.put_nowait(key)
+            except queue.Full:
+                break  # the robot will have moved on by the time these are reached
+
+    def _prefetch_forever(self):
+        while True:
+            z, x, y = self.pending.get()
+            if (z, x, y) not in self.memory:
+                try:
+                    self.get(z, x, y, self.prefetch_upstream)
+                except Exception as e:
+                    print("Tile prefetch error:", e)
+            self.pending.task_done()
+
+
+class Prefetcher:
+    """Per robot: on each fix, queues the tiles around it and ahead along its heading."""
+
+    def __init__(self, cache, zooms=PREFETCH_ZOOMS):
+        self.cache = cache
+        self.zooms = zooms
+        self.last = None      # (t, lat, lon) the heading was last measured from
+        self.heading = None   # radians, east of north
+        self.speed = 0.0      # m/s
+        self.queued = None    # (tile at the highest zoom, heading sector) last queued for
+
+    def update(self, lat, lon, t=None):
+        t = time.time() if t is None else t
+        if self.last is None:
+            self.last = (t, lat, lon)
+        else:
+            t0, lat0, lon0 = self.last
+            dy = (lat - lat0) * EARTH_CIRCUMFERENCE / 360.0
+            dx = (lon - lon0) * EARTH_CIRCUMFERENCE / 360.0 * math.cos(math.radians(lat))
+            moved = math.hypot(dx, dy)
+            if moved >= MIN_MOVE_METERS:
+                self.heading = math.atan2(dx, dy)
+                self.speed = moved / max(t - t0, 1e-3)
+                self.last = (t, lat, lon)
+            elif t - t0 > AHEAD_SECONDS:
+                self.heading, self.speed, self.last = None, 0.0, (t, lat, lon)  # stopped
+        x, y = tile_xy(lat, lon, self.zooms[-1])
+        sector = None if self.heading is None else round(self.heading / (math.pi / 4)) % 8
+        state = (int(x), int(y), sector)
+        if state != self.queued:  # only when the robot enters a new tile or turns
+            self.queued = state
+            self.cache.prefetch(self.tiles(lat, lon))
+
+    def tiles(self, lat, lon):
+        """(z, x, y) keys to warm, nearest first, highest zoom first."""
+        keys = {}
+        for z in sorted(self.zooms, reverse=True):
+            n = 1 << z
+            x, y = tile_xy(lat, lon, z)
+            centers = [(x, y)]
+            if self.heading is not None:
+                tile_meters = EARTH_CIRCUMFERENCE * math.cos(math.radians(lat)) / n
+                ahead = min(self.speed * AHEAD_SECONDS / tile_meters, MAX_AHEAD_TILES)
+                dx, dy = math.sin(self.heading), -math.cos(self.heading)  # tile rows grow southwards
+                centers += [(x + dx * k / 2, y + dy * k / 2) for k in range(1, int(ahead * 2) + 1)]
+            for cx, cy in centers:
+                for ty in range(int(cy) - PREFETCH_RING, int(cy) + PREFETCH_RING + 1):
+                    for tx in range(int(cx) - PREFETCH_RING, int(cx) + PREFETCH_RING + 1):
+                        if 0 <= ty < n:
+                            keys.setdefault((z, tx % n, ty), None)
+        return list(keys)
+
+
+def parse_zooms(text):
+    lo, _, hi = text.partition("-")
+    return range(int(lo), int(hi or lo) + 1)
+
+
+def seed(cache, keys, delay):
+    """Fetch the keys that are not stored yet; returns (fetched, missing)."""
+    fetched = missing = 0
+    for i, (z, x, y) in enumerate(keys):
+        if cache.store.has(z, x, y):
+            continue
+        if cache._fetch(z, x, y) is None:
+            missing += 1
+            if time.monotonic() < cache.offline_until:
+                sys.exit(f"Upstream {cache.url} is not answering, stopped after {i} of {len(keys)} tiles")
+        else:
+            fetched += 1
+        time.sleep(delay)
+    return fetched, missing
+
+
+def download_leaflet(static_dir):
+    import requests
+    for name in LEAFLET_FILES:
+        path = os.path.join(static_dir, "leaflet", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        response = requests.get(LEAFLET_URL + name, headers={'User-Agent': USER_AGENT}, timeout=30)
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"{path}: {len(response.content):,} bytes")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local map tile store for the dashboards")
+    parser.add_argument("--file", default=TILE_FILE, help="MBTiles file")
+    parser.add_argument("--url", default=TILE_URL, help="upstream tile URL with {z} {x} {y}")
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed", help="download the tiles of an area")
+    area = seed_parser.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", nargs=4, type=float, metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    area.add_argument("--trip", help="trip log: tiles along the recorded path")
+    seed_parser.add_argument("--zooms", type=parse_zooms, default=parse_zooms("12-17"), help="e.g. 14-18")
+    seed_parser.add_argument("--ring", type=int, default=PREFETCH_RING, help="tiles around a trip's path")
+    seed_parser.add_argument("--delay", type=float, default=0.1, help="seconds between downloads")
+    seed_parser.add_argument("--max-tiles", type=int, default=20000)
+    commands.add_parser("assets", help="download Leaflet into static/leaflet/ for offline dashboards")
+    commands.add_parser("info", help="tiles stored per zoom")
+    args = parser.parse_args()
+
+    if args.command == "assets":
+        download_leaflet(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+        sys.exit()
+    cache = TileCache(args.file, args.url)
+    if args.command == "seed" and not bulk_allowed(args.url):
+        sys.exit(f"seed downloads from --url / TILE_URL, which must be your own tile server"
+                 f" ({', '.join(NO_BULK_HOSTS)} forbids bulk downloads); got {args.url!r}")
+    if args.command == "info":
+        counts = cache.store.counts()
+        for z, count in sorted(counts.items()):
+            print(f"zoom {z:2d}  {count:8,} tiles")
+        print(f"{sum(counts.values()):,} tiles, {os.path.getsize(args.file) / 1e6:.1f} MB in {args.file}")
+        sys.exit()
+
+    keys = {}
+    if args.bbox:
+        south, west, north, east = args.bbox
+        for z in args.zooms:
+            x0, y0 = tile_xy(north, west, z)
+            x1, y1 = tile_xy(south, east, z)
+            for y in range(int(y0), int(y1) + 1):
+                for x in range(int(x0), int(x1) + 1):
+                    keys.setdefault((z, x, y), None)
+    else:
+        from trip_log import TripLogReader
+        path = TripLogReader(args.trip).path(tolerance=5.0)
+        for z in args.zooms:
+            n = 1 << z
+            for lat, lon in path:
+                x, y = tile_xy(lat, lon, z)
+                for ty in range(int(y) - args.ring, int(y) + args.ring + 1):
+                    for tx in range(int(x) - args.ring, int(x) + args.ring + 1):
+                        if 0 <= ty < n:
+                            keys.setdefault((z, tx % n, ty), None)
+    keys = list(keys)
+    if len(keys) > args.max_tiles:
+        sys.exit(f"{len(keys):,} tiles is more than --max-tiles {args.max_tiles:,}; narrow the area or zooms")
+    print(f"{len(keys):,} tiles in the area")
+    fetched, missing = seed(cache, keys, args.delay)
+    print(f"{fetched:,} downloaded, {missing:,} not available, {len(keys) - fetched - missing:,} already stored")
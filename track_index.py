@@ -0,0 +1,135 @@
+import math
+import threading
+from array import array
+import numpy as np
+from track_store import DEFAULT_CAPACITY, SCALE
+
+# Uniform grid over the live track, so "where has the robot been near here"
+# and geofence history are answered from a few cells instead of a scan of the
+# whole path. Cells are CELL_METERS square on a local grid fixed at the first
+# fix; each holds the fixes that fell in it as compact columns (1e-7 degree
+# ints like TrackStore, time and track seq), appended in seq order. update()
+# brings the grid up to date with the TrackStore, like TrackLod, and drops
+# fixes the store itself has dropped in batches.
+
+CELL_METERS = 50.0
+M_PER_DEG = 6371000 * math.pi / 180  # same Earth radius as geodesy.R
+VISIT_GAP = 30.0  # s; fixes in range further apart than this are separate visits
+
+
+class _Cell:
+    __slots__ = ('lat', 'lon', 'time', 'seq')
+
+    def __init__(self):
+        self.lat = array('i')
+        self.lon = array('i')
+        self.time = array('d')
+        self.seq = array('q')
+
+
+class TrackIndex:
+    """Grid of a TrackStore's fixes, brought up to date by update()."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, cell_meters=CELL_METERS):
+        self.capacity = capacity  # like the TrackStore's: older fixes are dropped
+        self.cell_meters = cell_meters
+        self.cells = {}  # (row, col) -> _Cell
+        self.seq = 0      # track fixes [0, seq) have been added
+        self.trimmed = 0  # fixes before this seq have been dropped
+        self.dlat = cell_meters / M_PER_DEG
+        self.dlon = None  # set from the first fix's latitude
+        self.lock = threading.Lock()
+
+    def update(self, track):
+        """Add the fixes appended to `track` since the last call."""
+        (lat, lon, t), start, seq = track.read(('lat', 'lon', 'time'), self.seq)
+        with self.lock:
+            if lat:
+                if self.dlon is None:
+                    self.dlon = self.dlat / math.cos(math.radians(lat[0] / SCALE))
+                rows = np.floor(np.frombuffer(lat, dtype=np.int32) / SCALE / self.dlat).astype(np.int64).tolist()
+                cols = np.floor(np.frombuffer(lon, dtype=np.int32) / SCALE / self.dlon).astype(np.int64).tolist()
+                for i, key in enumerate(zip(rows, cols)):
+                    cell = self.cells.get(key)
+                    if cell is None:
+                        cell = self.cells[key] = _Cell()
+                    cell.lat.append(lat[i])
+                    cell.lon.append(lon[i])
+                    cell.time.append(t[i])
+                    cell.seq.append(start + i)
+            self.seq = seq
+            oldest = seq - self.capacity
+            if oldest - self.trimmed > 4096:  # in batches: dropping from the front moves the rest
+                self._trim(oldest)
+
+    def _trim(self, oldest):
+        for key, cell in list(self.cells.items()):
+            n = int(np.searchsorted(np.frombuffer(cell.seq, dtype=np.int64), oldest))
+            if n == len(cell.seq):
+                del self.cells[key]
+            elif n:
+                del cell.lat[:n], cell.lon[:n], cell.time[:n], cell.seq[:n]
+        self.trimmed = oldest
+
+    def _gather(self, lat_min, lat_max, lon_min, lon_max):
+        """Columns (lat, lon in degrees, time, seq) of the fixes in cells overlapping a box, seq order."""
+        parts = []
+        with self.lock:
+            if self.dlon is not None:
+                oldest = self.seq - self.capacity
+                rows = range(math.floor(lat_min / self.dlat), math.floor(lat_max / self.dlat) + 1)
+                cols = range(math.floor(lon_min / self.dlon), math.floor(lon_max / self.dlon) + 1)
+                if len(rows) * len(cols) <= len(self.cells):
+                    found = (self.cells.get((row, col)) for row in rows for col in cols)
+                else:  # a box larger than the area covered so far: go through the cells there are
+                    found = (cell for (row, col), cell in self.cells.items() if row in rows and col in cols)
+                for cell in found:
+                    if cell is not None:
+                        parts.append((cell.lat[:], cell.lon[:], cell.time[:], cell.seq[:]))
+        if not parts:
+            return np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+        seq = np.concatenate([np.frombuffer(p[3], dtype=np.int64) for p in parts])
+        keep = np.argsort(seq, kind='stable')
+        keep = keep[seq[keep] >= oldest]
+        lat = np.concatenate([np.frombuffer(p[0], dtype=np.int32) for p in parts])[keep] / SCALE
+        lon = np.concatenate([np.frombuffer(p[1], dtype=np.int32) for p in parts])[keep] / SCALE
+        t = np.concatenate([np.frombuffer(p[2], dtype=np.float64) for p in parts])[keep]
+        return lat, lon, t, seq[keep]
+
+    def within_box(self, lat_min, lat_max, lon_min, lon_max):
+        """(lat, lon, time, seq) arrays of the fixes inside a lat/lon box, oldest first."""
+        lat, lon, t, seq = self._gather(lat_min, lat_max, lon_min, lon_max)
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return lat[inside], lon[inside], t[inside], seq[inside]
+
+    def near(self, lat, lon, radius, limit=500):
+        """Fixes within `radius` meters of a point.
+
+        Returns {'count', 'points': [[lat, lon, time], ...] (the newest
+        `limit`), 'visits': [{'start', 'end', 'fixes', 'closest'}, ...]}.
+        """
+        dlat = radius / M_PER_DEG
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        plat, plon, t, seq = self._gather(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        dy = (plat - lat) * M_PER_DEG
+        dx = (plon - lon) * M_PER_DEG * math.cos(math.radians(lat))
+        d = np.hypot(dx, dy)
+        inside = d <= radius
+        plat, plon, t, seq, d = plat[inside], plon[inside], t[inside], seq[inside], d[inside]
+        return {'count': len(t),
+                'points': np.column_stack((plat, plon, t))[-limit:].tolist() if limit else [],
+                'visits': visits(t, seq, d)}
+
+
+def visits(t, seq, d=None):
+    """Group fixes (oldest first) into visits: runs of consecutive track seqs."""
+    if not len(t):
+        return []
+    breaks = np.flatnonzero((np.diff(seq) > 1) & (np.diff(t) > VISIT_GAP)) + 1
+    out = []
+    for a, b in zip(np.concatenate(([0], breaks)).tolist(), np.concatenate((breaks, [len(t)])).tolist()):
+        visit = {'start': float(t[a]), 'end': float(t[b - 1]), 'fixes': b - a}
+        if d is not None:
+            visit['closest'] = round(float(d[a:b].min()), 2)
+        out.append(visit)
+    return out
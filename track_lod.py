@@ -0,0 +1,202 @@
+import math
+import threading
+from array import array
+from bisect import bisect_right
+import numpy as np
+from track_store import DEFAULT_CAPACITY, SCALE
+
+# Simplified copies of the live track for the map, one per level of detail,
+# so a dashboard draws a few hundred vertices instead of every fix of a
+# multi-hour drive.
+#
+# Fixes within DEDUP_METERS of the previous kept one are dropped first (a
+# robot standing still repeats the same coordinate). Every level then keeps
+# the vertices of the path simplified to its tolerance, maintained as fixes
+# arrive with the sleeve (cone intersection) form of line simplification:
+# from the last vertex, each fix narrows the range of directions a segment
+# may take and still pass within the tolerance of it; the first fix outside
+# that range makes the previous fix a vertex. That costs O(1) per fix and
+# level, and every fix stays within the tolerance (plus DEDUP_METERS) of the
+# simplified path.
+# The segment from the last vertex to the newest fix is the live tip, which
+# clients draw themselves.
+#
+# Vertices carry the track seq at which they were made, so clients fetch
+# only the new ones with the same `since` cursor as the raw path. The SSE
+# event of a fix that made a vertex carries it as 'vertex', with 'lod' the
+# bitmask of levels it belongs to.
+#
+# simplify() is the batch Douglas-Peucker counterpart, for stored tracks.
+
+DEDUP_METERS = 0.1
+LEVEL_TOLERANCES = tuple(0.5 * 2 ** k for k in range(10))  # meters, 0.5 m .. 256 m
+TOLERANCE_PIXELS = 0.5  # tolerance for a zoom level, in screen pixels
+METERS_PER_PIXEL_Z0 = 156543.03392  # Web Mercator at the equator, zoom 0
+M_PER_DEG = 6371000 * math.pi / 180  # same Earth radius as geodesy.R
+TAU = 2 * math.pi
+BACKTRACK = 0.5                         # along the segment ...
+SIDEWAYS = math.sqrt(1 - BACKTRACK ** 2)  # ... and across it, both as fractions of the tolerance
+
+
+class _Level:
+    """Vertices of one level and the direction range of the segment being extended."""
+
+    __slots__ = ('tolerance', 'lat', 'lon', 'cursor', 'trimmed',
+                 'anchor_lat', 'anchor_lon', 'cos', 'ref', 'lo', 'hi', 'far')
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.lat = array('i')     # 1e-7 degrees, like TrackStore
+        self.lon = array('i')
+        self.cursor = array('q')  # track seq when each vertex was made
+        self.trimmed = 0          # cursor of the newest vertex dropped as too old
+        self.anchor_lat = None
+
+    def commit(self, lat, lon, cursor):
+        self.lat.append(round(lat * SCALE))
+        self.lon.append(round(lon * SCALE))
+        self.cursor.append(cursor)
+        self.anchor_lat, self.anchor_lon = lat, lon
+        self.cos = math.cos(math.radians(lat))
+        self.ref = None  # direction the range is measured from, set by the first fix outside the tolerance
+        self.far = 0.0   # farthest fix from the anchor so far
+
+    def add(self, lat, lon, prev, cursor):
+        """Extend the current segment to this fix; returns True if `prev` became a vertex."""
+        if self.anchor_lat is None:
+            self.commit(lat, lon, cursor)
+            return True
+        dy = (lat - self.anchor_lat) * M_PER_DEG
+        dx = (lon - self.anchor_lon) * M_PER_DEG * self.cos
+        d = math.hypot(dx, dy)
+        tol = self.tolerance
+        if d > self.far:
+            self.far = d
+        # Ending short of a fix farther out leaves it past the segment's end;
+        # up to BACKTRACK * tol is allowed, with the direction range narrowed
+        # to match, so noise while stopped does not end the segment
+        if self.far - d <= BACKTRACK * tol or self.far <= tol:
+            if d <= tol:
+                return False  # any segment from the anchor passes close enough
+            half = math.asin(SIDEWAYS * tol / d)
+            theta = math.atan2(dy, dx)
+            if self.ref is None:
+                self.ref, self.lo, self.hi = theta, -half, half
+                return False
+            rel = (theta - self.ref + math.pi) % TAU - math.pi
+            if self.lo <= rel <= self.hi:
+                self.lo = max(self.lo, rel - half)
+                self.hi = min(self.hi, rel + half)
+                return False
+        self.commit(prev[0], prev[1], cursor)
+        self.add(lat, lon, prev, cursor)  # first fix of the new segment, never commits
+        return True
+
+    def trim(self, oldest):
+        """Drop vertices made before track seq `oldest`."""
+        n = bisect_right(self.cursor, oldest - 1)
+        if n:
+            self.trimmed = self.cursor[n - 1]
+            del self.lat[:n], self.lon[:n], self.cursor[:n]
+
+
+class TrackLod:
+    """Levels of detail of a TrackStore's path, brought up to date by update()."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, tolerances=LEVEL_TOLERANCES):
+        self.capacity = capacity  # like the TrackStore's: vertices of older fixes are dropped
+        self.tolerances = tolerances
+        self.levels = [_Level(tol) for tol in tolerances]
+        self.seq = 0      # track fixes [0, seq) have been added
+        self.last = None  # (lat, lon) of the last fix that was not a duplicate
+        self.lock = threading.Lock()
+
+    def update(self, track):
+        """Add the fixes appended to `track` since the last call.
+
+        Returns {'vertex': [lat, lon], 'lod': level bitmask} if the newest
+        fix made a vertex, else {}; merge it into that fix's SSE event.
+        """
+        (lat, lon), start, seq = track.read(('lat', 'lon'), self.seq)
+        event = {}
+        with self.lock:
+            for i, (a, b) in enumerate(zip(lat, lon)):
+                event = self._add(a / SCALE, b / SCALE, start + i + 1)
+            self.seq = seq
+            oldest = seq - self.capacity
+            if oldest > 0 and self.levels[0].cursor and self.levels[0].cursor[0] < oldest - 1024:
+                for level in self.levels:  # in batches: del on an array moves the rest
+                    level.trim(oldest)
+        return event
+
+    def _add(self, lat, lon, cursor):
+        prev = self.last
+        if prev is not None and abs(lat - prev[0]) * M_PER_DEG < DEDUP_METERS \
+                and abs(lon - prev[1]) * M_PER_DEG * math.cos(math.radians(lat)) < DEDUP_METERS:
+            return {}
+        mask = 0
+        for k, level in enumerate(self.levels):
+            if level.add(lat, lon, prev, cursor):
+                mask |= 1 << k
+        self.last = (lat, lon)
+        if not mask:
+            return {}
+        vertex = prev or (lat, lon)  # the first fix is its own vertex
+        return {'vertex': [vertex[0], vertex[1]], 'lod': mask}
+
+    def level_for(self, zoom=None, tolerance=None, lat=None):
+        """Level for a tolerance in meters, or for a map zoom at latitude `lat`.
+
+        The coarsest level within the tolerance, level 0 below it; None
+        when neither is given, meaning the raw path.
+        """
+        if tolerance is None:
+            if zoom is None:
+                return None
+            tolerance = (METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat or 0))
+                         / 2 ** zoom * TOLERANCE_PIXELS)
+        return max(bisect_right(self.tolerances, tolerance) - 1, 0)
+
+    def path_since(self, level, since):
+        """Return ([[lat, lon], ...] of `level` made after seq `since`, current seq, reset flag).
+
+        Same cursor and reset semantics as TrackStore.points_since(); the
+        client adds its newest fix as the tip.
+        """
+        with self.lock:
+            lv = self.levels[level]
+            seq = self.seq
+            reset = since < lv.trimmed or since > seq
+            i = 0 if reset else bisect_right(lv.cursor, since)
+            lat, lon = lv.lat[i:], lv.lon[i:]
+        return [[a / SCALE, b / SCALE] for a, b in zip(lat, lon)], seq, reset
+
+
+def simplify(lat, lon, tolerance):
+    """Indices of the points kept by Douglas-Peucker at `tolerance` meters (degrees in)."""
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    y = np.asarray(lat, dtype=float) * M_PER_DEG
+    x = np.asarray(lon, dtype=float) * M_PER_DEG * math.cos(math.radians(float(np.mean(lat))))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        length2 = dx * dx + dy * dy
+        if length2 > 0:  # distance to the segment, not the infinite line: tracks double back
+            t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            px, py = px - t * dx, py - t * dy
+        d = np.hypot(px, py)
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return np.flatnonzero(keep)
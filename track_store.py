@@ -0,0 +1,142 @@
+import struct
+import threading
+import time
+from array import array
+
+# GPS track kept column-wise in typed arrays instead of a list of [lat, lon]
+# lists. Lat/lon are stored as int32 in 1e-7 degrees (about 1 cm), so a fix
+# with timestamp, position, speed and satellites takes 21 bytes instead of
+# roughly 200 as Python objects.
+#
+# The arrays grow until `capacity` and then wrap around as a ring. Every fix
+# gets a sequence number (`seq` counts fixes ever appended) which readers use
+# as a cursor. With `spill_path` set, fixes pushed out of the ring are
+# appended to that file as SPILL_RECORD structs instead of being lost.
+#
+# Readers never take a lock, so a slow /location request cannot stall ingest.
+# A fix is published by bumping `seq` after all its columns are written.
+# Readers copy the slots below the seq they saw (array slices are copied in
+# C, atomically under the GIL) and then drop any that the writer has since
+# wrapped around onto. The slot being written next is never handed out, so
+# readers see at most capacity - 1 fixes. Appends are serialized among
+# themselves by `write_lock`, path reads by `read_lock`: a thread blocked on
+# a lock does not compete for the GIL, so concurrent readers share the CPU
+# with the writer one at a time instead of crowding it out.
+
+DEFAULT_CAPACITY = 3 * 24 * 3600  # three days at 1 Hz, about 5.4 MB
+SCALE = 1e7
+SPILL_RECORD = struct.Struct('<diifB')  # time, lat, lon (1e-7 deg), speed, satellites
+
+
+class TrackStore:
+    def __init__(self, capacity=DEFAULT_CAPACITY, spill_path=None):
+        self.capacity = capacity
+        self.time = array('d')
+        self.lat = array('i')
+        self.lon = array('i')
+        self.speed = array('f')
+        self.satellites = array('B')
+        self.seq = 0  # fixes [0, seq) are complete and readable
+        self.write_lock = threading.Lock()
+        self.read_lock = threading.Lock()  # never taken by append()
+        self.spill = open(spill_path, 'ab') if spill_path else None
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def append(self, lat, lon, speed=0.0, satellites=0, t=None):
+        """Add one fix; the oldest one is overwritten once the store is full."""
+        t = time.time() if t is None else t
+        ilat, ilon = round(lat * SCALE), round(lon * SCALE)
+        satellites = min(int(satellites or 0), 255)
+        with self.write_lock:
+            if len(self.time) < self.capacity:
+                self.time.append(t)
+                self.lat.append(ilat)
+                self.lon.append(ilon)
+                self.speed.append(speed)
+                self.satellites.append(satellites)
+            else:
+                i = self.seq % self.capacity
+                if self.spill:
+                    self.spill.write(SPILL_RECORD.pack(self.time[i], self.lat[i], self.lon[i],
+                                                       self.speed[i], self.satellites[i]))
+                self.time[i] = t
+                self.lat[i] = ilat
+                self.lon[i] = ilon
+                self.speed[i] = speed
+                self.satellites[i] = satellites
+            self.seq += 1
+
+    def _oldest(self):
+        """Seq of the oldest fix that no write in progress can be touching."""
+        # The write for self.seq overwrites fix seq - capacity
+        return max(0, self.seq - self.capacity + 1)
+
+    def read(self, names, since):
+        """Copy columns for fixes [since, seq) without blocking the writer.
+
+        Returns (columns, start, seq); start is later than `since` when those
+        fixes are gone, or were overwritten while being copied.
+        """
+        seq = self.seq
+        start = min(max(since, self._oldest()), seq)
+        cols = []
+        for name in names:
+            column = getattr(self, name)
+            out = array(column.typecode)
+            for s in self._slices(start, seq):
+                out += column[s]
+            cols.append(out)
+        overwritten = self._oldest() - start
+        if overwritten > 0:
+            cols = [c[overwritten:] for c in cols]
+            start += overwritten
+        return cols, start, seq
+
+    def last(self):
+        """Return (lat, lon) of the newest fix, or None when empty."""
+        (lat, lon), _, _ = self.read(('lat', 'lon'), self.seq - 1)
+        if not lat:
+            return None
+        return lat[-1] / SCALE, lon[-1] / SCALE
+
+    def _slices(self, start, stop):
+        """Array slices covering seq range [start, stop), at most two because of the wrap."""
+        a, b = start % self.capacity, (stop - 1) % self.capacity + 1
+        if start == stop:
+            return []
+        if a < b:
+            return [slice(a, b)]
+        return [slice(a, self.capacity), slice(0, b)]
+
+    def points_since(self, since, limit=None):
+        """Return ([[lat, lon], ...] appended after seq `since`, current seq, reset flag).
+
+        `reset` is set when `since` is older than the kept fixes or ahead of
+        them, in which case every kept fix is returned instead. With `limit`,
+        at most the newest `limit` fixes are returned; if more than that are
+        new, they replace the client's path (reset) like a fresh start.
+        """
+        with self.read_lock:
+            reset = since < self._oldest() or since > self.seq
+            first = 0 if reset else since
+            if limit is not None and self.seq - first > limit:
+                first, reset = self.seq - limit, True
+            (lat, lon), start, seq = self.read(('lat', 'lon'), first)
+            if start > since:
+                reset = True
+            return [[a / SCALE, b / SCALE] for a, b in zip(lat, lon)], seq, reset
+
+    def columns(self, since=0):
+        """Return {'time', 'lat', 'lon', 'speed', 'satellites'} arrays, oldest first.
+
+        lat/lon stay in 1e-7 degree integers; divide by SCALE for degrees.
+        """
+        names = ('time', 'lat', 'lon', 'speed', 'satellites')
+        cols, _, _ = self.read(names, since)
+        return dict(zip(names, cols))
+
+    def flush(self):
+        if self.spill:
+            self.spill.flush()
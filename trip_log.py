@@ -0,0 +1,60 @@
+import numpy as np
+from record_log import RecordLog, RecordLogReader
+from track_lod import simplify
+from track_store import SCALE, SPILL_RECORD
+
+# Append-only binary log of every GPS fix, so history survives a restart.
+# Records are fixed-size SPILL_RECORD structs (the same layout TrackStore
+# spills) in a record_log.py log: flushed on every append, so readers see
+# each fix at once, and fsync'ed in batches. TripLogReader memory-maps the
+# file and answers time-range queries with NumPy views into the map, without
+# reading the whole log into Python.
+
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('lat', '<i4'), ('lon', '<i4'),
+                         ('speed', '<f4'), ('satellites', 'u1')])
+assert RECORD_DTYPE.itemsize == SPILL_RECORD.size
+
+
+class TripLog(RecordLog):
+    """Writer; owned by a single ingest thread."""
+
+    def __init__(self, file_path, sync_every=32, sync_seconds=5.0):
+        super().__init__(file_path, RECORD_DTYPE, sync_every, sync_seconds)
+
+    def append(self, t, lat, lon, speed=0.0, satellites=0):
+        self.write(SPILL_RECORD.pack(t, round(lat * SCALE), round(lon * SCALE),
+                                     speed, min(int(satellites or 0), 255)), 1)
+
+    def append_many(self, records):
+        """Write a RECORD_DTYPE array in one go and sync it before returning."""
+        self.write(np.ascontiguousarray(records, RECORD_DTYPE).tobytes(), len(records))
+        self.sync()
+
+
+class TripLogReader(RecordLogReader):
+    """Zero-copy time-range queries over a trip log that may still be growing."""
+
+    def __init__(self, file_path):
+        super().__init__(file_path, RECORD_DTYPE)
+
+    def path(self, start=None, end=None, max_points=None, tolerance=None):
+        """[[lat, lon], ...] in a time range, thinned by striding to at most max_points.
+
+        With `tolerance` (meters) the path is first simplified with
+        Douglas-Peucker, so striding only applies if that is not enough.
+        """
+        records = self.between(start, end)
+        if tolerance:
+            records = records[simplify(records['lat'] / SCALE, records['lon'] / SCALE, tolerance)]
+        if max_points and len(records) > max_points:
+            records = records[::-(-len(records) // max_points)]
+        lat = records['lat'] / SCALE
+        lon = records['lon'] / SCALE
+        return np.column_stack((lat, lon)).tolist()
+
+
+def restore(track, file_path):
+    """Refill a TrackStore with the newest fixes from a trip log after a restart."""
+    records = TripLogReader(file_path).tail(track.capacity)
+    for t, lat, lon, speed, satellites in records.tolist():
+        track.append(lat / SCALE, lon / SCALE, speed, satellites, t)